@@ -1,4 +1,23 @@
 #!/usr/bin/env bash
 python -m unittest dfxtest.dfx_store_test
+python -m unittest dfxtest.fingerprint_test
+python -m unittest dfxtest.columnar_test
+python -m unittest dfxtest.df_cache_test
+python -m unittest dfxtest.ingest_test
+python -m unittest dfxtest.stats_test
+python -m unittest dfxtest.value_index_test
+python -m unittest dfxtest.relationships_test
+python -m unittest dfxtest.dependencies_test
+python -m unittest dfxtest.keys_test
+python -m unittest dfxtest.shared_test
+python -m unittest dfxtest.parallel_test
+python -m unittest dfxtest.scheduler_test
+python -m unittest dfxtest.deferred_test
+python -m unittest dfxtest.budget_test
+python -m unittest dfxtest.sampling_test
+python -m unittest dfxtest.sketches_test
+python -m unittest dfxtest.streaming_test
+python -m unittest dfxtest.incremental_test
+python -m unittest dfxtest.images_test
 python -m dfxtest.describer_test
 
@@ -0,0 +1,502 @@
+import os
+import json
+import pickle
+import shutil
+import logging
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from . import fingerprint as dfx_fingerprint
+
+logger = logging.getLogger(__name__)
+
+"""
+Columnar, memory-mapped storage for dataframes
+
+A dataset is a directory with one file per column and a small schema:
+
+    cars.dfx/
+        schema.json         column names, dtypes, row count, fingerprint
+        0.bin               raw values of a fixed width column (numbers, booleans, datetimes)
+        1.bin               int32 codes of an object (text) column...
+        1.values.pickle     ...and the distinct values the codes refer to
+        index.pickle        only if the index isn't the default 0..n-1
+
+open_frame() memory-maps fixed width columns, so they are not read from disk until they
+are used, and the operating system shares the pages between processes. Object columns
+are rebuilt from their codes with one vectorized lookup, so only their distinct values
+are unpickled. Dataframes a DfxStore re-opens for the describers it reads share one copy
+of them, see DatasetReference.
+
+Usage:
+    write_frame(df, 'data/cars.dfx')
+    df = open_frame('data/cars.dfx')
+    df = open_frame('data/cars.dfx', columns=['mpg', 'origin'])
+
+Datasets can also be written incrementally, one chunk at a time, with ColumnarWriter, which
+can also append rows to an existing dataset in place:
+
+    writer = ColumnarWriter('data/cars.dfx', append=True)
+    writer.append(new_rows)
+    writer.close()
+
+Rows are appended to the end of the column files, and the schema, replaced last, says how
+many rows there are, so readers of the dataset before the append keep seeing the rows they
+had. Only the new rows are hashed for the fingerprint (see Fingerprint.extended()).
+"""
+
+SCHEMA_FILE = 'schema.json'
+SCHEMA_VERSION = 1
+
+# column kinds
+ARRAY = 'array'     # fixed width numpy values, memory-mapped
+CODES = 'codes'     # object values, stored as int32 codes into a list of distinct values
+PICKLE = 'pickle'   # anything else (e.g. categoricals, timezones), pickled in chunks
+
+CODE_DTYPE = np.int32
+
+# #######################################################################################
+# Reading
+
+def is_dataset(path):
+    return os.path.isfile(os.path.join(path, SCHEMA_FILE))
+
+def read_schema(path):
+    with open(os.path.join(path, SCHEMA_FILE)) as f:
+        return json.load(f)
+
+def open_frame(path, columns=None):
+    """Open a dataset written by write_frame() or ColumnarWriter as a dataframe
+
+    columns limits the dataframe to those columns, in which case the others are not read.
+
+    The dataframe's fingerprint is read from the schema, rather than calculated.
+    """
+    schema = read_schema(path)
+    col_schemas = schema['columns']
+    if columns is not None:
+        missing = set(columns) - set(col_schema['name'] for col_schema in col_schemas)
+        if missing:
+            raise ValueError("Dataset has no columns", sorted(missing), path)
+        col_schemas = [col_schema for col_schema in col_schemas if col_schema['name'] in columns]
+
+    df = _open_frame(path, dict(schema, columns=col_schemas))
+
+    if schema.get('fingerprint') is not None:
+        fingerprint = dfx_fingerprint.Fingerprint.from_dict(schema['fingerprint'], source=os.path.abspath(path))
+        if columns is not None:
+            fingerprint = fingerprint.subset(df.columns)
+        dfx_fingerprint.set_fingerprint(df, fingerprint)
+    return df
+
+def _read_column(path, col_schema, row_count):
+    kind = col_schema['kind']
+    file_path = os.path.join(path, col_schema['file'])
+    if kind == ARRAY:
+        dtype = np.dtype(col_schema['dtype'])
+        if row_count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode='r', shape=(row_count,))
+    if kind == CODES:
+        if row_count == 0:
+            codes = np.empty(0, dtype=CODE_DTYPE)
+        else:
+            codes = np.memmap(file_path, dtype=CODE_DTYPE, mode='r', shape=(row_count,))
+        values = _read_values(path, col_schema)
+        # -1 is a null, which takes the extra value at the end
+        values = np.append(values, np.array([np.nan], dtype=object))
+        return values.take(codes)
+    if kind == PICKLE:
+        chunks = []
+        for i in range(col_schema['chunks']):
+            with open('{}.{}'.format(file_path, i), 'rb') as f:
+                chunks.append(pickle.load(f))
+        if not chunks:
+            return pd.Series([], dtype=object).values
+        return pd.concat(chunks, ignore_index=True).values
+    raise ValueError("Unknown column kind", kind)
+
+def _read_values(path, col_schema):
+    with open(os.path.join(path, col_schema['values_file']), 'rb') as f:
+        return pickle.load(f)
+
+def _read_index(path, schema):
+    if not schema.get('index_file'):
+        return pd.RangeIndex(schema['row_count'])
+    with open(os.path.join(path, schema['index_file']), 'rb') as f:
+        return pickle.load(f)
+
+# (path, columns, df hash) -> dataframe opened by DatasetReference.open(), while in use
+_referenced_frames = weakref.WeakValueDictionary()
+
+class DatasetReference(object):
+    """Stands in for a dataframe that can be re-opened from a dataset on disk
+
+    DfxStore saves this instead of a full copy of a dataframe that came from open_frame().
+    The dataset may have changed since (e.g. rows appended, or another file loaded in its
+    place), so the reference keeps the dataframe's hash to tell.
+    """
+
+    def __init__(self, path, columns=None, df_hash=None):
+        self.path = path
+        self.columns = columns
+        self.df_hash = df_hash
+
+    def __repr__(self):
+        return "DatasetReference({}, {})".format(self.path, self.columns)
+
+    def open(self):
+        """The dataframe, or None if the dataset no longer has the same data
+
+        Describers read from a DfxStore each open the dataframe they were saved with, so
+        while one is in use, the others share it instead of decoding its object columns
+        again. It shouldn't be modified.
+        """
+        if not is_dataset(self.path):
+            return None
+        df_hash = getattr(self, 'df_hash', None)
+        fingerprint = read_schema(self.path).get('fingerprint')
+        if df_hash is not None and fingerprint is not None:
+            fingerprint = dfx_fingerprint.Fingerprint.from_dict(fingerprint)
+            if self.columns is not None:
+                fingerprint = fingerprint.subset(self.columns)
+            if fingerprint.df_hash != df_hash:
+                return None
+        key = (os.path.abspath(self.path), None if self.columns is None else tuple(self.columns), df_hash)
+        df = _referenced_frames.get(key)
+        if df is None:
+            df = open_frame(self.path, columns=self.columns)
+            _referenced_frames[key] = df
+        return df
+
+def get_reference(df):
+    """Return a DatasetReference if df came from open_frame(), otherwise None
+    """
+    fingerprint = dfx_fingerprint.get_fingerprint(df)
+    if fingerprint.source is None or not is_dataset(fingerprint.source):
+        return None
+    schema = read_schema(fingerprint.source)
+    all_columns = [col_schema['name'] for col_schema in schema['columns']]
+    columns = None if list(df.columns) == all_columns else list(df.columns)
+    return DatasetReference(fingerprint.source, columns, fingerprint.df_hash)
+
+# #######################################################################################
+# Writing
+
+def write_frame(df, path):
+    """Write df as a dataset, replacing any dataset already at path
+    """
+    writer = ColumnarWriter(path)
+    try:
+        writer.append(df)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close()
+
+class ColumnarWriter(object):
+    """Writes a dataset one chunk of rows at a time
+
+    Usage:
+        writer = ColumnarWriter('data/cars.dfx')
+        for chunk in pd.read_csv('cars.csv', chunksize=100000):
+            writer.append(chunk)
+        writer.close()
+
+    The dataset is written to a temporary directory, which replaces path on close(). With
+    append, rows are appended to the existing dataset at path instead, see module notes.
+
+    Chunks must have the same columns. If a later chunk has a different dtype for a column
+    (e.g. integers, then a chunk with nulls that pandas reads as floats), the rows already
+    written are converted, so the dataset ends up with the dtype pandas would have used
+    for the whole file. A column of numbers in some chunks and text in others ends up as
+    objects of both, which pandas wouldn't give for a whole csv file; dfx.ingest reads
+    such columns again as text instead.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.row_count = 0
+        # written to the schema as 'source', e.g. what dfx.ingest loaded the rows from
+        self.source = None
+        self._col_schemas = None
+        self._index = []
+        self._default_index = True
+        # for CODES columns: position -> dictionary of value to code
+        self._value_codes = {}
+        # files of converted columns, removed once the schema no longer refers to them
+        self._old_files = []
+        # the schema of the dataset being appended to
+        self._previous = None
+        if append:
+            self._resume()
+            return
+        # the directory being written to
+        self._tmp_path = path + '.tmp'
+        if os.path.exists(self._tmp_path):
+            shutil.rmtree(self._tmp_path)
+        os.makedirs(self._tmp_path)
+
+    def _resume(self):
+        """Continue writing the dataset at path, after its last row
+        """
+        if not is_dataset(self.path):
+            raise ValueError("No dataset to append to", self.path)
+        self._tmp_path = self.path
+        self._previous = read_schema(self.path)
+        self.source = self._previous.get('source')
+        self.row_count = self._previous['row_count']
+        self._col_schemas = [dict(col_schema) for col_schema in self._previous['columns']]
+        for i, col_schema in enumerate(self._col_schemas):
+            if col_schema['kind'] == CODES:
+                self._value_codes[i] = dict(
+                    (value, code) for code, value in enumerate(_read_values(self.path, col_schema)))
+            if col_schema['kind'] != PICKLE:
+                # drop anything written after the last row by an append that didn't finish
+                with open(self._file_path(i), 'ab') as f:
+                    f.truncate(self.row_count * np.dtype(_file_dtype(col_schema)).itemsize)
+        self._index = [_read_index(self.path, self._previous)]
+        self._default_index = not self._previous.get('index_file')
+
+    def append(self, chunk):
+        """Append the rows of a dataframe
+        """
+        if self._col_schemas is None:
+            self._col_schemas = [
+                {'name': _json_name(col_name), 'file': '{}.bin'.format(i)}
+                for i, col_name in enumerate(chunk.columns)]
+            for i, col_schema in enumerate(self._col_schemas):
+                self._start_column(i, _kind_and_dtype(chunk.iloc[:, i]))
+        elif len(chunk.columns) != len(self._col_schemas):
+            raise ValueError("Chunk has different columns", list(chunk.columns))
+
+        for i in range(len(self._col_schemas)):
+            self._append_column(i, chunk.iloc[:, i])
+
+        self._append_index(chunk.index)
+        self.row_count += len(chunk)
+
+    def close(self):
+        """Finish writing, calculate the fingerprint, and move the dataset into place
+        """
+        if self._col_schemas is None:
+            raise ValueError("No chunks were appended", self.path)
+        for i, col_schema in enumerate(self._col_schemas):
+            if col_schema['kind'] == CODES:
+                self._write_values(i)
+
+        schema = {
+            'version': SCHEMA_VERSION,
+            'row_count': self.row_count,
+            'columns': self._col_schemas,
+            'index_file': None,
+            'fingerprint': None,
+            'source': self.source,
+            }
+        if not self._default_index:
+            schema['index_file'] = 'index.pickle'
+            _replace_pickle(os.path.join(self._tmp_path, schema['index_file']), self._index[0].append(self._index[1:]))
+        if self._previous is not None:
+            return self._close_append(schema)
+        self._write_schema(schema)
+
+        # fingerprint once, at write time, so readers never need to hash the data
+        df = open_frame(self._tmp_path)
+        schema['fingerprint'] = dfx_fingerprint.calculate_fingerprint(df).to_dict()
+        del df
+        self._write_schema(schema)
+        self._remove_old_files()
+
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.rename(self._tmp_path, self.path)
+        logger.debug("wrote %s rows to %s", self.row_count, self.path)
+        return schema
+
+    def _close_append(self, schema):
+        # the schema is replaced last, so until then readers see the dataset as it was
+        df = _open_frame(self.path, schema)
+        if self._previous.get('fingerprint') is None:
+            fingerprint = dfx_fingerprint.calculate_fingerprint(df)
+        else:
+            fingerprint = dfx_fingerprint.Fingerprint.from_dict(self._previous['fingerprint'])
+            fingerprint = fingerprint.extended(df, self._previous['row_count'])
+        schema['fingerprint'] = fingerprint.to_dict()
+        del df
+        self._write_schema(schema)
+        self._remove_old_files()
+        logger.debug("appended %s rows to %s", self.row_count - self._previous['row_count'], self.path)
+        return schema
+
+    def abort(self):
+        if self._previous is not None:
+            # the dataset is as it was, apart from rows after its last that _resume() drops
+            return
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+
+    # ###################################################################################
+    # helpers
+
+    def _write_schema(self, schema):
+        file_path = os.path.join(self._tmp_path, SCHEMA_FILE)
+        with open(file_path + '.tmp', 'w') as f:
+            json.dump(schema, f)
+        os.replace(file_path + '.tmp', file_path)
+
+    def _remove_old_files(self):
+        for file_path in self._old_files:
+            os.remove(file_path)
+        self._old_files = []
+
+    def _file_path(self, i):
+        return os.path.join(self._tmp_path, self._col_schemas[i]['file'])
+
+    def _start_column(self, i, kind_and_dtype):
+        col_schema = self._col_schemas[i]
+        col_schema['kind'], col_schema['dtype'] = kind_and_dtype
+        col_schema.pop('values_file', None)
+        col_schema.pop('chunks', None)
+        if col_schema['kind'] == CODES:
+            col_schema['values_file'] = '{}.values.pickle'.format(i)
+            self._value_codes[i] = {}
+        if col_schema['kind'] == PICKLE:
+            col_schema['chunks'] = 0
+        else:
+            open(self._file_path(i), 'wb').close()
+
+    def _append_column(self, i, col):
+        col_schema = self._col_schemas[i]
+        kind, dtype = _kind_and_dtype(col)
+        if (kind, dtype) != (col_schema['kind'], col_schema['dtype']):
+            kind, dtype = _common_kind_and_dtype((col_schema['kind'], col_schema['dtype']), (kind, dtype))
+            if (kind, dtype) != (col_schema['kind'], col_schema['dtype']):
+                self._convert_column(i, (kind, dtype))
+
+        if kind == ARRAY:
+            values = np.ascontiguousarray(col.values.astype(np.dtype(dtype), copy=False))
+            with open(self._file_path(i), 'ab') as f:
+                values.tofile(f)
+        elif kind == CODES:
+            codes = self._encode(i, col)
+            with open(self._file_path(i), 'ab') as f:
+                codes.tofile(f)
+        else:
+            with open('{}.{}'.format(self._file_path(i), col_schema['chunks']), 'wb') as f:
+                pickle.dump(col.reset_index(drop=True), f, pickle.HIGHEST_PROTOCOL)
+            col_schema['chunks'] += 1
+
+    def _encode(self, i, col):
+        """Convert values to codes, adding any new values to the column's dictionary
+        """
+        value_codes = self._value_codes[i]
+        chunk_codes, chunk_values = pd.factorize(col)
+        # map this chunk's codes to the column's codes; one lookup per distinct value
+        mapping = np.empty(len(chunk_values) + 1, dtype=CODE_DTYPE)
+        for chunk_code, value in enumerate(chunk_values):
+            code = value_codes.get(value)
+            if code is None:
+                code = value_codes[value] = len(value_codes)
+            mapping[chunk_code] = code
+        mapping[-1] = -1 # factorize uses -1 for nulls
+        return mapping[chunk_codes]
+
+    def _write_values(self, i):
+        values = np.empty(len(self._value_codes[i]), dtype=object)
+        for value, code in self._value_codes[i].items():
+            values[code] = value
+        # the codes of existing values don't change, so readers of fewer rows can use these too
+        _replace_pickle(os.path.join(self._tmp_path, self._col_schemas[i]['values_file']), values)
+
+    def _convert_column(self, i, kind_and_dtype):
+        """Rewrite the rows already written for a column with a new kind/dtype
+        """
+        col_schema = self._col_schemas[i]
+        logger.debug("converting column %s from %s %s to %s %s", col_schema['name'],
+            col_schema['kind'], col_schema['dtype'], kind_and_dtype[0], kind_and_dtype[1])
+        if col_schema['kind'] == CODES:
+            self._write_values(i)
+        old_files = self._column_files(i)
+        existing = pd.Series(_read_column(self._tmp_path, col_schema, self.row_count))
+
+        # the existing file may still be mapped by the series above, so start a new file
+        col_schema['file'] = '{}.{}.bin'.format(i, self._conversions(i))
+        self._start_column(i, kind_and_dtype)
+        if len(existing):
+            self._append_column(i, existing)
+        del existing
+        self._old_files.extend(old_files)
+
+    def _column_files(self, i):
+        col_schema = self._col_schemas[i]
+        if col_schema['kind'] == PICKLE:
+            return ['{}.{}'.format(self._file_path(i), chunk) for chunk in range(col_schema['chunks'])]
+        file_paths = [self._file_path(i)]
+        if col_schema['kind'] == CODES:
+            file_paths.append(os.path.join(self._tmp_path, col_schema['values_file']))
+        return file_paths
+
+    def _conversions(self, i):
+        file_name = self._col_schemas[i]['file']
+        parts = file_name.split('.')
+        return int(parts[1]) + 1 if len(parts) == 3 else 1
+
+    def _append_index(self, index):
+        expected_start = self.row_count
+        if self._default_index and isinstance(index, pd.RangeIndex) and index.step == 1 \
+                and (len(index) == 0 or index.start == expected_start):
+            self._index.append(index)
+            return
+        self._default_index = False
+        self._index.append(index)
+
+def _open_frame(path, schema):
+    """The dataframe of a dataset's schema, which may not have been written yet
+    """
+    # build with positional names, so duplicate column names don't collide
+    data = dict((i, _read_column(path, col_schema, schema['row_count'])) for i, col_schema in enumerate(schema['columns']))
+    df = pd.DataFrame(data, index=_read_index(path, schema), copy=False)
+    df.columns = [col_schema['name'] for col_schema in schema['columns']]
+    return df
+
+def _file_dtype(col_schema):
+    """The dtype of the values in an ARRAY or CODES column's file
+    """
+    return col_schema['dtype'] if col_schema['kind'] == ARRAY else CODE_DTYPE
+
+def _replace_pickle(file_path, value):
+    """Pickle value to file_path, replacing it all at once
+    """
+    with open(file_path + '.tmp', 'wb') as f:
+        pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(file_path + '.tmp', file_path)
+
+def _json_name(col_name):
+    """Column names are kept in json, so numpy scalars are converted to python values
+    """
+    if isinstance(col_name, np.generic):
+        return col_name.item()
+    return col_name
+
+def _kind_and_dtype(col):
+    dtype = col.dtype
+    if isinstance(dtype, np.dtype):
+        if dtype.kind in 'biufcmM':
+            return (ARRAY, dtype.str)
+        if dtype.kind == 'O':
+            return (CODES, 'object')
+    return (PICKLE, str(dtype))
+
+def _common_kind_and_dtype(a, b):
+    """The kind and dtype that can hold values of both a and b
+    """
+    if a[0] == ARRAY and b[0] == ARRAY:
+        dtype = np.result_type(np.dtype(a[1]), np.dtype(b[1]))
+        if dtype.kind in 'biufc':
+            return (ARRAY, dtype.str)
+        # e.g. numbers and datetimes
+        return (CODES, 'object')
+    if PICKLE in (a[0], b[0]):
+        return (PICKLE, 'object')
+    return (CODES, 'object')
@@ -1,6 +1,14 @@
 import os
-import shelve
+import re
+import dbm
+import zlib
+import pickle
+import sqlite3
 import logging
+import threading
+import contextlib
+
+from . import columnar
 
 logger = logging.getLogger(__name__)
 
@@ -28,16 +36,48 @@ class DfxStore(object):
         saves an object with this dataframe, it strips off the reference to the dataframe.
         Each time it returns an object, it reappends this to the objectself.
 
-    Based on python's shelve module
+    -- batch
+
+        By default, every get, save and has opens the backend and closes it again. Inside
+        a batch, the store keeps one handle open and holds saved objects in memory until
+        the outermost batch exits, then writes them together:
+
+            with store.batch():
+                for col_name in df.columns:
+                    store.get_or_create(ColumnNull, df, col_name)
+
+        get_or_create() runs inside a batch, so a describer that creates other describers
+        (like TablePageDescriber) only opens the backend once.
+
+        commit() writes what has been saved so far without leaving the batch, so that other
+        connections can read it.
+
+    -- backends
+
+        Objects are pickled by the store and the bytes are kept by a backend:
+
+            DfxStore(file_path, backend='shelve')   - dbm file, readable with python's shelve module
+            DfxStore(file_path, backend='sqlite')   - sqlite database in WAL mode, which allows
+                                                      concurrent readers alongside one writer
+
+        A backend instance can also be passed, see ShelveBackend for the methods it needs.
     """
 
-    def __init__(self, file_path, exception_if_not_exists=False):
+    def __init__(self, file_path, exception_if_not_exists=False, backend='shelve'):
 
         if not os.path.exists(file_path):
             if exception_if_not_exists:
                 raise ValueError("No file exists for path", file_path)
 
         self._file_path = file_path
+        # kept so worker processes can open the same store, see dfx.parallel
+        self._backend_name = backend if isinstance(backend, str) else None
+        if isinstance(backend, str):
+            try:
+                backend = BACKENDS[backend](file_path)
+            except KeyError:
+                raise ValueError("Unknown backend", backend, sorted(BACKENDS))
+        self._backend = backend
 
         """Force refresh is for generating a describer from scratch, even if it already
         exists in the data store.
@@ -49,62 +89,108 @@ class DfxStore(object):
         """
         self._force_create = False
 
-    def _get_shelf(self, flag=None):
-        """Create a connection to shelf
+        # state while inside batch()
+        self._batch_depth = 0
+        self._pending = {}
 
-        This raises the custom EmptyShelfException if the caller didn't
-        provide flag='c' or 'n', and the shelf hasn't yet been saved
+    @contextlib.contextmanager
+    def batch(self):
+        """Hold one backend handle open, and commit saves when the outermost batch exits
+
+        Batches can be nested; only the outermost one opens and commits. Saves are
+        committed even if the block raises, since each saved object is complete on its own.
         """
+        if self._batch_depth == 0:
+            self._backend.open()
+            self._pending = {}
+        self._batch_depth += 1
         try:
-            if flag:
-                return shelve.open(self._file_path, flag=flag)
-            else:
-                return shelve.open(self._file_path)
-        except Exception as e:
-            if e.args[0] == "need 'c' or 'n' flag to open new db":
-                raise EmptyShelfException
-            else:
-                raise e
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                try:
+                    logger.debug("committing %s objects", len(self._pending))
+                    if self._pending:
+                        self._backend.put_many(self._pending)
+                finally:
+                    self._backend.close()
+                    self._pending = {}
+
+    def commit(self):
+        """Write objects saved in the current batch now, rather than when the batch exits
+
+        For other connections (e.g. worker processes) that need to read them before then.
+        """
+        if self._pending:
+            logger.debug("committing %s objects", len(self._pending))
+            self._backend.put_many(self._pending)
+            self._pending = {}
 
     def delete_all(self):
-        """Delete all items in the shelf
+        """Delete all items in the store
         """
         logger.warn('delete_all()')
-        s = self._get_shelf(flag='n')
-        s.close()
+        self._pending = {}
+        self._backend.delete_all()
+
+    def delete(self, index):
+        """Delete an object, if it is saved
+        """
+        logger.debug("deleting %s", index)
+        self._pending.pop(index, None)
+        self._backend.delete(index)
 
     def get(self, index):
         """Retrieves an object, re-adding dataframe if applicable
-        """
 
-        logger.debug("getting %s", index)
+        A dataframe saved as a reference to a dataset (see columnar.DatasetReference) is
+        opened, and raises KeyError like a missing one if the dataset has changed since.
+        """
+        value = self._get_without_df(index)
+        if isinstance(value, columnar.DatasetReference):
+            df = value.open()
+            if df is None:
+                raise KeyError(index)
+            return df
+        self._restore_df(value)
+        return value
 
-        # open shelf in read only mode
-        s = self._get_shelf(flag='r')
+    def _get_without_df(self, index):
+        """Retrieves an object as saved, without re-adding its dataframe
+        """
 
-        try:
-            value = s[index] # intentionally throws KeyError
-        finally:
-            s.close()
+        logger.debug("getting %s", index)
 
-        self._restore_df(value)
-        return value
+        # inside a batch, use saved but uncommitted objects
+        if index in self._pending:
+            return pickle.loads(self._pending[index])
+        return pickle.loads(self._backend.get(index)) # intentionally throws KeyError
 
     def has(self, index):
         """Check if data store has a value for the given key
         """
-        # check in shelf, and return False if shelf doesn't exist
-        try:
-            s = self._get_shelf(flag='r')
-        except EmptyShelfException:
-            return False
-
-        # if shelf existed, check keys
-        return index in list(s.keys())
+        return index in self._pending or self._backend.has(index)
 
     def keys(self):
-        s = self._get_shelf(flag='r')
-        return list(s.keys())
+        return list(set(self._backend.keys()) | set(self._pending.keys()))
+
+    def find_all(self, pattern):
+        """Every match of a regular expression (of bytes) in the pickles of saved objects,
+        without unpickling them, e.g. the images describers' html refers to
+        """
+        found = set()
+        with self.batch():
+            for key in self.keys():
+                data = self._pending.get(key)
+                if data is None:
+                    try:
+                        data = self._backend.get(key)
+                    except KeyError:
+                        # deleted since keys() was read
+                        continue
+                found.update(re.findall(pattern, data))
+        return found
 
     def save(self, index, value):
         """Save an object, removing dataframe if applicable
@@ -114,15 +200,17 @@ class DfxStore(object):
 
         # remove df, save it for later, and save to store
         df = self._remove_df(value)
-        s = self._get_shelf(flag='c')
         try:
-            s[index] = value
+            # pickle now, since the caller may modify value before a batch commits
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            if self._batch_depth:
+                self._pending[index] = data
+            else:
+                self._backend.put_many({index: data})
         finally:
-            s.close()
-
-        # restore df, so save doesn't have the side effect of stripping it
-        if df is not None:
-            value.df = df
+            # restore df, so save doesn't have the side effect of stripping it
+            if df is not None:
+                value.df = df
 
 
     def get_or_create(self, klas, df, *args, **kwargs):
@@ -133,11 +221,20 @@ class DfxStore(object):
         ignoring any instance already in data store.
 
         """
+        with self.batch():
+            return self._get_or_create(klas, df, *args, **kwargs)
+
+    def _get_or_create(self, klas, df, *args, **kwargs):
         logger.debug("get_or_create() Start: {} / {} / {}".format(klas.__name__, args, kwargs))
 
         # create a shell instance, which won't have anything calculated
         instance = klas(df, *args)
-        
+
+        # some describers are cheaper to recalculate than to store
+        if not getattr(instance, '_cacheable', True):
+            instance._ensure_calculated()
+            return instance
+
         # try getting an existing instance from the store
         force_create = kwargs.get('force_create', False)
         if force_create:
@@ -145,12 +242,19 @@ class DfxStore(object):
         cached = None
         if not force_create and not self._force_create:
             try:
-                cached = self.get(instance.hash)
+                cached = self._get_without_df(instance.hash)
             except EmptyShelfException:
                 pass
             except KeyError:
                 pass
 
+        # The hash only covers the data the describer reads (e.g. a single column), so the
+        # cached instance may have been calculated on an earlier version of the dataframe.
+        # Give it the caller's dataframe, which also avoids loading a copy from the store.
+        if cached is not None and hasattr(cached, 'df'):
+            cached.df = instance.df
+            cached._hash_df = instance._hash_df
+
         # if an instance existed in the store, run with that
         if cached is not None:
             logger.debug("get_or_create() - Found %s", cached.hash)
@@ -163,8 +267,9 @@ class DfxStore(object):
             logger.debug("get_or_create() - Not found, created %s", instance.hash)
         instance._ensure_calculated()
 
-        # save to store then return it
-        self.save(instance.hash, instance)
+        # save to store then return it, unless it ran out of time (see describers.PAGE_TIME_BUDGET)
+        if getattr(instance, '_complete', True):
+            self.save(instance.hash, instance)
 
         # if this call to method used force_create, unset the instance flag now that we are done
         if force_create:
@@ -184,7 +289,9 @@ class DfxStore(object):
         if df_hash is None:
             raise ValueError("Describer did not have a df hash set", type(x))
         if not self.has(df_hash):
-            self.save(df_hash, x.df)
+            # a dataframe opened from a columnar dataset is saved as a reference to it
+            reference = columnar.get_reference(x.df)
+            self.save(df_hash, reference if reference is not None else x.df)
 
         # remove df, but return it (used by .save())
         df = x.df
@@ -204,4 +311,201 @@ class DfxStore(object):
 class EmptyShelfException(Exception):
     pass
 
+# #######################################################################################
+# Backends
+
+class ShelveBackend(object):
+    """Keeps pickled objects in a dbm file, in the same format as python's shelve module
+
+    Every backend provides:
+        open(), close()     - hold a handle between the two calls (used by DfxStore.batch)
+        get(key)            - the bytes saved for key, or raises KeyError
+        has(key)
+        keys()
+        put_many(items)     - save a dictionary of key to bytes
+        delete(key)         - if it is saved
+        delete_all()
+
+    dbm files don't support concurrent writers, and their behavior depends on which dbm
+    module is installed. SqliteBackend doesn't have those limitations.
+    """
+
+    def __init__(self, file_path):
+        self._file_path = file_path
+        self._db = None
+
+    def open(self):
+        self._db = self._get_shelf(flag='c')
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    @contextlib.contextmanager
+    def _connection(self, flag):
+        """Use the handle from open(), or open and close one for a single operation
+        """
+        if self._db is not None:
+            yield self._db
+            return
+        db = self._get_shelf(flag=flag)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def _get_shelf(self, flag=None):
+        """Create a connection to the dbm file
+
+        This raises the custom EmptyShelfException if the caller didn't
+        provide flag='c' or 'n', and the shelf hasn't yet been saved
+        """
+        try:
+            if flag:
+                return dbm.open(self._file_path, flag)
+            else:
+                return dbm.open(self._file_path)
+        except Exception as e:
+            # python 2: "need 'c' or 'n' flag to open new db"
+            # python 3: "db file doesn't exist; use 'c' or 'n' flag to create a new db"
+            if e.args and "'c' or 'n' flag" in str(e.args[0]):
+                raise EmptyShelfException
+            else:
+                raise e
+
+    def get(self, key):
+        try:
+            with self._connection('r') as db:
+                return db[key.encode('utf-8')] # intentionally throws KeyError
+        except EmptyShelfException:
+            raise KeyError(key)
+
+    def has(self, key):
+        try:
+            with self._connection('r') as db:
+                return key.encode('utf-8') in db
+        except EmptyShelfException:
+            return False
+
+    def keys(self):
+        try:
+            with self._connection('r') as db:
+                return [key.decode('utf-8') for key in db.keys()]
+        except EmptyShelfException:
+            return []
+
+    def put_many(self, items):
+        with self._connection('c') as db:
+            for key, data in items.items():
+                db[key.encode('utf-8')] = data
+            if hasattr(db, 'sync'):
+                db.sync()
+
+    def delete(self, key):
+        try:
+            with self._connection('w') as db:
+                if key.encode('utf-8') in db:
+                    del db[key.encode('utf-8')]
+        except EmptyShelfException:
+            pass
+
+    def delete_all(self):
+        if self._db is not None:
+            for key in list(self._db.keys()):
+                del self._db[key]
+            return
+        self._get_shelf(flag='n').close()
+
+class SqliteBackend(object):
+    """Keeps zlib compressed pickles in a sqlite table, with the key as the primary key
+
+    The database runs in write-ahead-log (WAL) mode, so any number of readers (e.g. other
+    browser tabs, other processes) can read while one writer commits. Writes from threads
+    in this process are serialized with a lock, and writes from other processes wait on
+    sqlite's own lock for up to timeout seconds.
+    """
+
+    COMPRESSION_LEVEL = 3
+
+    # file path -> lock, shared by every backend instance in this process
+    _write_locks = {}
+    _write_locks_lock = threading.Lock()
+
+    def __init__(self, file_path, timeout=30):
+        self._file_path = file_path
+        self._timeout = timeout
+        self._conn = None
+        with self._write_locks_lock:
+            self._write_lock = self._write_locks.setdefault(os.path.abspath(file_path), threading.Lock())
+
+    def open(self):
+        self._conn = self._connect()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self._file_path, timeout=self._timeout, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS dfx_store (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+        return conn
+
+    @contextlib.contextmanager
+    def _connection(self):
+        """Use the connection from open(), or open and close one for a single operation
+        """
+        if self._conn is not None:
+            yield self._conn
+            return
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        with self._connection() as conn:
+            row = conn.execute("SELECT value FROM dfx_store WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return zlib.decompress(row[0])
+
+    def has(self, key):
+        with self._connection() as conn:
+            row = conn.execute("SELECT 1 FROM dfx_store WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def keys(self):
+        with self._connection() as conn:
+            return [row[0] for row in conn.execute("SELECT key FROM dfx_store")]
+
+    def put_many(self, items):
+        rows = [(key, zlib.compress(data, self.COMPRESSION_LEVEL)) for key, data in items.items()]
+        with self._write_lock, self._connection() as conn:
+            # take the write lock up front, rather than upgrading from a read lock mid-transaction
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO dfx_store (key, value) VALUES (?, ?)", rows)
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def delete(self, key):
+        with self._write_lock, self._connection() as conn:
+            conn.execute("DELETE FROM dfx_store WHERE key = ?", (key,))
+
+    def delete_all(self):
+        with self._write_lock, self._connection() as conn:
+            conn.execute("DELETE FROM dfx_store")
+
+BACKENDS = {
+    'shelve': ShelveBackend,
+    'sqlite': SqliteBackend,
+    }
+
 
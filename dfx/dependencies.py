@@ -0,0 +1,276 @@
+import numpy as np
+import pandas as pd
+
+"""
+Functional dependencies between columns: which columns determine which others
+
+Column a determines column b (a -> b) if rows with the same value of a always have the same
+value of b, e.g. city -> state -> region. Then a and b have a 1:many mapping, or 1:1 if b
+also determines a.
+
+Every column is factorized once into integer codes (null counts as a value). Whether a
+determines b is then a partition refinement check, without hashing or grouping: give each
+code of a the code of b from any of its rows, and check that every row agrees
+
+    code_map = np.empty(cardinality_a); code_map[codes_a] = codes_b
+    (code_map[codes_a] == codes_b).all()
+
+find_dependencies() checks the columns of a table, in the style of TANE, avoiding most
+checks:
+
+    cardinality     a -> b is only possible if a has at least as many distinct values as b
+    equivalence     columns that are 1:1 with each other are checked once, as one column
+    transitivity    a -> c is not checked if a -> b and b -> c were found already
+    sample          a check fails on the leading SAMPLE_ROWS rows before scanning all rows
+
+Usage:
+    dependencies = find_dependencies(df)
+    dependencies.determines('city', 'region')   # True
+    dependencies.hierarchies()                  # [['region', 'state', 'city']]
+"""
+
+# refines() checks this many leading rows before checking all of them
+SAMPLE_ROWS = 10000
+
+# Dependencies.hierarchies() lists at most this many
+MAX_HIERARCHIES = 100
+
+# #######################################################################################
+# Factorized columns
+
+def factorize_with_nulls(col, sort=False):
+    """Codes of col and the number of distinct values, with null as one more value (the last)
+    """
+    codes, uniques = pd.factorize(col, sort=sort)
+    cardinality = len(uniques)
+    if (codes < 0).any():
+        codes = np.where(codes < 0, cardinality, codes)
+        cardinality += 1
+    return codes.astype(np.int64), cardinality
+
+def refines(codes_1, cardinality_1, codes_2, sample_rows=SAMPLE_ROWS):
+    """If column 1 determines column 2, returns the code of column 2 for each code of
+    column 1, otherwise None
+    """
+    code_map = np.zeros(cardinality_1, dtype=codes_2.dtype)
+    if len(codes_1) > sample_rows:
+        code_map[codes_1[:sample_rows]] = codes_2[:sample_rows]
+        if not (code_map[codes_1[:sample_rows]] == codes_2[:sample_rows]).all():
+            return None
+    code_map[codes_1] = codes_2
+    if not (code_map[codes_1] == codes_2).all():
+        return None
+    return code_map
+
+def mapping_counts(codes_1, cardinality_1, codes_2, cardinality_2):
+    """For two factorized columns, returns (most values of column 2 that a value of column 1
+    maps to, most values of column 1 that a value of column 2 maps to)
+
+    Either is 1 if that column determines the other.
+    """
+    if not len(codes_1):
+        return 0, 0
+    code_map = refines(codes_1, cardinality_1, codes_2)
+    if code_map is not None:
+        return 1, int(np.bincount(code_map, minlength=cardinality_2).max())
+    code_map = refines(codes_2, cardinality_2, codes_1)
+    if code_map is not None:
+        return int(np.bincount(code_map, minlength=cardinality_1).max()), 1
+
+    # many:many, so count distinct pairs
+    pairs = pd.unique(codes_1 * cardinality_2 + codes_2)
+    return int(np.bincount(pairs // cardinality_2).max()), int(np.bincount(pairs % cardinality_2).max())
+
+def pair_counts(df, col_1_name, col_2_name):
+    """Rows for each pair of values, like df.groupby([col_1_name, col_2_name]).size()
+
+    Returns a dataframe with columns col_1_name, col_2_name and 'row_count', sorted by value.
+    Rows with nulls are left out, as groupby() does.
+    """
+    codes_1, uniques_1 = pd.factorize(df[col_1_name], sort=True)
+    codes_2, uniques_2 = pd.factorize(df[col_2_name], sort=True)
+    present = (codes_1 >= 0) & (codes_2 >= 0)
+    pairs, row_counts = np.unique(
+        codes_1[present].astype(np.int64) * len(uniques_2) + codes_2[present], return_counts=True)
+    return pd.DataFrame({
+        col_1_name: np.asarray(uniques_1)[pairs // max(len(uniques_2), 1)],
+        col_2_name: np.asarray(uniques_2)[pairs % max(len(uniques_2), 1)],
+        'row_count': row_counts,
+        }, columns=[col_1_name, col_2_name, 'row_count'])
+
+# #######################################################################################
+# Table
+
+class Dependencies(object):
+    """The functional dependencies between columns of a table, see find_dependencies()
+
+    .columns        the columns checked, which leaves out columns that are constant or have a
+                    different value on every row, since every column determines those
+    .cardinality    column -> number of distinct values
+    .equivalent     column -> the column representing its 1:1 equivalence class
+    .direct         representative column -> representative columns it determines, not
+                    counting those it only determines through another one
+    """
+
+    def __init__(self, columns, cardinality, equivalent, direct, code_maps):
+        self.columns = columns
+        self.cardinality = cardinality
+        self.equivalent = equivalent
+        self.direct = direct
+        # (column, column) -> code map, for each direct dependency and each equivalent column
+        # to its representative
+        self._code_maps = code_maps
+        # representative -> every representative it determines
+        self._closure = {}
+        for col_name in sorted(direct, key=lambda col_name: cardinality[col_name]):
+            closure = set()
+            for determined in direct[col_name]:
+                closure.add(determined)
+                closure |= self._closure[determined]
+            self._closure[col_name] = closure
+
+    def determines(self, col_1_name, col_2_name):
+        """True if col_1_name determines col_2_name (including if they are 1:1)
+        """
+        if col_1_name not in self.equivalent or col_2_name not in self.equivalent:
+            return False
+        representative_1 = self.equivalent[col_1_name]
+        representative_2 = self.equivalent[col_2_name]
+        return representative_1 == representative_2 or representative_2 in self._closure[representative_1]
+
+    def mapping_counts(self, col_1_name, col_2_name):
+        """Like mapping_counts() for two columns, or None if neither determines the other
+        """
+        if self.determines(col_1_name, col_2_name):
+            code_map = self._code_map(col_1_name, col_2_name)
+            return 1, int(np.bincount(code_map, minlength=self.cardinality[col_2_name]).max())
+        if self.determines(col_2_name, col_1_name):
+            code_map = self._code_map(col_2_name, col_1_name)
+            return int(np.bincount(code_map, minlength=self.cardinality[col_1_name]).max()), 1
+        return None
+
+    def mappings(self):
+        """mapping_counts() of every pair of columns where one determines the other
+
+        Returns a dictionary of (column 1, column 2) to mapping counts, with column 1 before
+        column 2 in .columns.
+        """
+        results = {}
+        for i, col_1_name in enumerate(self.columns):
+            for col_2_name in self.columns[i + 1:]:
+                counts = self.mapping_counts(col_1_name, col_2_name)
+                if counts is not None:
+                    results[(col_1_name, col_2_name)] = counts
+        return results
+
+    def equivalence_classes(self):
+        """Lists of columns that are 1:1 with each other, for classes of more than one column
+        """
+        classes = {}
+        for col_name in self.columns:
+            classes.setdefault(self.equivalent[col_name], []).append(col_name)
+        return [members for members in classes.values() if len(members) > 1]
+
+    def hierarchies(self, max_hierarchies=MAX_HIERARCHIES):
+        """Chains of representative columns, each with one value for many values of the next,
+        from the coarsest column to the finest (e.g. ['region', 'state', 'city'])
+        """
+        children = dict((col_name, []) for col_name in self.direct)
+        for col_name in self.columns:
+            if self.equivalent[col_name] == col_name:
+                for determined in self.direct[col_name]:
+                    children[determined].append(col_name)
+        roots = [
+            col_name for col_name in self.columns
+            if self.equivalent[col_name] == col_name and not self.direct[col_name] and children[col_name]]
+
+        hierarchies = []
+        def walk(chain):
+            if len(hierarchies) >= max_hierarchies:
+                return
+            if not children[chain[-1]]:
+                hierarchies.append(chain)
+                return
+            for child in children[chain[-1]]:
+                walk(chain + [child])
+        for root in roots:
+            walk([root])
+        return hierarchies
+
+    def _code_map(self, col_1_name, col_2_name):
+        """Code of col_2_name for each code of col_1_name, given col_1_name determines col_2_name
+        """
+        representative_1 = self.equivalent[col_1_name]
+        representative_2 = self.equivalent[col_2_name]
+        if col_1_name == representative_1:
+            code_map = np.arange(self.cardinality[col_1_name])
+        else:
+            code_map = self._code_maps[(col_1_name, representative_1)]
+
+        # follow direct dependencies to representative_2
+        col_name = representative_1
+        while col_name != representative_2:
+            col_name_next = [
+                determined for determined in self.direct[col_name]
+                if determined == representative_2 or representative_2 in self._closure[determined]][0]
+            code_map = self._code_maps[(col_name, col_name_next)][code_map]
+            col_name = col_name_next
+
+        if col_2_name != representative_2:
+            # equivalent columns map 1:1, so invert col_2_name's map to its representative
+            to_representative = self._code_maps[(col_2_name, representative_2)]
+            inverse = np.empty(len(to_representative), dtype=to_representative.dtype)
+            inverse[to_representative] = np.arange(len(to_representative))
+            code_map = inverse[code_map]
+        return code_map
+
+def find_dependencies(df, columns=None, sample_rows=SAMPLE_ROWS):
+    """Find the functional dependencies between the columns of df, see module notes
+
+    Returns Dependencies.
+    """
+    if columns is None:
+        columns = list(df.columns)
+    factorized = dict((col_name, factorize_with_nulls(df[col_name])) for col_name in columns)
+    cardinality = dict((col_name, factorized[col_name][1]) for col_name in columns)
+    columns = [col_name for col_name in columns if 1 < cardinality[col_name] < len(df)]
+    code_maps = {}
+
+    # equivalence classes, from columns with the same cardinality
+    equivalent = {}
+    representatives = []
+    for col_name in sorted(columns, key=lambda col_name: cardinality[col_name]):
+        codes, col_cardinality = factorized[col_name]
+        for representative in representatives:
+            if cardinality[representative] != col_cardinality:
+                continue
+            code_map = refines(codes, col_cardinality, factorized[representative][0], sample_rows)
+            if code_map is not None:
+                equivalent[col_name] = representative
+                code_maps[(col_name, representative)] = code_map
+                break
+        else:
+            equivalent[col_name] = col_name
+            representatives.append(col_name)
+
+    # dependencies between representatives, coarsest first, so that what coarser columns
+    # determine is known when checking finer ones
+    direct = {}
+    closure = {}
+    for i, col_1_name in enumerate(representatives):
+        codes_1, cardinality_1 = factorized[col_1_name]
+        direct[col_1_name] = []
+        closure[col_1_name] = set()
+        # finest first, so a dependency through a finer column is found before the coarser one
+        for col_2_name in reversed(representatives[:i]):
+            if cardinality[col_2_name] >= cardinality_1 or col_2_name in closure[col_1_name]:
+                continue
+            code_map = refines(codes_1, cardinality_1, factorized[col_2_name][0], sample_rows)
+            if code_map is None:
+                continue
+            direct[col_1_name].append(col_2_name)
+            code_maps[(col_1_name, col_2_name)] = code_map
+            closure[col_1_name].add(col_2_name)
+            closure[col_1_name] |= closure[col_2_name]
+
+    return Dependencies(columns, cardinality, equivalent, direct, code_maps)
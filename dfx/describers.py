@@ -1,17 +1,61 @@
 import os
+import re
+import copy
+import time
 import enum
-import random
+import html
+import json
+import hashlib
+import contextlib
+import contextvars
 
 import jinja2
 import numpy as np # for is_numeric()
-import pandas.util # for get_df_hash()
 import pandas as pd
 
 from . import html as dfx_html
+from . import fingerprint as dfx_fingerprint
+from . import stats as dfx_stats
+from . import value_index as dfx_value_index
+from . import relationships as dfx_relationships
+from . import dependencies as dfx_dependencies
+from . import keys as dfx_keys
+from . import sampling as dfx_sampling
+from . import sketches as dfx_sketches
 
 _IMAGE_BASE_PATH = ''
 
-# see helpers at bottom for on-demand imports: numpy, pandas.util
+# names of the images describers render, see propose_image_path()
+IMAGE_NAME_PATTERN = rb'image_[0-9a-z]+\.png'
+
+# remove_unused_images() leaves images younger than this many seconds, which may belong to
+# describers that are still being calculated and aren't saved yet
+IMAGE_MIN_AGE = 3600
+
+# seconds a page describer may spend calculating the describers it lists, after which the rest
+# are listed as skipped and the page isn't saved (see ColumnPageDescriber), or None for no limit
+PAGE_TIME_BUDGET = None
+
+# the current thread's PAGE_TIME_BUDGET while set, see use_page_time_budget()
+_UNSET = object()
+_current_page_time_budget = contextvars.ContextVar('dfx_page_time_budget', default=_UNSET)
+
+def get_page_time_budget():
+    budget = _current_page_time_budget.get()
+    return PAGE_TIME_BUDGET if budget is _UNSET else budget
+
+@contextlib.contextmanager
+def use_page_time_budget(seconds):
+    """Give pages calculated in this thread seconds (or None for no limit) instead of
+    PAGE_TIME_BUDGET, without changing the budget of other threads
+    """
+    token = _current_page_time_budget.set(seconds)
+    try:
+        yield
+    finally:
+        _current_page_time_budget.reset(token)
+
+# see helpers at bottom for on-demand imports: numpy
 
 """
 
@@ -77,6 +121,161 @@ class DescriberFactory(object):
 
 factory = DescriberFactory()
 
+# the factory of the current thread (e.g. a web request), which describers use instead of
+# the module's factory while it is set, see use_factory()
+_current_factory = contextvars.ContextVar('dfx_describers_factory', default=None)
+
+def get_factory():
+    """The factory describers get the describers they read from: the current thread's if
+    use_factory() set one, otherwise the module's factory
+    """
+    current = _current_factory.get()
+    return factory if current is None else current
+
+@contextlib.contextmanager
+def use_factory(new_factory):
+    """Use new_factory in this thread, without changing the factory of other threads
+
+        with use_factory(DeferringFactory(store)):
+            page = TablePageDescriber(df)
+            page.html
+    """
+    token = _current_factory.set(new_factory)
+    try:
+        yield new_factory
+    finally:
+        _current_factory.reset(token)
+
+class DeferringFactory(object):
+    """Returns the describers a store has saved, and DeferredDescriber placeholders for the rest
+
+    Used to build a page right away from what has been calculated so far (see progressive mode
+    in dfx.web). Only FRAGMENT_CLASSES are deferred, since the page's placeholders are filled in
+    by looking them up by name.
+
+    .deferred
+        list of (class, args) of the describers given out as placeholders
+    """
+    def __init__(self, store):
+        self._store = store
+        self.deferred = []
+
+    def get_or_create(self, klass, df, *args, **kwargs):
+        instance = klass(df, *args)
+        if klass.__name__ not in FRAGMENT_CLASSES or not getattr(instance, '_cacheable', True) or self._store.has(instance.hash):
+            return self._store.get_or_create(klass, df, *args)
+        self.deferred.append((klass, args))
+        return DeferredDescriber(klass, args)
+
+    def has(self, hash):
+        return self._store.has(hash)
+
+class DeferredDescriber(object):
+    """Stands in for a describer that hasn't been calculated yet, see DeferringFactory
+
+    .description and .html are placeholders, which deferred.js replaces once the describer is
+    calculated. .qualified is True, so pages show the placeholder, but a page that checks it
+    only shows describers that are qualified, so the placeholder is removed if this one isn't.
+    """
+
+    valid = True
+
+    def __init__(self, klass, args):
+        self.klass = klass
+        self.args = args
+        self._qualified_only = False
+
+    @property
+    def qualified(self):
+        self._qualified_only = True
+        return True
+
+    @property
+    def description(self):
+        return self._placeholder('description')
+
+    @property
+    def html(self):
+        return self._placeholder('html')
+
+    def suppresses(self, other_describer):
+        return False
+
+    def _placeholder(self, field, content='calculating&hellip;', title=''):
+        return (
+            "<span class='dfx-deferred' data-url='{prefix}/fragments' data-describer='{name}' data-args='{args}' "
+            "data-field='{field}' data-qualified-only='{qualified_only}' title='{title}'>{content}</span>").format(
+                prefix=dfx_html._URL_PREFIX,
+                name=self.klass.__name__,
+                args=html.escape(json.dumps(list(self.args)), quote=True),
+                field=field,
+                qualified_only='true' if self._qualified_only else 'false',
+                title=html.escape(title, quote=True),
+                content=content,
+                )
+
+class SamplingFactory(DeferringFactory):
+    """Returns describers of large dataframes calculated on a sample, see dfx.sampling
+
+    Describers the store has saved are returned as they are. Others of dataframes with more
+    than threshold rows are calculated on a sample (see Describer.sample()) and returned as
+    ApproximateDescriber, which deferred.js replaces with the exact describer once it is
+    calculated. Only FRAGMENT_CLASSES with a ._sample_rows are sampled.
+
+    .deferred
+        list of (class, args) of the describers given out as approximate
+    """
+    def __init__(self, store, threshold=dfx_sampling.SAMPLING_THRESHOLD):
+        DeferringFactory.__init__(self, store)
+        self._threshold = threshold
+
+    def get_or_create(self, klass, df, *args, **kwargs):
+        if klass.__name__ not in FRAGMENT_CLASSES or not dfx_sampling.should_sample(df, klass._sample_rows, self._threshold):
+            return self._store.get_or_create(klass, df, *args)
+        instance = klass(df, *args)
+        if self._store.has(instance.hash):
+            return self._store.get_or_create(klass, df, *args)
+        describer = self._store.get_or_create(klass, klass.sample(df, *args), *args)
+        self.deferred.append((klass, args))
+        return ApproximateDescriber(klass, args, describer)
+
+class ApproximateDescriber(DeferredDescriber):
+    """Stands in for a describer with the same describer calculated on a sample, see
+    SamplingFactory
+
+    .description and .html are the sample describer's, marked approximate, until deferred.js
+    replaces them with the exact describer's. Other attributes are the sample describer's.
+    """
+
+    def __init__(self, klass, args, describer):
+        DeferredDescriber.__init__(self, klass, args)
+        self.describer = describer
+        self.sample_info = dfx_sampling.get_sample_info(describer.df)
+
+    @property
+    def qualified(self):
+        self._qualified_only = True
+        return self.describer.qualified
+
+    @property
+    def description(self):
+        return self._placeholder('description', "&asymp; " + self.describer.description, self._title())
+
+    @property
+    def html(self):
+        # the page replaces the url prefix
+        self.describer._url_prefix = dfx_html._URL_PREFIX
+        return self._placeholder('html', self.describer.html, self._title())
+
+    def suppresses(self, other_describer):
+        return self.describer.suppresses(getattr(other_describer, 'describer', other_describer))
+
+    def _title(self):
+        return "Approximate, from a {}".format(self.sample_info)
+
+    def __getattr__(self, name):
+        return getattr(self.describer, name)
+
 # #######################################################################################
 # Describer State
 
@@ -150,6 +349,23 @@ class Describer(object):
     .hash
         A string describing the class and initializing arguments, used by the dfx data store
 
+    ._cacheable
+        If False, DfxStore.get_or_create() calculates the describer every time instead of
+        saving it. For describers that are cheap to calculate from other cached data, but
+        would otherwise be saved once per argument (e.g. every value of a column).
+
+    ._complete
+        False once calculated if a page describer skipped describers to stay within
+        PAGE_TIME_BUDGET, in which case DfxStore.get_or_create() doesn't save it.
+
+    ._sample_rows
+        Rows of the sample SamplingFactory calculates the describer on for large dataframes
+        (see .sample()), or None to always calculate it on the whole dataframe.
+
+    .required_describers(df, *args)
+        Page describers list the describers they read, as stages of (class, args), so that
+        dfx.parallel can calculate them in worker processes before the page is built.
+
     .urls
         When generating .html, this class is used to consruct URLs to related pages. By default,
         it uses dfx_html.UrlMaker.
@@ -179,6 +395,9 @@ class Describer(object):
     _hash_args = None
 
     # calculation properties
+    _cacheable = True
+    _complete = True
+    _sample_rows = None
     _state = State.UNCALCULATED
     _description = None
     _html = None
@@ -210,12 +429,24 @@ class Describer(object):
             raise ValueError("df is None")
         self._hash_df = get_df_hash(self.df)
         self._hash_args = ", ".join([str(arg) for arg in args])
-        self._hash="{klass:}({df_hash:}, {args_hash:})".format(
+        data_hash = self._get_data_hash(*args)
+        # describers of a sketched dataframe read estimates, so never stand in for exact ones
+        if dfx_sketches.is_sketched(self.df):
+            data_hash += '~sketched'
+        self._hash="{klass:}({data_hash:}, {args_hash:})".format(
             klass = self.__class__.__name__,
-            df_hash = self._hash_df,
+            data_hash = data_hash,
             args_hash = self._hash_args,
             )
 
+    def _get_data_hash(self, *args):
+        """The part of .hash that identifies the data this describer reads
+
+        By default this is the entire dataframe. Subclasses that only read some columns
+        override this, so that changes to other columns don't invalidate them.
+        """
+        return self._hash_df
+
     @property
     def hash(self):
         """A hash specifically designed for the dfx key-value store
@@ -283,6 +514,18 @@ class Describer(object):
         """
         return False
 
+    @classmethod
+    def sample(cls, df, *args):
+        """The sample of df SamplingFactory calculates an approximate describer on
+        """
+        return dfx_sampling.sample_frame(df, cls._sample_rows)
+
+    @property
+    def sample_info(self):
+        """dfx.sampling.SampleInfo if the describer was calculated on a sample, otherwise None
+        """
+        return dfx_sampling.get_sample_info(self.df)
+
 
 # #######################################################################################
 # Basics
@@ -323,6 +566,117 @@ class ColumnDescriber(Describer):
         self._set_hash(col_name)
         self.col_name = col_name
 
+    _sample_rows = dfx_sampling.SAMPLE_ROWS
+
+    def _get_data_hash(self, col_name):
+        """Only the values of col_name
+        """
+        return get_column_hash(self.df, col_name)
+
+    @property
+    def profile(self):
+        """The ColumnStats of this column, shared by every describer of the column
+
+        See ColumnProfile and dfx.stats.profile_column()
+        """
+        return get_factory().get_or_create(ColumnProfile, self.df, self.col_name).profile
+
+class ColumnProfile(ColumnDescriber):
+    """Statistics about the column calculated in one pass, which the other column describers read
+    instead of scanning the column themselves
+
+    For sketched dataframes (see dfx.sketches), distinct counts and top values are estimates.
+
+    Valid     - always
+    Qualified - always
+    """
+
+    _qualified_dfs = [
+        ('integers', pd.DataFrame(dict(val=[1, 2, 3]))),
+        ('text with nulls', pd.DataFrame(dict(val=['abc', None, 'abc']))),
+        ]
+    _unqualified_dfs = []
+
+    @property
+    def profile(self):
+        self._ensure_calculated()
+        return self.stats
+
+    @classmethod
+    def from_stats(cls, df, col_name, stats):
+        """A profile of ColumnStats calculated some other way, e.g. by dfx.streaming from a file
+        """
+        profile = cls(df, col_name)
+        profile.stats = stats
+        profile._state = State.QUALIFIED
+        profile._describe()
+        return profile
+
+    def _calculate(self):
+        if dfx_sketches.is_sketched(self.df):
+            self.stats = dfx_sketches.sketch_column(self.df[self.col_name])
+        else:
+            self.stats = dfx_stats.profile_column(self.df[self.col_name])
+        self._describe()
+
+    def _describe(self):
+        self._description = '{} rows, {} nulls, {} distinct values'.format(
+            self.stats.row_count, self.stats.null_count, self.stats.distinct_count)
+        if self.stats.distinct_error:
+            self._description += " ({})".format(sketch_text(self.stats))
+
+        # most common values, for the column page
+        top_values = pd.DataFrame(self.stats.top_values[:5], columns=['value', 'value count'])
+        self._html = dfx_html.df_to_html_value_counts(top_values, self.col_name, self.urls)
+        if self.stats.top_values_error:
+            self._html += "\n<p>Approximate counts, each up to {:,} below the true count (Misra-Gries summary)</p>".format(
+                self.stats.top_values_error)
+
+class ColumnTally(ColumnDescriber):
+    """A dfx.sketches.ColumnSketch of the column, which rows appended to the dataset are added
+    to (see dfx.incremental) to update its ColumnProfile without reading the earlier rows again
+
+    The sketch counts every distinct value exactly, unless the dataframe is sketched. It isn't
+    shown on any page.
+
+    Valid     - always
+    Qualified - always
+    """
+
+    _qualified_dfs = [
+        ('integers', pd.DataFrame(dict(val=[1, 2, 3]))),
+        ]
+    _unqualified_dfs = []
+
+    # a tally of a sample couldn't be added to
+    _sample_rows = None
+
+    @property
+    def sketch(self):
+        self._ensure_calculated()
+        return self._sketch
+
+    @classmethod
+    def extended(cls, previous, df, start_row):
+        """The tally of df, whose first start_row rows are the rows previous was calculated on,
+        adding only the rows after them to a copy of previous's sketch
+        """
+        tally = cls(df, previous.col_name)
+        tally._sketch = copy.deepcopy(previous.sketch)
+        tally._state = State.QUALIFIED
+        tally._add_rows(start_row)
+        return tally
+
+    def _calculate(self):
+        self._sketch = dfx_sketches.ColumnSketch(exact=not dfx_sketches.is_sketched(self.df))
+        self._add_rows(0)
+
+    def _add_rows(self, start_row):
+        col = self.df[self.col_name]
+        for start in range(start_row, len(col), dfx_sketches.CHUNK_ROWS):
+            self._sketch.add(col.iloc[start:start + dfx_sketches.CHUNK_ROWS])
+        self._description = '{} rows tallied'.format(self._sketch.row_count)
+
 class ColumnId(ColumnDescriber):
     """
     Valid     - always
@@ -341,9 +695,9 @@ class ColumnId(ColumnDescriber):
         ]
 
     def _calculate(self):
-        col = self.df[self.col_name]
-        self._is_integer = (col.dtypes == 'int64')
-        self._is_unique = not (col.duplicated().any())
+        profile = self.profile
+        self._is_integer = (profile.dtype == 'int64')
+        self._is_unique = (profile.duplicate_count == 0)
         if not (self._is_integer & self._is_unique):
             self._state = State.UNQUALIFIED
             if not self._is_integer:
@@ -355,11 +709,11 @@ class ColumnId(ColumnDescriber):
         # if qualified
         self._description = "Unique integer"
 
-        self._is_consecutive = (col.diff()[1:]==1).all()
+        self._is_consecutive = profile.is_consecutive
         self._description += ", consecutive" if self._is_consecutive else ", non-consecutive"
 
-        self._min = col.min()
-        self._max = col.max()
+        self._min = profile.min
+        self._max = profile.max
         self._description += ", {}-{}".format(self._min, self._max)
 
     def suppresses(self, other_describer):
@@ -369,7 +723,7 @@ class ColumnId(ColumnDescriber):
             # don't suppress if not same df and column
             if self.col_name != other_describer.col_name:
                 return False
-            if not self.df.equals(other_describer.df):
+            if self._hash_df != other_describer._hash_df:
                 return False
 
             # suppresses Numeric
@@ -391,15 +745,13 @@ class ColumnText(ColumnDescriber):
         ]
 
     def _calculate(self):
-        col = self.df[self.col_name]
-        non_str_types = [str(val_type) for val_type in list(col.apply(type).unique()) if val_type not in [str, str]]
-        if non_str_types:
-            self._description = "Non string types: {}".format(", ".join(non_str_types))
+        profile = self.profile
+        if not profile.is_text:
+            self._description = "Non string types: {}".format(profile.inferred_type)
             self._state = State.UNQUALIFIED
             return
 
-        values = col.unique()
-        value_list = ", ".join(values)
+        value_list = ", ".join(profile.first_values)
         # Truncate to 100 character list
         if len(value_list) > 100:
             value_list = value_list[:100] + " [truncated...]"
@@ -418,13 +770,16 @@ class ColumnDuplicated(ColumnDescriber):
         ]
 
     def _calculate(self):
-        self._duplicate_rate = self.df[self.col_name].duplicated().mean()
+        self._duplicate_rate = self.profile.duplicate_rate
         if self._duplicate_rate < DUPLICATION_THRESHOLD:
             self._state = State.UNQUALIFIED
             self._description = 'Duplication rate {:.1%} is below threshold {:.1%}'.format(self._duplicate_rate, DUPLICATION_THRESHOLD)
-            return
-
-        self._description = 'Duplicated ({:.1%})'.format(self._duplicate_rate)
+        else:
+            self._description = 'Duplicated ({:.1%})'.format(self._duplicate_rate)
+        if self.sample_info is not None:
+            self._description += " ({})".format(duplicate_interval_text(self.profile))
+        if self.profile.distinct_error:
+            self._description += " ({})".format(sketch_text(self.profile))
 
 class ColumnNumeric(ColumnDescriber):
     """Qualified if col dtype is numeric
@@ -441,29 +796,36 @@ class ColumnNumeric(ColumnDescriber):
 
     def _calculate(self):
         col = self.df[self.col_name]
-        self._is_numeric = np.issubdtype(col.dtype, np.number)
+        profile = self.profile
+        self._is_numeric = dfx_stats.is_numeric_dtype(col.dtype)
 
         if not self._is_numeric:
             self._state = State.UNQUALIFIED
             self._description = "Non-numeric type: {}".format(col.dtype)
             return
 
-        self._min = col.min()
-        self._max = col.max()
+        self._min = profile.min
+        self._max = profile.max
         self._description = 'Numeric ({}-{})'.format(self._min, self._max)
+        if profile.histogram is None:
+            return
 
-        # histogram
+        # histogram, from the profile so that the column isn't read again
         import matplotlib.pyplot as plt
         try:
-            f = plt.figure()
-            plt.hist(col)
-            image_path, image_url = propose_image_path()
-            plt.savefig(image_path)
+            counts, edges = profile.histogram
+            image_path, image_url = propose_image_path(self, 'histogram', list(edges))
+            if not os.path.exists(image_path):
+                f = plt.figure()
+                plt.bar(edges[:-1], counts, width=np.diff(edges), align='edge')
+                save_figure(f, image_path)
 
             self._html = """
                 <p>{}</p>
+                <p>Mean {:.4g}, standard deviation {}</p>
                 <img src="{}">
-                """.format(self._description, image_url)
+                """.format(self._description, profile.mean,
+                    'n/a' if profile.std is None else '{:.4g}'.format(profile.std), image_url)
         except Exception as e:
             self._html = """
                 <p>{}</p>
@@ -478,13 +840,16 @@ class ColumnNull(ColumnDescriber):
     _unqualified_dfs = [('one null', pd.DataFrame(dict(val=[10, None, 30])))]
 
     def _calculate(self):
-        self._null_rate = self.df[self.col_name].isnull().mean()
-        self._null_count = self.df[self.col_name].isnull().sum()
+        self._null_rate = self.profile.null_rate
+        self._null_count = self.profile.null_count
         if self._null_rate == 0:
             self._description = "No nulls"
         else:
             self._description = '{:.1%} nulls ({})'.format(self._null_rate, self._null_count)
             self._state = State.UNQUALIFIED
+        if self.sample_info is not None:
+            self._description += " ({})".format(
+                interval_text(dfx_sampling.wilson_interval(self._null_count, self.profile.row_count), '{:.2%}'))
 
 class ColumnUnique(ColumnDescriber):
     """Qualified if no values are repeated
@@ -494,15 +859,39 @@ class ColumnUnique(ColumnDescriber):
     _unqualified_dfs = [('repeated value', pd.DataFrame(dict(val=[10, 10, 30])))]
 
     def _calculate(self):
-        self._duplicate_rate = self.df[self.col_name].duplicated().mean()
+        self._duplicate_rate = self.profile.duplicate_rate
         if self._duplicate_rate == 0:
             self._description = 'Unique'
         else:
             self._description = "{:.1%} duplicated".format(self._duplicate_rate)
             self._state = State.UNQUALIFIED
+        if self.sample_info is not None:
+            self._description += " ({})".format(duplicate_interval_text(self.profile))
+        if self.profile.distinct_error:
+            self._description += " ({})".format(sketch_text(self.profile))
 
 COLUMN_CLASSES = [ColumnId, ColumnText, ColumnNumeric, ColumnNull, ColumnUnique, ColumnDuplicated]
 
+class ColumnSummary(ColumnDescriber):
+    """The column's line on the table page: the descriptions of its qualified COLUMN_CLASSES
+    describers, except ones another of them suppresses
+    """
+    _qualified_dfs = [
+        ('id', pd.DataFrame(dict(id=[1, 2, 3]))),
+        ('text', pd.DataFrame(dict(val=['abc', 'def', 'xyz']))),
+        ]
+    _unqualified_dfs = []
+
+    def _calculate(self):
+        qualified_describers = []
+        for describer_class in COLUMN_CLASSES:
+            describer = get_factory().get_or_create(describer_class, self.df, self.col_name)
+            if describer.qualified:
+                qualified_describers.append(describer)
+        (unsuppressed_describers, suppressed_describers) = suppression_check(qualified_describers)
+        self._descriptions = [describer.description for describer in unsuppressed_describers]
+        self._description = ". ".join(self._descriptions)
+
 class ColumnPageDescriber(ColumnDescriber):
     _qualified_dfs = [
         ('consecutive id', pd.DataFrame(dict(id=[1, 2, 3]))),
@@ -517,6 +906,47 @@ class ColumnPageDescriber(ColumnDescriber):
         ]
     _unqualified_dfs = []
 
+    # the page is built from describers of the whole dataframe, some of which may be sampled
+    _sample_rows = None
+
+    def _get_data_hash(self, col_name):
+        """Sample rows and relationships read the rest of the dataframe, so the whole dataframe
+        """
+        return self._hash_df
+
+    @classmethod
+    def required_describers(cls, df, col_name):
+        """The describers _calculate() reads, see dfx.parallel
+        """
+        profiles = [(ColumnProfile, (other_name,)) for other_name in df.columns]
+        describers = [(describer_class, (col_name,)) for describer_class in COLUMN_CLASSES]
+        for col_2_name in df.columns:
+            if col_2_name != col_name:
+                describers.extend((relationship_class, (col_name, col_2_name)) for relationship_class in RELATIONSHIP_CLASSES)
+        return [profiles, describers]
+
+    @classmethod
+    def _relationship_order(cls, df, col_name):
+        """The other columns, in the order their relationships are calculated
+
+        Cheapest first, so that as many as possible fit in PAGE_TIME_BUDGET, with the
+        estimated cost (see RelationshipDescriber.estimated_cost()) weighed by distance from
+        the column, since neighbouring columns are more often related (e.g. city and state).
+        Relationships that are already saved cost nothing.
+        """
+        col_index = list(df.columns).index(col_name)
+        ordered = []
+        for col_2_index, col_2_name in enumerate(df.columns):
+            if col_2_name == col_name:
+                continue
+            cost = 0
+            for relationship_class in RELATIONSHIP_CLASSES:
+                if not is_saved(relationship_class, df, col_name, col_2_name):
+                    cost += relationship_class.estimated_cost(df, col_name, col_2_name)
+            distance = abs(col_2_index - col_index)
+            ordered.append((cost * distance, distance, col_2_index, col_2_name))
+        return [col_2_name for cost, distance, col_2_index, col_2_name in sorted(ordered)]
+
     def _calculate(self):
 
         self._description = "(see html)"
@@ -526,7 +956,7 @@ class ColumnPageDescriber(ColumnDescriber):
         col_index_min = max(col_index-5, 0)
         col_index_max = min(col_index+5, len(self.df.columns))
         self._sample_df_html = dfx_html.df_to_html_column_highlighted(
-            self.df.ix[0:5, col_index_min:col_index_max],
+            self.df.iloc[0:6, col_index_min:col_index_max],
             self.col_name,
             self.urls,
             )
@@ -534,31 +964,44 @@ class ColumnPageDescriber(ColumnDescriber):
         # column description
         self._descriptions = []
         for describer_class in COLUMN_CLASSES:
-            describer = factory.get_or_create(describer_class, self.df, self.col_name)
+            describer = get_factory().get_or_create(describer_class, self.df, self.col_name)
             if describer.qualified:
                 self._descriptions.append(describer.html)
 
         # unique values
-        x = self.df[self.col_name].value_counts().to_frame().reset_index()
-        x.columns = ['value', 'value count']
-        self._unique_values_df_html = dfx_html.df_to_html_value_counts(
-            x.head(),
-            self.col_name,
-            self.urls
-            )
+        self._unique_values_df_html = embedded_html(get_factory().get_or_create(ColumnProfile, self.df, self.col_name))
+
+        # relationships, calculated cheapest first (see _relationship_order()) and listed in
+        # column order; those that don't fit in PAGE_TIME_BUDGET are listed in .skipped instead,
+        # as links to the relationship page, which calculates them
+        budget = get_page_time_budget()
+        deadline = None if budget is None else time.time() + budget
+        found = {}
+        skipped = set()
+        for col_2_name in self._relationship_order(self.df, self.col_name):
+            if deadline is not None and time.time() > deadline and not all(
+                    is_saved(relationship_class, self.df, self.col_name, col_2_name)
+                    for relationship_class in RELATIONSHIP_CLASSES):
+                skipped.add(col_2_name)
+                continue
+            found[col_2_name] = [
+                get_factory().get_or_create(relationship_class, self.df, self.col_name, col_2_name)
+                for relationship_class in RELATIONSHIP_CLASSES]
+        self._complete = not skipped
 
-        # relationships
         self.relationships = []
+        self.skipped = []
         for col_2_name in self.df.columns:
-            if col_2_name == self.col_name:
-                continue
-            for relationship_class in RELATIONSHIP_CLASSES:
-                relationship = factory.get_or_create(relationship_class, self.df, self.col_name, col_2_name)
+            if col_2_name in skipped:
+                self.skipped.append(self.urls.relationship(self.col_name, col_2_name))
+            for relationship in found.get(col_2_name, []):
                 if relationship.qualified:
                     self.relationships.append(
                         (
                             self.urls.relationship(self.col_name, col_2_name),
-                            relationship.description
+                            relationship.description,
+                            # a placeholder, whose whole item is removed if it isn't qualified
+                            isinstance(relationship, DeferredDescriber),
                             ))
 
         # html
@@ -583,6 +1026,20 @@ class RelationshipDescriber(Describer):
         self.col_1_name = col_1_name
         self.col_2_name = col_2_name
 
+    _sample_rows = dfx_sampling.SAMPLE_ROWS
+
+    def _get_data_hash(self, col_1_name, col_2_name):
+        """Only the values of the two columns
+        """
+        return "{}/{}".format(get_column_hash(self.df, col_1_name), get_column_hash(self.df, col_2_name))
+
+    @classmethod
+    def estimated_cost(cls, df, col_1_name, col_2_name):
+        """Rough cost of calculating the relationship, in rows read, for ordering work within
+        PAGE_TIME_BUDGET (see ColumnPageDescriber)
+        """
+        return len(df)
+
 class RelationshipAnova(RelationshipDescriber):
     """Expects first column to be group name, second column to be numeric
     """
@@ -594,12 +1051,26 @@ class RelationshipAnova(RelationshipDescriber):
         ]
     f = None
     p = None
+
+    @classmethod
+    def sample(cls, df, col_1_name, col_2_name):
+        """Stratified by group, so that small groups are represented
+        """
+        return dfx_sampling.sample_frame(df, cls._sample_rows, strata=col_1_name, columns=[col_1_name, col_2_name])
+
+    @classmethod
+    def estimated_cost(cls, df, col_1_name, col_2_name):
+        # nothing to calculate unless text and numeric
+        if is_numeric(df[col_1_name]) or not is_numeric(df[col_2_name]):
+            return 0
+        return len(df)
+
     def _calculate(self):
         col_group = self.df[self.col_1_name]
         col_values = self.df[self.col_2_name]        
 
         # valid
-        if not is_text(col_group):
+        if not column_is_text(self.df, self.col_1_name):
             self._description = "{} is not text".format(self.col_1_name)
             self._state = State.INVALID
             return
@@ -608,22 +1079,28 @@ class RelationshipAnova(RelationshipDescriber):
             self._state = State.INVALID
             return
         
-        # ANOVA
-        group_labels = col_group.unique()
-        group_values = [list(col_values[col_group==group_name]) for group_name in group_labels]
-        from scipy import stats
+        # ANOVA, from the count, sum and sum of squares of each group
+        grouped = dfx_stats.group_stats(col_group, col_values)
         try:
-            self.f, self.p = stats.f_oneway(*group_values)
-        except Exception as e:
-            self._description = e[0]
+            self.f, self.p = dfx_stats.one_way_anova(grouped)
+        except ValueError as e:
+            self._description = str(e)
             self._state = State.INVALID
             return
 
+        # p tests the sample, in which small groups are over-represented, rather than
+        # estimating something of the whole dataframe, so it has no interval like r does
+        p_text = "p={:.1}".format(self.p)
+        if self.sample_info is not None:
+            p_text += " in a stratified sample"
+
         # qualified
         if self.p < .05:
             self._description = "{} predicts {} means".format(self.col_1_name, self.col_2_name)
+            if self.sample_info is not None:
+                self._description += " ({})".format(p_text)
         else:
-            self._description = "{} does not predict {} means (p={:.1})".format(self.col_1_name, self.col_2_name, self.p)
+            self._description = "{} does not predict {} means ({})".format(self.col_1_name, self.col_2_name, p_text)
             self._state = State.UNQUALIFIED
             return
 
@@ -631,7 +1108,7 @@ class RelationshipAnova(RelationshipDescriber):
         html = []
         html.append("<p>ANOVA F={:.2}, p={:.2}</p>".format(self.f, self.p))
         html.append(dfx_html.df_to_html_value_counts(
-            self.df.groupby(self.col_1_name)[self.col_2_name].mean().to_frame().reset_index(),
+            grouped.means_frame(self.col_1_name, self.col_2_name),
             self.col_1_name,
             self.urls,
             ))
@@ -648,6 +1125,17 @@ class RelationshipCorrelation(RelationshipDescriber):
         ]
     r = None
     p = None
+
+    # enough for a tight interval of r, and a scatter plot that isn't too slow to draw
+    _sample_rows = dfx_sampling.SAMPLE_ROWS // 5
+
+    @classmethod
+    def estimated_cost(cls, df, col_1_name, col_2_name):
+        # nothing to calculate unless both are numeric, otherwise a regression and a plot
+        if not is_numeric(df[col_1_name]) or not is_numeric(df[col_2_name]):
+            return 0
+        return 4 * len(df)
+
     def _calculate(self):
         x = self.df[self.col_1_name]
         y = self.df[self.col_2_name]        
@@ -677,6 +1165,11 @@ class RelationshipCorrelation(RelationshipDescriber):
         else:
             self._description = "{} and {} are not correlated (p={:.1})".format(self.col_1_name, self.col_2_name, self.p)
             self._state = State.UNQUALIFIED
+        if self.sample_info is not None:
+            pairs = (x.notnull() & y.notnull()).sum()
+            self._description += " ({})".format(
+                interval_text(dfx_sampling.correlation_interval(self.r, pairs), '{:.2f}', 'r'))
+        if self._state == State.UNQUALIFIED:
             return
 
         # only continuing here if qualified
@@ -691,12 +1184,12 @@ class RelationshipCorrelation(RelationshipDescriber):
 
         # scatter plot with fit line
         import matplotlib.pyplot as plt
-        f = plt.figure()
-        plt.scatter(x, y)
-        plt.plot(x_fit, y_fit)
-        image_path, image_url = propose_image_path()
-        plt.savefig(image_path)
-        
+        image_path, image_url = propose_image_path(self, 'scatter')
+        if not os.path.exists(image_path):
+            f = plt.figure()
+            plt.scatter(x, y)
+            plt.plot(x_fit, y_fit)
+            save_figure(f, image_path)
 
         # html
         self._html = """
@@ -716,32 +1209,26 @@ class RelationshipOneToMany(RelationshipDescriber):
         ('many to many', pd.DataFrame(dict(first_name = ['john', 'john', 'mike', 'mike'], last_name = ['smith', 'jones', 'smith', 'jones']))),
         ]
 
+    # the html lists every pair of values, up to one per row
+    _sample_rows = dfx_sampling.SAMPLE_ROWS // 10
+
     def _calculate(self):
+        # nulls don't map to anything, as with groupby() and nunique()
         col_1 = self.df[self.col_1_name]
         col_2 = self.df[self.col_2_name]
-        df = self.df        
-        
-        # For each col_1 value, how many col_2 values does it map to?
-        col_1_to_2 = df.groupby(self.col_1_name)[self.col_2_name].nunique().max()
-
-        # For each col_2 value, how many col_1 values does it map to?
-        col_2_to_1 = df.groupby(self.col_2_name)[self.col_1_name].nunique().max()
-
-        if col_1_to_2 == 1 and col_2_to_1 == 1:
-            self._description = "{} and {} have a 1:1 mapping".format(self.col_1_name, self.col_2_name)
-        elif col_1_to_2 == 1:
-            self._description = "{} and {} have a 1:many mapping (1:{} max)".format(self.col_1_name, self.col_2_name, col_2_to_1)
-        elif col_2_to_1 == 1:
-            self._description = "{} and {} have a 1:many mapping (1:{} max)".format(self.col_2_name, self.col_1_name, col_1_to_2)
-        else:
-            self._description = "{} and {} have a many:many relationship ({}:{})".format(
-                self.col_1_name, self.col_2_name, col_2_to_1, col_1_to_2)
-            self._state = State.UNQUALIFIED
+        present = col_1.notnull().values & col_2.notnull().values
+        codes_1, cardinality_1 = dfx_dependencies.factorize_with_nulls(col_1[present])
+        codes_2, cardinality_2 = dfx_dependencies.factorize_with_nulls(col_2[present])
 
+        # For each col_1 value, how many col_2 values does it map to, and vice versa
+        col_1_to_2, col_2_to_1 = dfx_dependencies.mapping_counts(codes_1, cardinality_1, codes_2, cardinality_2)
+
+        self._description = mapping_description(self.col_1_name, self.col_2_name, col_1_to_2, col_2_to_1)
+        if col_1_to_2 > 1 and col_2_to_1 > 1:
+            self._state = State.UNQUALIFIED
 
         # html
-        x = df.groupby([self.col_1_name, self.col_2_name]).size().to_frame().reset_index()
-        x.rename(columns = {0:'row_count'}, inplace = True)
+        x = dfx_dependencies.pair_counts(self.df, self.col_1_name, self.col_2_name)
         self._html = dfx_html.df_to_html_hierarchy(x, self.urls)
 
 RELATIONSHIP_CLASSES = [RelationshipAnova, RelationshipCorrelation, RelationshipOneToMany]
@@ -756,22 +1243,248 @@ class RelationshipPageDescriber(RelationshipDescriber):
         ('one to one', pd.DataFrame(dict(x = [1, 2, 3, 4], y = [10, 11, 12, 13]))),
         ]
     _unqualified_dfs = []
+
+    # the page is built from describers of the whole dataframe, some of which may be sampled
+    _sample_rows = None
+
+    @classmethod
+    def required_describers(cls, df, col_1_name, col_2_name):
+        """The describers _calculate() reads, see dfx.parallel
+        """
+        profiles = [(ColumnProfile, (col_1_name,)), (ColumnProfile, (col_2_name,))]
+        relationships = [(relationship_class, (col_1_name, col_2_name)) for relationship_class in RELATIONSHIP_CLASSES]
+        return [profiles, relationships]
+
     def _calculate(self):
 
         self._description = "(see html)"
 
         # sample rows
-        self._sample_df_html = dfx_html.df_to_html(self.df.ix[0:5, [self.col_1_name, self.col_2_name]], self.urls)
+        self._sample_df_html = dfx_html.df_to_html(self.df[[self.col_1_name, self.col_2_name]].head(6), self.urls)
 
         # relationships
         self.relationships = []
         for relationship_class in RELATIONSHIP_CLASSES:
-            relationship = factory.get_or_create(relationship_class, self.df, self.col_1_name, self.col_2_name)
+            relationship = get_factory().get_or_create(relationship_class, self.df, self.col_1_name, self.col_2_name)
             self.relationships.append(relationship)
 
         template = jinja_env.get_template('relationship.html')
         self._html = template.render(d=self)
 
+class TableDependencies(Describer):
+    """Which columns determine others (e.g. city -> state -> region), found for all columns at
+    once by dfx.dependencies
+
+    .mappings
+        dictionary of (col_1_name, col_2_name) to (most col_2 values per col_1 value, most
+        col_1 values per col_2 value), for pairs where one of those is 1
+    .hierarchies
+        lists of columns, each with one value for many values of the next
+    .equivalence_classes
+        lists of columns that are 1:1 with each other
+
+    Columns that are constant, or have a different value on every row, are left out, since
+    every other column determines them.
+    """
+    _qualified_dfs = [
+        ('hierarchy', pd.DataFrame(dict(
+            region=['west', 'west', 'west', 'east', 'east', 'east'],
+            state=['CA', 'CA', 'WA', 'NC', 'NY', 'NY'],
+            city=['LA', 'SF', 'Seattle', 'Raleigh', 'NYC', 'NYC'],
+            id=[1, 2, 3, 4, 5, 6]))),
+        ]
+    _unqualified_dfs = [
+        ('people', pd.DataFrame(dict(emp_id = [123, 456], name=['john', 'tom'], age=[39, 62]))),
+        ]
+
+    _sample_rows = dfx_sampling.SAMPLE_ROWS
+
+    @property
+    def mappings(self):
+        self._ensure_calculated()
+        return self._mappings
+
+    @property
+    def hierarchies(self):
+        self._ensure_calculated()
+        return self._hierarchies
+
+    @property
+    def equivalence_classes(self):
+        self._ensure_calculated()
+        return self._equivalence_classes
+
+    def _calculate(self):
+        dependencies = dfx_dependencies.find_dependencies(self.df)
+        self._mappings = dependencies.mappings()
+        self._hierarchies = dependencies.hierarchies()
+        self._equivalence_classes = dependencies.equivalence_classes()
+        self._description = '{} hierarchies, {} sets of 1:1 columns'.format(
+            len(self._hierarchies), len(self._equivalence_classes))
+        if not self._mappings:
+            self._state = State.UNQUALIFIED
+            return
+
+        # each hierarchy as a chain of column links, and each set of 1:1 columns
+        items = []
+        for hierarchy in self._hierarchies:
+            items.append(" &rarr; ".join(self.urls.column(col_name) for col_name in hierarchy))
+        for equivalence_class in self._equivalence_classes:
+            items.append(" = ".join(self.urls.column(col_name) for col_name in equivalence_class))
+        self._html = html_list(items)
+
+class TableKeys(Describer):
+    """Minimal sets of columns that identify every row, found by dfx.keys
+
+    .keys
+        list of tuples of column names, smallest first
+
+    Qualified if there is at least one key
+    """
+    _qualified_dfs = [
+        ('composite', pd.DataFrame(dict(order=[1, 1, 2, 2], line=[1, 2, 1, 2], amount=[5, 5, 7, 9]))),
+        ('people', pd.DataFrame(dict(emp_id = [123, 456], name=['john', 'tom'], age=[39, 62]))),
+        ]
+    _unqualified_dfs = [
+        ('duplicate rows', pd.DataFrame(dict(x=[1, 1, 2], y=['a', 'a', 'b']))),
+        ]
+
+    _sample_rows = dfx_sampling.SAMPLE_ROWS
+
+    @property
+    def keys(self):
+        self._ensure_calculated()
+        return self._keys
+
+    def _calculate(self):
+        self._keys = dfx_keys.find_keys(self.df)
+        if not self._keys:
+            self._description = "No keys"
+            self._state = State.UNQUALIFIED
+            return
+        self._description = "Keys: {}".format(", ".join(" + ".join(key) for key in self._keys))
+        self._html = html_list(" + ".join(self.urls.column(col_name) for col_name in key) for key in self._keys)
+
+class TableRelationships(Describer):
+    """The qualified relationships between every pair of columns, with the same descriptions
+    as RELATIONSHIP_CLASSES, but calculated for all pairs at once by dfx.relationships
+
+    .relationships
+        list of (col_1_name, col_2_name, description), ordered by col_1_name, col_2_name and
+        then RELATIONSHIP_CLASSES
+
+    Mappings come from TableDependencies, so they leave out the same columns. The sums the
+    correlations and ANOVAs are calculated from are kept, so that .extended() can add rows
+    appended to the dataset to them.
+    """
+    _qualified_dfs = [
+        ('one to many', pd.DataFrame(dict(region = ['west', 'west', 'east', 'east', 'east'], state = ['CA', 'WA', 'NC', 'NY', 'NY']))),
+        ('linear increase', pd.DataFrame(dict(x=list(range(10, 15)), y=list(range(20, 25))))),
+        ('different means', pd.DataFrame(dict(group=['a', 'a', 'a', 'b', 'b', 'b'], val=[10, 20, 30, 100, 110, 120]))),
+        ]
+    _unqualified_dfs = [
+        ('people', pd.DataFrame(dict(emp_id = [123, 456], name=['john', 'tom'], age=[39, 62]))),
+        ]
+
+    _sample_rows = dfx_sampling.SAMPLE_ROWS
+
+    @property
+    def relationships(self):
+        self._ensure_calculated()
+        return self._relationships
+
+    @classmethod
+    def extended(cls, previous, df, start_row):
+        """The relationships of df, whose first start_row rows are the rows previous was
+        calculated on, adding only the rows after them to the sums previous kept (see
+        dfx.incremental)
+
+        Sums previous didn't keep, for columns that were added or have too many groups, are
+        calculated again from every row, as are the mappings.
+        """
+        relationships = cls(df)
+        relationships._state = State.QUALIFIED
+        relationships._calculate_from(previous, start_row)
+        return relationships
+
+    def _calculate(self):
+        self._calculate_from(None, 0)
+
+    def _calculate_from(self, previous, start_row):
+        df = self.df
+        columns = list(df.columns)
+        profiles = dict((col_name, get_factory().get_or_create(ColumnProfile, df, col_name).profile) for col_name in columns)
+        numeric_columns = [col_name for col_name in columns if dfx_stats.is_numeric_dtype(df[col_name].dtype)]
+        text_columns = [col_name for col_name in columns if profiles[col_name].is_text]
+
+        # the sums are kept for dfx.incremental, each added to if previous kept the same one
+        previous_correlation = getattr(previous, '_correlation_sums', None)
+        if previous_correlation is not None and previous_correlation.columns == numeric_columns:
+            self._correlation_sums = copy.deepcopy(previous_correlation).add(df, start_row)
+        else:
+            self._correlation_sums = dfx_relationships.CorrelationSums(
+                numeric_columns, dfx_relationships.column_means(df, numeric_columns)).add(df)
+        shifts = self._correlation_sums.shifts
+        previous_anova = getattr(previous, '_anova_sums', {})
+        self._anova_sums = {}
+        for col_name in text_columns:
+            if profiles[col_name].distinct_count > dfx_relationships.MAX_KEPT_GROUPS:
+                continue
+            sums = previous_anova.get(col_name)
+            if sums is not None and sums.value_columns == [name for name in numeric_columns if name != col_name]:
+                self._anova_sums[col_name] = copy.deepcopy(sums).add(df, start_row)
+            else:
+                self._anova_sums[col_name] = dfx_relationships.AnovaSums(col_name, numeric_columns, shifts).add(df)
+
+        # (col_1_name, col_2_name) -> list of descriptions
+        found = dict()
+        def add(col_1_name, col_2_name, description):
+            found.setdefault((col_1_name, col_2_name), []).append(description)
+
+        # RelationshipAnova
+        anovas = dfx_relationships.anova_matrix(
+            df, [col_name for col_name in text_columns if col_name not in self._anova_sums], numeric_columns)
+        for sums in self._anova_sums.values():
+            anovas.update(sums.result())
+        for col_1_name in text_columns:
+            for col_2_name in numeric_columns:
+                f, p = anovas.get((col_1_name, col_2_name), (None, None))
+                if p is not None and p < .05:
+                    add(col_1_name, col_2_name, "{} predicts {} means".format(col_1_name, col_2_name))
+
+        # RelationshipCorrelation
+        r, p, n = self._correlation_sums.result()
+        for col_1_name in numeric_columns:
+            for col_2_name in numeric_columns:
+                if col_1_name != col_2_name and p.loc[col_1_name, col_2_name] < .05:
+                    add(col_1_name, col_2_name, "{} and {} are correlated (r={:.1}, p={:.1})".format(
+                        col_1_name, col_2_name, r.loc[col_1_name, col_2_name], p.loc[col_1_name, col_2_name]))
+
+        # RelationshipOneToMany
+        mappings = get_factory().get_or_create(TableDependencies, df).mappings
+        for (col_1_name, col_2_name), (col_1_to_2, col_2_to_1) in mappings.items():
+            add(col_1_name, col_2_name, mapping_description(col_1_name, col_2_name, col_1_to_2, col_2_to_1))
+            add(col_2_name, col_1_name, mapping_description(col_2_name, col_1_name, col_2_to_1, col_1_to_2))
+
+        self._relationships = []
+        for col_1_name in columns:
+            for col_2_name in columns:
+                for description in found.get((col_1_name, col_2_name), []):
+                    self._relationships.append((col_1_name, col_2_name, description))
+        self._description = '{} relationships'.format(len(self._relationships))
+        if not self._relationships:
+            self._state = State.UNQUALIFIED
+            return
+
+        # grouped by the first column
+        by_col_1_name = {}
+        for col_1_name, col_2_name, description in self._relationships:
+            by_col_1_name.setdefault(col_1_name, []).append(
+                "{} - {}".format(self.urls.relationship(col_1_name, col_2_name), description))
+        self._html = html_list(
+            "{}\n{}".format(col_1_name, html_list(by_col_1_name[col_1_name]))
+            for col_1_name in columns if col_1_name in by_col_1_name)
+
 # #######################################################################################
 # Row Page Describer
 
@@ -785,7 +1498,7 @@ class RowPageDescriber(Describer):
         self.df = df
         self._set_hash(row_num)
         self.row_num = row_num
-        self.row_series = df.ix[row_num, :]
+        self.row_series = df.loc[row_num, :]
 
     def _calculate(self):
         self._description = "(see html)"
@@ -805,6 +1518,18 @@ class TablePageDescriber(Describer):
         ]
     _unqualified_dfs = []
 
+    @classmethod
+    def required_describers(cls, df):
+        """The describers _calculate() reads, see dfx.parallel
+
+        Column profiles and the table-wide searches first, then what reads the profiles.
+        """
+        first = [(ShapeColumns, ()), (ShapeRows, ()), (TableKeys, ()), (TableDependencies, ())]
+        first.extend((ColumnProfile, (col_name,)) for col_name in df.columns)
+        second = [(TableRelationships, ())]
+        second.extend((ColumnSummary, (col_name,)) for col_name in df.columns)
+        return [first, second]
+
     def _calculate(self):
         self._description = "(see html)"
 
@@ -813,45 +1538,23 @@ class TablePageDescriber(Describer):
         # basics
         self._basics = []
         for describer_class in [ShapeColumns, ShapeRows]:
-            describer = factory.get_or_create(describer_class, df)
+            describer = get_factory().get_or_create(describer_class, df)
             self._basics.append( describer.description )
 
         # sample rows
         self._sample_df_html = dfx_html.df_to_html(df.head(), self.urls)
 
         # column description
-        # a list of tuples, with tuples[0]=column name and tuple[1]=list of descriptions
+        # a list of tuples, with tuples[0]=column link and tuple[1]=description
         self._column_descriptions = []
         for col_name in df.columns:
-            qualified_column_describers = []
-            col_descriptions = []
-            for describer_class in COLUMN_CLASSES:
-                describer = factory.get_or_create(describer_class, df, col_name)
-                if describer.qualified:
-                    qualified_column_describers.append(describer)
-            (unsuppressed_describers, suppressed_describers) = suppression_check(qualified_column_describers)
-            for describer in unsuppressed_describers:
-                col_descriptions.append(describer.description)
-            self._column_descriptions.append( (self.urls.column(col_name), col_descriptions) )
-
-        # relationships
-        # a list of tuples, with tuples[0]=column name, and tuples[1]=list of tuples
-        #   each sub tuple[0]=2nd column name, tuple[1]=description
+            summary = get_factory().get_or_create(ColumnSummary, df, col_name)
+            self._column_descriptions.append( (self.urls.column(col_name), summary.description) )
 
-        # 4/25 - commented out because takes too long on real datasets
-        self._relationships = []
-        # columns = df.columns
-        # for col_1_name in columns:
-        #     rel_descriptions = []
-        #     for col_2_name in columns:
-        #         if col_1_name == col_2_name:
-        #             continue
-        #         for describer_class in RELATIONSHIP_CLASSES:
-        #             describer = factory.get_or_create(describer_class, df, col_1_name, col_2_name)
-        #             logger.debug("TablePageDescriber relationships - {}".format(describer))
-        #             if describer.qualified:
-        #                 rel_descriptions.append( (self.urls.relationship(col_1_name, col_2_name), describer.description ) )
-        #     self._relationships.append( (col_1_name, rel_descriptions) )
+        # relationships, keys and hierarchies, each listed by its own describer
+        self._relationships_html = embedded_html(get_factory().get_or_create(TableRelationships, df))
+        self._keys_html = embedded_html(get_factory().get_or_create(TableKeys, df))
+        self._hierarchies_html = embedded_html(get_factory().get_or_create(TableDependencies, df))
 
         # html
         template = jinja_env.get_template('table.html')
@@ -868,6 +1571,10 @@ class ValuePageDescriber(Describer):
         ('one to many', pd.DataFrame(dict(region = ['west', 'west', 'east', 'east'], state = ['CA', 'WA', 'NC', 'NY']))),
         ]
     _unqualified_dfs = []
+
+    # the value index makes this cheap, and there is one page per distinct value
+    _cacheable = False
+
     def __init__(self, df, col_name, val):
         self.df = df
         self._set_hash(col_name, val)
@@ -876,15 +1583,21 @@ class ValuePageDescriber(Describer):
 
     def _calculate(self):
         # sample rows
-        # assume val is always passed as a string, so convert the column to string
+        # assume val is always passed as a string, so look it up by the column's values as strings
         self._description = "(see html)"
 
-        i = self.df[self.col_name].apply(str)==self.val
-        self._sample_df_html = dfx_html.df_to_html(self.df.ix[i, :].head(), self.urls)
+        positions = dfx_value_index.get_value_index(self.df, self.col_name).positions(self.val)
+        self._sample_df_html = dfx_html.df_to_html(self.df.iloc[positions[:5]], self.urls)
 
         template = jinja_env.get_template('value.html')
         self._html = template.render(describer=self)
 
+# describers pages can show as placeholders, by name, see DeferringFactory
+FRAGMENT_CLASSES = dict(
+    (describer_class.__name__, describer_class)
+    for describer_class in [ShapeColumns, ShapeRows, ColumnProfile, ColumnSummary, TableRelationships, TableKeys, TableDependencies]
+        + COLUMN_CLASSES + RELATIONSHIP_CLASSES)
+
 # #######################################################################################
 # Helpers
 
@@ -892,14 +1605,79 @@ def is_numeric(col):
     return np.issubdtype(col.dtype, np.number)
 
 def is_text(col):
-    non_str_types = [val_type for val_type in list(col.apply(type).unique()) if val_type not in [str, str]]
-    return not non_str_types
+    return dfx_stats.is_text(col)
+
+def interval_text(interval, value_format, name=''):
+    """A 95% interval of a describer calculated on a sample, e.g. '95% CI 1.20%-1.35%'
+    """
+    low, high = interval
+    return "95% CI {}{}-{}".format(
+        name + ' ' if name else '', value_format.format(low), value_format.format(high))
+
+def duplicate_interval_text(profile):
+    """95% interval of a sample's duplicate rate, which understates the whole column's
+    """
+    return "{} in the sample, usually higher in the whole column".format(
+        interval_text(dfx_sampling.wilson_interval(profile.duplicate_count, profile.row_count), '{:.2%}'))
+
+def sketch_text(profile):
+    """How approximate a sketched profile's distinct count is, see dfx.sketches
+    """
+    return "HyperLogLog estimate, distinct values &plusmn;{:.1%}".format(2 * profile.distinct_error)
+
+def is_saved(describer_class, df, *args):
+    """Whether the describer factory has the describer saved, so that getting it is cheap
+    """
+    has = getattr(get_factory(), 'has', None)
+    return has is not None and has(describer_class(df, *args).hash)
+
+def column_is_text(df, col_name):
+    """Like is_text(), but cached with the column's other statistics (see ColumnProfile)
+    """
+    return get_factory().get_or_create(ColumnProfile, df, col_name).profile.is_text
 
 def get_df_hash(df):
+    """Content hash of df, memoized so that it is only calculated once per dataframe
+
+    See dfx.fingerprint
+    """
     if df is None:
         raise ValueError("df was None")
-    #return str(pandas.util.hash_pandas_object(df).sum())
-    return '1'
+    return dfx_fingerprint.get_fingerprint(df).df_hash
+
+def get_column_hash(df, col_name):
+    """Content hash of a single column, which does not change when other columns do
+    """
+    if df is None:
+        raise ValueError("df was None")
+    return dfx_fingerprint.get_fingerprint(df).column_hash(col_name)
+
+def mapping_description(col_1_name, col_2_name, col_1_to_2, col_2_to_1):
+    """Describe how two columns map to each other
+
+    col_1_to_2 is the most col_2 values that one col_1 value maps to, and vice versa.
+    """
+    if col_1_to_2 == 1 and col_2_to_1 == 1:
+        return "{} and {} have a 1:1 mapping".format(col_1_name, col_2_name)
+    elif col_1_to_2 == 1:
+        return "{} and {} have a 1:many mapping (1:{} max)".format(col_1_name, col_2_name, col_2_to_1)
+    elif col_2_to_1 == 1:
+        return "{} and {} have a 1:many mapping (1:{} max)".format(col_2_name, col_1_name, col_1_to_2)
+    else:
+        return "{} and {} have a many:many relationship ({}:{})".format(col_1_name, col_2_name, col_2_to_1, col_1_to_2)
+
+def html_list(items):
+    """An html <ul> of items, which are html
+    """
+    return "<ul>\n{}\n</ul>".format("\n".join("<li>{}</li>".format(item) for item in items))
+
+def embedded_html(describer):
+    """describer's html, to embed in a page's html
+
+    The describer's links keep dfx_html._URL_PREFIX, which the page's own .html replaces.
+    """
+    describer._url_prefix = dfx_html._URL_PREFIX
+    return describer.html
 
 def suppression_check(describers):
     """Given a list of describers, determine which ones are not suppressed by any others
@@ -924,16 +1702,59 @@ def suppression_check(describers):
             unsuppressed_describers.append(describer_in_question)
     return (unsuppressed_describers, suppressed_describers)
 
-def propose_image_path():
-    """Returns a filename with path to which newly generated images should be saved.
+def propose_image_path(describer, *parameters):
+    """Returns (path, url) of an image a describer renders
 
-    This generates random file names, to avoid file naming collisions.
+    The name is a digest of the describer's hash, which covers the data it reads, and the
+    parameters the image is rendered with (e.g. the histogram's bins), so the same plot is
+    always saved with the same name. If the file already exists, it doesn't need rendering
+    again.
 
     This uses _IMAGE_BASE_PATH, with the expectation that the web server will set this
     constant before any describers are generated
     """
-    image_name = "image_{}.png".format(''.join(random.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(8)))
+    digest = hashlib.blake2b(repr((describer.hash,) + parameters).encode('utf-8'), digest_size=16)
+    image_name = "image_{}.png".format(digest.hexdigest())
     image_path = os.path.join(_IMAGE_BASE_PATH, image_name)
     image_url = '/images/' + image_name
     return image_path, image_url
 
+def save_figure(figure, image_path):
+    """Save a matplotlib figure as a png at image_path, and close it
+
+    The file appears all at once, since another process may be rendering the same image.
+    """
+    import matplotlib.pyplot as plt
+    tmp_path = '{}.{}.tmp'.format(image_path, os.getpid())
+    try:
+        figure.savefig(tmp_path, format='png')
+        os.replace(tmp_path, image_path)
+    finally:
+        plt.close(figure)
+
+def remove_unused_images(store, image_base_path=None, min_age=IMAGE_MIN_AGE):
+    """Remove the images in image_base_path (by default _IMAGE_BASE_PATH) that no describer
+    saved in store refers to, leaving any younger than min_age seconds
+
+    Returns the names of the images removed.
+    """
+    image_base_path = image_base_path or _IMAGE_BASE_PATH
+    if not os.path.isdir(image_base_path):
+        return []
+    used = set(name.decode('ascii') for name in store.find_all(IMAGE_NAME_PATTERN))
+    removed = []
+    now = time.time()
+    for image_name in os.listdir(image_base_path):
+        if image_name in used or not re.fullmatch(IMAGE_NAME_PATTERN.decode('ascii'), image_name):
+            continue
+        image_path = os.path.join(image_base_path, image_name)
+        try:
+            if now - os.path.getmtime(image_path) < min_age:
+                continue
+            os.remove(image_path)
+        except OSError:
+            # removed by another process
+            continue
+        removed.append(image_name)
+    return removed
+
@@ -0,0 +1,192 @@
+import os
+import hashlib
+import weakref
+
+import numpy as np
+import pandas as pd
+
+"""
+Content-addressed fingerprints for dataframes
+
+A fingerprint identifies the data in a dataframe, so that DfxStore can tell whether a
+describer it saved earlier was calculated on the same data. It is built per column:
+
+    row hashes      pandas.util.hash_pandas_object() - one vectorized uint64 per value
+    block digests   blake2b of each BLOCK_ROWS slice of the row hashes
+    column hash     blake2b of the dtype plus the block digests
+    df hash         blake2b of the column names and column hashes
+
+Keeping the block digests means a column that only grows by appended rows can be
+re-hashed from its last block onward, rather than from the first row.
+
+Hashing a large dataframe still requires a full scan, so fingerprints are memoized:
+
+    get_fingerprint(df)             - memoized on the dataframe object for its lifetime
+    get_file_fingerprint(df, path)  - memoized on (path, mtime, size), so each request that
+                                      re-reads the same file reuses the first calculation
+
+The memo assumes dataframes are not modified in place after they are fingerprinted,
+which holds for the web app, where every dataset is read from disk.
+"""
+
+BLOCK_ROWS = 2 ** 20
+DIGEST_SIZE = 16
+
+# #######################################################################################
+# Fingerprint
+
+class Fingerprint(object):
+    """The hashes of a dataframe and each of its columns
+
+    .df_hash
+        A string identifying the entire dataframe (column names, dtypes and values)
+
+    .column_hashes
+        A dictionary of column name to a string identifying that column's values. The
+        column name is not part of the column hash, so renaming a column keeps its hash.
+
+    .source
+        The file the dataframe was read from, if known. Set by get_file_fingerprint() and
+        dfx.columnar.open_frame().
+    """
+
+    def __init__(self, column_blocks, row_count, source=None):
+        # column name -> (dtype name, list of block digests)
+        self._column_blocks = column_blocks
+        self.row_count = row_count
+        self.source = source
+        self.column_hashes = dict(
+            (col_name, _combine([dtype_name.encode('utf-8')] + digests))
+            for col_name, (dtype_name, digests) in column_blocks.items())
+        parts = []
+        for col_name in column_blocks:
+            parts.append(str(col_name).encode('utf-8'))
+            parts.append(self.column_hashes[col_name].encode('utf-8'))
+        self.df_hash = _combine(parts)
+
+    def __repr__(self):
+        return "Fingerprint({}, {} columns, {} rows)".format(self.df_hash, len(self.column_hashes), self.row_count)
+
+    def to_dict(self):
+        """A json serializable form, see from_dict()
+        """
+        return {
+            'row_count': self.row_count,
+            'columns': [
+                [col_name, dtype_name, [digest.hex() for digest in digests]]
+                for col_name, (dtype_name, digests) in self._column_blocks.items()],
+            }
+
+    @classmethod
+    def from_dict(cls, d, source=None):
+        column_blocks = dict(
+            (col_name, (dtype_name, [bytes.fromhex(digest) for digest in digests]))
+            for col_name, dtype_name, digests in d['columns'])
+        return cls(column_blocks, d['row_count'], source=source)
+
+    def subset(self, columns):
+        """The fingerprint of a dataframe with only the given columns
+        """
+        column_blocks = dict((col_name, self._column_blocks[col_name]) for col_name in columns)
+        return Fingerprint(column_blocks, self.row_count, source=self.source)
+
+    def column_hash(self, col_name):
+        try:
+            return self.column_hashes[col_name]
+        except KeyError:
+            raise ValueError("Fingerprint has no column", col_name)
+
+    def extended(self, df, start_row):
+        """Return a new fingerprint for df, where the first start_row rows are unchanged from
+        the dataframe this fingerprint was calculated on
+
+        Only the block containing start_row and the ones after it are re-hashed. Columns that are
+        new, or whose dtype changed, are hashed from scratch.
+        """
+        first_block = start_row // BLOCK_ROWS
+        column_blocks = {}
+        for col_name in df.columns:
+            col = df[col_name]
+            previous = self._column_blocks.get(col_name)
+            if previous is None or previous[0] != str(col.dtype):
+                column_blocks[col_name] = _hash_column_blocks(col)
+                continue
+            digests = previous[1][:first_block]
+            digests += _hash_column_blocks(col, first_block * BLOCK_ROWS)[1]
+            column_blocks[col_name] = (str(col.dtype), digests)
+        return Fingerprint(column_blocks, len(df), source=self.source)
+
+# #######################################################################################
+# Memoization
+
+# id(df) -> (weakref to df, Fingerprint)
+_memo = {}
+
+# (path, mtime, size) -> Fingerprint
+_file_memo = {}
+
+def get_fingerprint(df):
+    """Return the Fingerprint for df, calculating it only the first time df is seen
+    """
+    if df is None:
+        raise ValueError("df was None")
+    entry = _memo.get(id(df))
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    return set_fingerprint(df, calculate_fingerprint(df))
+
+def set_fingerprint(df, fingerprint):
+    """Memoize a fingerprint that was calculated elsewhere (e.g. read from disk) for df
+    """
+    key = id(df)
+    _memo[key] = (weakref.ref(df, lambda ref: _forget(key, ref)), fingerprint)
+    return fingerprint
+
+def get_file_fingerprint(df, path):
+    """Return the Fingerprint of df, which was just read from path
+
+    The fingerprint is calculated once per version of the file, identified by its
+    modification time and size, and reused for each later dataframe read from it.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+    fingerprint = _file_memo.get(key)
+    if fingerprint is None or fingerprint.row_count != len(df):
+        fingerprint = calculate_fingerprint(df)
+        fingerprint.source = key[0]
+        # drop fingerprints of previous versions of the same file
+        for old_key in [k for k in _file_memo if k[0] == key[0]]:
+            del _file_memo[old_key]
+        _file_memo[key] = fingerprint
+    return set_fingerprint(df, fingerprint)
+
+def _forget(key, ref):
+    entry = _memo.get(key)
+    if entry is not None and entry[0] is ref:
+        del _memo[key]
+
+# #######################################################################################
+# Hashing
+
+def calculate_fingerprint(df):
+    """Hash every column of df. This scans all of the data, prefer get_fingerprint()
+    """
+    column_blocks = dict((col_name, _hash_column_blocks(df[col_name])) for col_name in df.columns)
+    return Fingerprint(column_blocks, len(df))
+
+def _hash_column_blocks(col, start_row=0):
+    """Return (dtype name, list of block digests) for a column, starting at start_row,
+    which must be at a block boundary
+    """
+    digests = []
+    for block_start in range(start_row, len(col), BLOCK_ROWS):
+        block = col.iloc[block_start:block_start + BLOCK_ROWS]
+        row_hashes = pd.util.hash_pandas_object(block, index=False).values
+        digests.append(hashlib.blake2b(np.ascontiguousarray(row_hashes).data, digest_size=DIGEST_SIZE).digest())
+    return (str(col.dtype), digests)
+
+def _combine(parts):
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for part in parts:
+        h.update(part)
+    return h.hexdigest()
@@ -0,0 +1,62 @@
+from . import describers as dfx_describers
+from . import value_index as dfx_value_index
+
+"""
+Updating saved describers for rows appended to a dataset
+
+Appending rows to a dataset (see dfx.ingest.append_csv()) changes the hash of every column,
+so none of the describers saved for it apply any more. Most are quick to calculate again,
+but the column profiles, value indexes and table relationships read every row.
+update_describers() saves them for the new dataframe from the old one's, reading only the
+new rows:
+
+    ColumnTally         a mergeable dfx.sketches.ColumnSketch of each column, extended with
+                        the new rows and saved in place of the old one, and the new
+                        ColumnProfile from its stats
+    value indexes       extended with the new rows, if the old dataframe's were built
+    TableRelationships  its correlation and ANOVA sums extended with the new rows, if the
+                        old dataframe's was saved
+
+Tallies aren't calculated when a dataset is first loaded, so the first update calculates
+the old dataframe's from all of its rows. Later updates only read the new rows.
+
+Usage:
+    previous_df = columnar.open_frame('data/cars.dfx')
+    if ingest.append_csv('cars.csv', 'data/cars.dfx') is not None:
+        update_describers(store, previous_df, columnar.open_frame('data/cars.dfx'))
+"""
+
+def update_describers(store, previous_df, df):
+    """Save describers of df, whose first rows are previous_df's, from the describers of
+    previous_df in store (a dfx.datastore.DfxStore), reading only the rows after them
+
+    Columns that previous_df doesn't have, or whose dtype the new rows changed (e.g.
+    integers that now have a missing value), are calculated when they are first needed.
+    """
+    start_row = len(previous_df)
+    if len(df) == start_row:
+        return
+    # describers read each other through the factory, e.g. TableRelationships the profiles
+    with dfx_describers.use_factory(store), store.batch():
+        dtype_changed = False
+        for col_name in df.columns:
+            if col_name not in previous_df.columns:
+                continue
+            if previous_df[col_name].dtype != df[col_name].dtype:
+                dtype_changed = True
+                # the old tally counted values of the old dtype, so it isn't extended
+                store.delete(dfx_describers.ColumnTally(previous_df, col_name).hash)
+                continue
+            previous = store.get_or_create(dfx_describers.ColumnTally, previous_df, col_name)
+            tally = dfx_describers.ColumnTally.extended(previous, df, start_row)
+            store.save(tally.hash, tally)
+            # only the latest tally is extended, and each keeps a count of every value
+            store.delete(previous.hash)
+            profile = dfx_describers.ColumnProfile.from_stats(df, col_name, tally.sketch.stats())
+            store.save(profile.hash, profile)
+            dfx_value_index.extend_value_index(previous_df, df, col_name)
+
+        if not dtype_changed and store.has(dfx_describers.TableRelationships(previous_df).hash):
+            previous = store.get_or_create(dfx_describers.TableRelationships, previous_df)
+            relationships = dfx_describers.TableRelationships.extended(previous, df, start_row)
+            store.save(relationships.hash, relationships)
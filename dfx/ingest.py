@@ -0,0 +1,328 @@
+import io
+import os
+import hashlib
+import logging
+import multiprocessing
+import concurrent.futures
+
+import numpy as np
+import pandas as pd
+
+from . import columnar
+
+logger = logging.getLogger(__name__)
+
+"""
+Loading csv files into columnar datasets (see dfx.columnar)
+
+The csv is read in chunks of rows, and each chunk is appended to the dataset before the
+next one is read, so memory use is bounded by the chunk size rather than the file size.
+
+pandas infers each chunk's dtypes on its own, so a column can be numbers in some chunks and
+text in others. Read as a whole, the column would be text, with every value as it appears in
+the file, so such columns are read again as text (see text_conflicts()).
+
+Usage:
+    load_csv('cars.csv', 'data/cars.dfx')
+    load_csv('cars.csv', 'data/cars.dfx', progress=lambda rows, bytes: print(rows, bytes))
+
+load_csv_parallel() parses byte ranges of the file in a pool of processes instead:
+
+    load_csv_parallel('big.csv', 'data/big.dfx', workers=16)
+
+append_csv() loads only the records added to the end of a file since it was loaded, if
+nothing before them changed, appending them to the dataset:
+
+    start_row = append_csv('cars.csv', 'data/cars.dfx')
+    if start_row is None:
+        load_csv('cars.csv', 'data/cars.dfx')      # changed, not just appended to
+
+To tell, the dataset's schema keeps the size and a digest of the file it was loaded from
+(see file_source()).
+
+The ranges of load_csv_parallel() are split at record boundaries. A newline only ends a record if it is preceded
+by an even number of double quotes, so newlines inside quoted values are handled. Quotes
+escaped with a backslash, rather than doubled, are not supported.
+"""
+
+CHUNK_ROWS = 100000
+
+# load_csv_parallel() splits the file into parts of about this size
+PART_BYTES = 64 * 1024 * 1024
+
+# rows read from the start of the file to infer dtypes for every part
+SCHEMA_SAMPLE_ROWS = 10000
+
+# bytes read at a time to calculate file digests
+DIGEST_BLOCK_BYTES = 1024 * 1024
+
+def load_csv(csv_path, dataset_path, chunk_rows=CHUNK_ROWS, progress=None, encoding='utf-8', text_columns=()):
+    """Read csv_path in chunks and write it as a dataset at dataset_path
+
+    progress, if given, is called after each chunk with (rows read, bytes read). Columns
+    named in text_columns are read as text. If other columns turn out to be text in some
+    chunks but not others, the file is read again with those as text too.
+
+    Returns the dataset schema.
+    """
+    dtypes = dict((name, object) for name in text_columns)
+    writer = columnar.ColumnarWriter(dataset_path)
+    writer.source = file_source(csv_path)
+    conflicts = set()
+    try:
+        with open(csv_path, 'rb') as f:
+            rows = 0
+            text = {}
+            for chunk in pd.read_csv(f, encoding=encoding, chunksize=chunk_rows, dtype=dtypes or None):
+                conflicts.update(text_conflicts(text, chunk))
+                # once the file has to be read again, the rest is only read for other conflicts
+                if not conflicts:
+                    writer.append(chunk)
+                rows += len(chunk)
+                if progress is not None:
+                    # the parser reads ahead in blocks, so this is approximate
+                    progress(rows, f.tell())
+        if not conflicts:
+            schema = writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    if conflicts:
+        writer.abort()
+        logger.debug("load_csv() reading %s again with %s as text", csv_path, sorted(conflicts))
+        return load_csv(csv_path, dataset_path, chunk_rows, progress, encoding, set(text_columns) | conflicts)
+    if progress is not None:
+        progress(schema['row_count'], os.path.getsize(csv_path))
+    return schema
+
+def text_conflicts(text, chunk):
+    """Columns that are text in chunk but not in an earlier chunk, or the other way around
+
+    text is a dictionary of column name to whether it was text in the chunks so far, which
+    is updated with chunk's columns.
+    """
+    conflicts = []
+    for name in chunk.columns:
+        is_text = chunk[name].dtype == object
+        if text.setdefault(name, is_text) != is_text:
+            conflicts.append(name)
+    return conflicts
+
+# #######################################################################################
+# Appending
+
+def append_csv(csv_path, dataset_path, chunk_rows=CHUNK_ROWS, progress=None, encoding='utf-8'):
+    """Append the records csv_path has after the ones dataset_path was loaded from, if the
+    file is the one loaded with records added to its end
+
+    Only the new records are read. Text columns stay text, as in load_csv_parallel().
+    progress, if given, is called with (rows appended, bytes of the file read).
+
+    Returns the number of rows the dataset had before, the position of the first appended
+    row, or None if the file is not an extension of the one loaded, or a column that wasn't
+    text has text in the new records, in which case the dataset is unchanged and the whole
+    file has to be loaded again.
+    """
+    schema = columnar.read_schema(dataset_path)
+    source = schema.get('source')
+    if not is_extension(csv_path, source):
+        return None
+    start_row = schema['row_count']
+    if os.path.getsize(csv_path) == source['bytes']:
+        return start_row
+    names = [col_schema['name'] for col_schema in schema['columns']]
+    dtypes = dict((col_schema['name'], object) for col_schema in schema['columns'] if col_schema['kind'] == columnar.CODES)
+
+    text = dict((name, name in dtypes) for name in names)
+
+    writer = columnar.ColumnarWriter(dataset_path, append=True)
+    writer.source = file_source(csv_path)
+    try:
+        with open(csv_path, 'rb') as f:
+            f.seek(source['bytes'])
+            for chunk in pd.read_csv(f, header=None, names=names, dtype=dtypes, encoding=encoding, chunksize=chunk_rows):
+                conflicts = text_conflicts(text, chunk)
+                if conflicts:
+                    writer.abort()
+                    logger.debug("append_csv() %s has text in %s after row %s", csv_path, conflicts, start_row)
+                    return None
+                chunk.index = pd.RangeIndex(writer.row_count, writer.row_count + len(chunk))
+                writer.append(chunk)
+                if progress is not None:
+                    progress(writer.row_count - start_row, f.tell())
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    logger.debug("append_csv() %s rows of %s after row %s", writer.row_count - start_row, csv_path, start_row)
+    return start_row
+
+def file_source(csv_path):
+    """What the dataset schema keeps about the file it was loaded from: its size and a digest
+    """
+    with open(csv_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        return {'bytes': size, 'digest': _digest(f, size)}
+
+def is_extension(csv_path, source):
+    """Whether csv_path is the file source (see file_source()) describes, with records added
+    to its end and nothing before them changed
+    """
+    if not source:
+        return False
+    size = os.path.getsize(csv_path)
+    if size < source['bytes']:
+        return False
+    with open(csv_path, 'rb') as f:
+        if size > source['bytes'] and source['bytes'] > 0:
+            # the last record must have been complete, not continued by the new bytes
+            f.seek(source['bytes'] - 1)
+            if f.read(1) != b'\n':
+                return False
+            f.seek(0)
+        return _digest(f, source['bytes']) == source['digest']
+
+def _digest(f, size):
+    """Digest of the first size bytes of an open file
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    remaining = size
+    while remaining > 0:
+        block = f.read(min(DIGEST_BLOCK_BYTES, remaining))
+        if not block:
+            break
+        digest.update(block)
+        remaining -= len(block)
+    return digest.hexdigest()
+
+# #######################################################################################
+# Parallel
+
+def load_csv_parallel(csv_path, dataset_path, workers=None, part_bytes=PART_BYTES, progress=None, encoding='utf-8', text_columns=()):
+    """Like load_csv(), but parsing parts of the file in a pool of worker processes
+
+    Parts are written to the dataset in file order. At most two parts per worker are held
+    in memory at once. As in load_csv(), columns that are text in some parts but not
+    others are read again as text, so the dataset is the same however the file is split.
+    """
+    workers = workers or os.cpu_count() or 1
+    names, dtypes, data_start = infer_schema(csv_path, encoding=encoding)
+    for name in text_columns:
+        dtypes[name] = np.dtype(object)
+    size = os.path.getsize(csv_path)
+    part_count = max(workers, -(-(size - data_start) // part_bytes))
+    boundaries = find_record_boundaries(csv_path, data_start, part_count)
+    parts = [
+        (csv_path, start, end, names, dtypes, encoding)
+        for start, end in zip(boundaries[:-1], boundaries[1:]) if end > start]
+    logger.debug("load_csv_parallel() %s in %s parts with %s workers", csv_path, len(parts), workers)
+
+    writer = columnar.ColumnarWriter(dataset_path)
+    writer.source = file_source(csv_path)
+    conflicts = set()
+    text = {}
+    try:
+        # spawn rather than fork, since the web app calls this from a thread
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = []
+            next_part = 0
+            for i in range(len(parts)):
+                # keep a window of parts in flight, so finished parts don't pile up in memory
+                while next_part < len(parts) and next_part < i + 2 * workers:
+                    futures.append(executor.submit(_parse_part, *parts[next_part]))
+                    next_part += 1
+                chunk = futures[i].result()
+                futures[i] = None
+                conflicts.update(text_conflicts(text, chunk))
+                # once the file has to be read again, the rest is only parsed for other conflicts
+                if conflicts:
+                    continue
+                chunk.index = pd.RangeIndex(writer.row_count, writer.row_count + len(chunk))
+                writer.append(chunk)
+                if progress is not None:
+                    progress(writer.row_count, parts[i][2])
+        if not conflicts:
+            if writer.row_count == 0:
+                writer.append(pd.DataFrame(dict((name, pd.Series([], dtype=dtypes.get(name, object))) for name in names))[names])
+            schema = writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    if conflicts:
+        writer.abort()
+        logger.debug("load_csv_parallel() reading %s again with %s as text", csv_path, sorted(conflicts))
+        return load_csv_parallel(csv_path, dataset_path, workers, part_bytes, progress, encoding, set(text_columns) | conflicts)
+    return schema
+
+def infer_schema(csv_path, sample_rows=SCHEMA_SAMPLE_ROWS, encoding='utf-8'):
+    """Read the header and a sample of rows
+
+    Returns (column names, dictionary of column name to dtype, byte offset of the first record
+    after the header). Columns that are text in the sample are read as text in every part,
+    so a part where they happen to look numeric doesn't get a different dtype.
+    """
+    sample = pd.read_csv(csv_path, nrows=sample_rows, encoding=encoding)
+    names = list(sample.columns)
+    dtypes = dict((name, sample[name].dtype) for name in names)
+    data_start = find_record_boundaries(csv_path, 0, 1, first_record_only=True)[1]
+    return names, dtypes, data_start
+
+def find_record_boundaries(csv_path, start, part_count, first_record_only=False, block_size=16 * 1024 * 1024):
+    """Byte offsets that split the file, from start (which must be the start of a record), into
+    about part_count parts that each begin at the start of a record
+
+    Returns a list beginning with start and ending with the file size. With first_record_only,
+    returns [start, end of the first record].
+    """
+    size = os.path.getsize(csv_path)
+    if first_record_only:
+        targets = [start]
+    else:
+        targets = [start + (size - start) * k // part_count for k in range(1, part_count)]
+    boundaries = [start]
+    quotes_before_block = 0
+    block_start = start
+    with open(csv_path, 'rb') as f:
+        f.seek(start)
+        while targets and block_start < size:
+            block = f.read(block_size)
+            block_end = block_start + len(block)
+            while targets and targets[0] < block_end:
+                search_from = max(targets[0], boundaries[-1]) - block_start
+                quotes = quotes_before_block + block.count(b'"', 0, search_from)
+                boundary = None
+                while True:
+                    i = block.find(b'\n', search_from)
+                    if i == -1:
+                        break
+                    quotes += block.count(b'"', search_from, i)
+                    if quotes % 2 == 0:
+                        boundary = block_start + i + 1
+                        break
+                    search_from = i + 1
+                if boundary is None:
+                    # no record ends in the rest of this block, continue in the next one
+                    targets[0] = block_end
+                    break
+                targets.pop(0)
+                if boundary < size and boundary > boundaries[-1]:
+                    boundaries.append(boundary)
+            quotes_before_block += block.count(b'"')
+            block_start = block_end
+    boundaries.append(size)
+    return boundaries
+
+def _parse_part(csv_path, start, end, names, dtypes, encoding):
+    """Parse the records between two byte offsets. Runs in a worker process.
+    """
+    with open(csv_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # text columns stay text; other dtypes are only a hint, since a part may have
+    # values (e.g. nulls in an integer column) the sample didn't
+    text_dtypes = dict((name, object) for name, dtype in dtypes.items() if pd.api.types.is_string_dtype(dtype))
+    try:
+        return pd.read_csv(io.BytesIO(data), header=None, names=names, dtype=dtypes, encoding=encoding)
+    except (ValueError, TypeError):
+        return pd.read_csv(io.BytesIO(data), header=None, names=names, dtype=text_dtypes, encoding=encoding)
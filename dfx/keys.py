@@ -0,0 +1,187 @@
+import heapq
+import itertools
+
+import numpy as np
+import pandas as pd
+
+"""
+Candidate keys: minimal sets of columns whose values identify every row
+
+find_keys() searches level-wise, like TANE: single columns, then pairs, then triples, and so
+on, building each set of columns from a smaller set that isn't a key.
+
+A set of columns is kept as a stripped partition: the positions of the rows that still share
+their values with another row, and a code per such row identifying its group. Rows that are
+already unique drop out, so extending a set only looks at the rows it doesn't yet tell apart,
+which is usually a small fraction of the table after the first level.
+
+Pruning:
+    minimality      a set containing a key is not checked, and a set found to be a key is
+                    only reported once none of its subsets is one, since the beam may have
+                    dropped the smaller set before it was checked
+    redundancy      a set whose new column doesn't split any group (the column is determined
+                    by the others) isn't extended, since a key containing it wouldn't be minimal
+    cardinality     a set isn't extended if the product of its distinct count and the largest
+                    cardinalities it could still add is below the row count
+    beam            only the BEAM_WIDTH sets closest to being keys (most distinct values) are
+                    kept at each level, which also bounds memory use
+
+Columns with nulls are not considered, since a key value should identify a row, and
+constant columns never help identify one.
+
+Usage:
+    find_keys(df)       # [('order_id',), ('customer_id', 'order_date', 'line')]
+"""
+
+# the largest number of columns in a key
+MAX_KEY_COLUMNS = 4
+
+# number of sets of columns kept, and extended, at each level
+BEAM_WIDTH = 50
+
+# stop once this many keys are found
+MAX_KEYS = 20
+
+def find_keys(df, max_columns=MAX_KEY_COLUMNS, beam_width=BEAM_WIDTH, max_keys=MAX_KEYS):
+    """Minimal sets of columns that identify each row, see module notes
+
+    Returns a list of tuples of column names, smallest first, and for keys of the same size,
+    in the order of the columns.
+    """
+    row_count = len(df)
+    keys = []
+    if row_count < 2:
+        return keys
+
+    # single columns
+    columns = []
+    factorized = {}
+    level = []
+    for col_name in df.columns:
+        codes, uniques = pd.factorize(df[col_name])
+        if len(uniques) < 2 or (codes < 0).any():
+            continue
+        if len(uniques) == row_count:
+            keys.append((col_name,))
+            continue
+        columns.append(col_name)
+        factorized[col_name] = (codes.astype(np.int64), len(uniques))
+        rows, group_codes, groups = _strip(np.arange(row_count), codes.astype(np.int64))
+        level.append(_ColumnSet((col_name,), rows, group_codes, groups, len(uniques)))
+    cardinalities = dict((col_name, factorized[col_name][1]) for col_name in columns)
+
+    # larger sets, each extended by columns after its last one, so every set is built once
+    positions = dict((col_name, i) for i, col_name in enumerate(columns))
+    unique_cache = {}
+    for size in range(2, max_columns + 1):
+        if len(keys) >= max_keys or not level:
+            break
+        level = heapq.nlargest(beam_width, level, key=lambda column_set: column_set.distinct)
+        # (distinct, order found, column set), keeping the beam_width with the most distinct
+        next_level = []
+        found_order = itertools.count()
+        for column_set in level:
+            later_columns = columns[positions[column_set.columns[-1]] + 1:]
+            for col_name in later_columns:
+                candidate = column_set.columns + (col_name,)
+                if any(set(key) <= set(candidate) for key in keys):
+                    continue
+                codes, cardinality = factorized[col_name]
+                extended = column_set.extend(col_name, codes[column_set.rows], cardinality, row_count)
+                if extended is None:
+                    # col_name didn't split any group
+                    continue
+                if extended.is_key:
+                    key = _minimal_key(candidate, factorized, row_count, unique_cache)
+                    if not any(set(found) <= set(key) for found in keys):
+                        keys.append(key)
+                    continue
+                remaining_columns = columns[positions[col_name] + 1:]
+                if size < max_columns and _can_become_key(extended, remaining_columns, cardinalities, max_columns - size, row_count):
+                    heapq.heappush(next_level, (extended.distinct, next(found_order), extended))
+                    if len(next_level) > beam_width:
+                        heapq.heappop(next_level)
+        level = [column_set for distinct, order, column_set in next_level]
+
+    keys.sort(key=lambda key: (len(key), [_column_position(df, col_name) for col_name in key]))
+    return keys[:max_keys]
+
+class _ColumnSet(object):
+    """A set of columns, as a stripped partition of the rows, see module notes
+
+    .rows       positions of the rows that share their values with another row
+    .codes      a group code (0 to .groups - 1) for each of those rows
+    .groups     number of groups of rows sharing their values
+    .distinct   number of distinct value combinations in the table
+    """
+
+    def __init__(self, columns, rows, codes, groups, distinct):
+        self.columns = columns
+        self.rows = rows
+        self.codes = codes
+        self.groups = groups
+        self.distinct = distinct
+
+    @property
+    def is_key(self):
+        return len(self.rows) == 0
+
+    def extend(self, col_name, codes, cardinality, row_count):
+        """The set with col_name added, given col_name's codes for .rows, or None if adding it
+        doesn't split any group
+        """
+        combined_codes, combined = pd.factorize(self.codes.astype(np.int64) * cardinality + codes)
+        if len(combined) == self.groups:
+            return None
+        rows, group_codes, groups = _strip(self.rows, combined_codes)
+        distinct = (row_count - len(self.rows)) + len(combined)
+        return _ColumnSet(self.columns + (col_name,), rows, group_codes, groups, distinct)
+
+def _strip(rows, codes):
+    """Keep the rows whose code is shared with another row
+
+    Returns (rows, codes renumbered from 0, number of groups kept), as int32 to halve the
+    memory of the sets kept in the beam
+    """
+    counts = np.bincount(codes)
+    shared = counts[codes] > 1
+    kept_codes, groups = pd.factorize(codes[shared])
+    return rows[shared].astype(np.int32), kept_codes.astype(np.int32), len(groups)
+
+def _minimal_key(key, factorized, row_count, unique_cache):
+    """A minimal key within key, a set of columns identifying each row
+
+    Every single column of key has duplicates, so keys of two columns are minimal.
+    """
+    if len(key) <= 2:
+        return key
+    for subset in itertools.combinations(key, len(key) - 1):
+        if subset not in unique_cache:
+            unique_cache[subset] = _is_unique(subset, factorized, row_count)
+        if unique_cache[subset]:
+            return _minimal_key(subset, factorized, row_count, unique_cache)
+    return key
+
+def _is_unique(columns, factorized, row_count):
+    """Whether columns identify each row, by their combined codes
+    """
+    combined, distinct = factorized[columns[0]]
+    for col_name in columns[1:]:
+        codes, cardinality = factorized[col_name]
+        combined, uniques = pd.factorize(combined * cardinality + codes)
+        distinct = len(uniques)
+    return distinct == row_count
+
+def _can_become_key(column_set, remaining_columns, cardinalities, slots, row_count):
+    """Whether adding up to slots more of remaining_columns could identify every row
+    """
+    largest = sorted((cardinalities[col_name] for col_name in remaining_columns), reverse=True)[:slots]
+    bound = column_set.distinct
+    for cardinality in largest:
+        bound *= cardinality
+        if bound >= row_count:
+            return True
+    return False
+
+def _column_position(df, col_name):
+    return list(df.columns).index(col_name)
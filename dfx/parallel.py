@@ -0,0 +1,234 @@
+import os
+import time
+import pickle
+import logging
+import contextlib
+import multiprocessing
+import concurrent.futures
+
+from . import datastore as dfx_datastore
+from . import describers as dfx_describers
+from . import shared as dfx_shared
+from . import sketches as dfx_sketches
+
+logger = logging.getLogger(__name__)
+
+"""
+Calculating the describers of a page in a pool of worker processes
+
+A page describer (e.g. TablePageDescriber) reads dozens to thousands of other describers,
+calculating each one in turn. Most are independent, CPU bound pandas and scipy calls, so
+calculate_describers() runs them in a pool of processes first, and saves them to the store,
+where the page then finds them:
+
+    with store.batch():
+        calculate_describers(store, df, TablePageDescriber.required_describers(df), workers=8)
+        page = store.get_or_create(TablePageDescriber, df)
+
+The describers a page needs are a list of stages, each a list of (describer class, args).
+The describers of a stage are calculated at the same time, and a stage starts once the
+previous one is committed, so that later describers read earlier ones (e.g. ColumnProfile)
+from the store instead of each calculating them again.
+
+Workers only read the store. Each returns the describers it calculated, including ones it
+needed along the way, and this process saves them. A describer that fails in a worker is
+logged and left out, so the page calculates it (and raises) as it would without a pool.
+
+Workers attach to the dataframe through dfx.shared, which memory-maps its columns rather
+than sending each worker a copy, so adding workers doesn't multiply memory use. Tasks carry
+the handle, so the same pool can calculate describers of any dataframe.
+"""
+
+# calculate_describers() doesn't start a pool for fewer missing describers than this
+MIN_POOL_DESCRIBERS = 20
+
+# describers are sent to workers in about this many tasks per worker, so that a worker
+# finishing early picks up more work
+TASKS_PER_WORKER = 4
+
+def calculate_describers(store, df, stages, workers=None, min_describers=MIN_POOL_DESCRIBERS, executor=None, deadline=None, image_base_path=None):
+    """Calculate the describers in stages that aren't in store, in a pool of worker processes,
+    and save them to store
+
+    executor is a pool of worker processes to use (see new_executor()), which is left running,
+    e.g. to keep one between calls. Otherwise a pool of workers is started, if there are at
+    least min_describers to calculate.
+
+    At deadline (a time.time()), tasks not yet finished are cancelled, and the describers of
+    those that finished are saved.
+
+    Workers save plots in image_base_path, by default describers._IMAGE_BASE_PATH of the
+    calling process (see describers.propose_image_path()).
+
+    Returns the number of describers saved.
+    """
+    workers = workers or os.cpu_count() or 1
+    missing = [_missing(store, df, stage) for stage in stages]
+    total = sum(len(specs) for specs in missing)
+    if total == 0:
+        return 0
+    if executor is None and (workers < 2 or total < min_describers):
+        return 0
+    logger.debug("calculate_describers() %s describers", total)
+
+    saved = 0
+    store_args = None
+    if store._backend_name is not None:
+        store_args = (store._file_path, store._backend_name)
+    # workers can't tell whether a dataset was chosen to be sketched, see dfx.sketches
+    sketched = dfx_sketches.is_sketched(df)
+    if image_base_path is None:
+        image_base_path = dfx_describers._IMAGE_BASE_PATH
+    with store.batch(), dfx_shared.publish(df) as handle, _executor(executor, workers) as executor:
+        task_count = workers * TASKS_PER_WORKER
+        for i, stage in enumerate(stages):
+            # earlier stages may have saved some of this one along the way
+            specs = _missing(store, df, stage) if i else missing[0]
+            store.commit()
+            futures = [
+                executor.submit(_calculate, handle, store_args, image_base_path, sketched, chunk)
+                for chunk in _chunks(specs, task_count)]
+            timeout = None if deadline is None else max(0, deadline - time.time())
+            try:
+                for future in concurrent.futures.as_completed(futures, timeout=timeout):
+                    try:
+                        results = future.result()
+                    except Exception:
+                        logger.exception("calculate_describers() task failed")
+                        continue
+                    for data in results:
+                        describer = pickle.loads(data)
+                        # several workers may have calculated the same one (e.g. a profile)
+                        if store.has(describer.hash):
+                            continue
+                        describer.df = df
+                        store.save(describer.hash, describer)
+                        saved += 1
+            except concurrent.futures.TimeoutError:
+                logger.debug("calculate_describers() stopped at deadline, %s saved", saved)
+                for future in futures:
+                    future.cancel()
+                break
+    return saved
+
+def new_executor(workers):
+    """A pool of worker processes for calculate_describers()
+    """
+    # spawn rather than fork, since the web app calls this from request and background threads
+    context = multiprocessing.get_context('spawn')
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+@contextlib.contextmanager
+def _executor(executor, workers):
+    """Use executor, or a new pool of workers that is shut down afterwards
+    """
+    if executor is not None:
+        yield executor
+        return
+    executor = new_executor(workers)
+    try:
+        yield executor
+    finally:
+        # don't wait for tasks still running past a deadline
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _missing(store, df, stage):
+    """The (class, args) of stage whose describers aren't saved in store
+    """
+    missing = []
+    for klass, args in stage:
+        if not store.has(klass(df, *args).hash):
+            missing.append((klass, args))
+    return missing
+
+def _chunks(specs, count):
+    """Split specs into about count lists, keeping neighbours (e.g. describers of the same
+    column) together
+    """
+    size = max(1, -(-len(specs) // count))
+    return [specs[start:start + size] for start in range(0, len(specs), size)]
+
+# #######################################################################################
+# Worker processes
+
+# (df hash, store arguments) of the describers in the worker's factory, see _calculate()
+_factory_key = None
+
+def _calculate(handle, store_args, image_base_path, sketched, specs):
+    """Calculate describers in a worker process
+
+    Returns the describers calculated, including ones they read that weren't in the store,
+    pickled without their dataframe.
+    """
+    global _factory_key
+    df = dfx_shared.attach(handle)
+    dfx_sketches.set_sketched(df, sketched)
+    # keep what earlier tasks read and calculated, unless they were for other data or another store
+    key = (handle.fingerprint.df_hash, store_args)
+    if key != _factory_key:
+        store = None
+        if store_args is not None:
+            file_path, backend_name = store_args
+            store = dfx_datastore.DfxStore(file_path, backend=backend_name)
+        dfx_describers.factory = WorkerFactory(store)
+        _factory_key = key
+    dfx_describers._IMAGE_BASE_PATH = image_base_path
+
+    factory = dfx_describers.factory
+    factory.created = []
+    for klass, args in specs:
+        try:
+            factory.get_or_create(klass, df, *args)
+        except Exception:
+            logger.exception("Could not calculate %s%s", klass.__name__, args)
+    results = []
+    for describer in factory.created:
+        describer_df = describer.df
+        describer.df = None
+        try:
+            results.append(pickle.dumps(describer, pickle.HIGHEST_PROTOCOL))
+        finally:
+            describer.df = describer_df
+    factory.created = []
+    return results
+
+class WorkerFactory(object):
+    """The describer factory in a worker process
+
+    Like DfxStore.get_or_create(), but only reading the store. Describers it calculates are
+    kept in memory for the rest of the worker's tasks, and listed in .created for the
+    parent process to save.
+    """
+
+    def __init__(self, store):
+        self._store = store
+        # hash -> describer, for every describer this worker has read or calculated
+        self._describers = {}
+        self.created = []
+
+    def get_or_create(self, klass, df, *args, **kwargs):
+        instance = klass(df, *args)
+        if not getattr(instance, '_cacheable', True):
+            instance._ensure_calculated()
+            return instance
+
+        found = self._describers.get(instance.hash)
+        if found is None and self._store is not None:
+            try:
+                found = self._store._get_without_df(instance.hash)
+                found.df = instance.df
+                found._hash_df = instance._hash_df
+            except (KeyError, dfx_datastore.EmptyShelfException):
+                pass
+            except Exception:
+                # e.g. a dbm file that doesn't exist yet, or is being written; calculate it instead
+                logger.debug("Could not read %s from the store", instance.hash, exc_info=True)
+                found = None
+        if found is not None:
+            self._describers[instance.hash] = found
+            return found
+
+        instance._ensure_calculated()
+        self._describers[instance.hash] = instance
+        self.created.append(instance)
+        return instance
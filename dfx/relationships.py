@@ -0,0 +1,231 @@
+import numpy as np
+import pandas as pd
+
+from . import stats as dfx_stats
+
+"""
+Batched relationship calculations for every pair of columns in a table
+
+The relationship describers (RelationshipAnova, RelationshipCorrelation,
+RelationshipOneToMany) each scan their two columns, which is fine for one relationship
+page, but too slow to run for every pair of columns on the table page. These functions
+calculate the same statistics for all pairs at once (for 1:many mappings, see
+dfx.dependencies):
+
+    correlation_matrix()    Pearson r and p for every pair of numeric columns, from sums
+                            and cross products gathered with matrix multiplications
+    anova_matrix()          ANOVA F and p for every (text, numeric) pair; each text column
+                            is factorized once and the per-group count, sum and sum of
+                            squares of every numeric column are gathered with one bincount
+
+Rows are processed in blocks of BLOCK_ROWS, so memory use doesn't grow with the table. The
+sums are gathered by CorrelationSums and AnovaSums, which can be kept to add rows appended
+later without reading the earlier ones again.
+"""
+
+BLOCK_ROWS = 2 ** 16
+
+# anova_matrix() gathers sums for at most this many (value column, group) pairs at a time
+MAX_BINS = 2 ** 22
+
+# TableRelationships keeps the AnovaSums of group columns with at most this many groups, so
+# that appended rows can be added to them
+MAX_KEPT_GROUPS = 10000
+
+# #######################################################################################
+# Correlation
+
+def correlation_matrix(df, columns, block_rows=BLOCK_ROWS):
+    """Pearson correlation of every pair of numeric columns, using the rows where both are not null
+
+    Returns (r, p, n), each a dataframe indexed by columns on both axes. The same as
+    scipy.stats.pearsonr() on each pair with its nulls dropped.
+    """
+    return CorrelationSums(columns, column_means(df, columns)).add(df, block_rows=block_rows).result()
+
+class CorrelationSums(object):
+    """The sums correlation_matrix() is calculated from, which rows can be added to
+
+    Values are shifted by .shifts (the column means when first calculated) before they are
+    summed, which keeps the sums of squares accurate. More rows, e.g. those appended to a
+    dataset, can be added later with the same shifts (see dfx.incremental).
+    """
+
+    def __init__(self, columns, shifts):
+        k = len(columns)
+        self.columns = list(columns)
+        self.shifts = np.asarray(shifts, dtype=np.float64)
+        self.n = np.zeros((k, k))
+        self.sums = np.zeros((k, k))
+        self.squares = np.zeros((k, k))
+        self.products = np.zeros((k, k))
+
+    def add(self, df, start_row=0, block_rows=BLOCK_ROWS):
+        """Add the rows of df from start_row on, returning self
+        """
+        for start in range(start_row, len(df), block_rows):
+            x = _float_block(df, self.columns, start, start + block_rows) - self.shifts
+            present = ~np.isnan(x)
+            x[~present] = 0
+            present = present.astype(np.float64)
+            # [i, j] sums over the rows where both columns i and j are present
+            self.n += present.T @ present
+            self.sums += x.T @ present
+            self.squares += (x * x).T @ present
+            self.products += x.T @ x
+        return self
+
+    def result(self):
+        """(r, p, n), see correlation_matrix()
+        """
+        from scipy import stats as scipy_stats
+        n, sums, squares, columns = self.n, self.sums, self.squares, self.columns
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covariance = self.products - sums * sums.T / n
+            variance_1 = squares - sums ** 2 / n
+            variance_2 = variance_1.T
+            r = np.clip(covariance / np.sqrt(variance_1 * variance_2), -1, 1)
+            degrees = n - 2
+            t = np.abs(r) * np.sqrt(degrees / (1 - r * r))
+            p = 2 * scipy_stats.t.sf(t, degrees)
+        p[degrees < 1] = np.nan
+
+        return (
+            pd.DataFrame(r, index=columns, columns=columns),
+            pd.DataFrame(p, index=columns, columns=columns),
+            pd.DataFrame(n.astype(np.int64), index=columns, columns=columns),
+            )
+
+# #######################################################################################
+# ANOVA
+
+def anova_matrix(df, group_columns, value_columns, block_rows=BLOCK_ROWS):
+    """One-way ANOVA of every numeric value column grouped by every group column
+
+    Returns a dictionary of (group column, value column) to (F, p), leaving out pairs where
+    ANOVA isn't possible (e.g. a single group). The same as dfx.stats.one_way_anova().
+    """
+    results = {}
+    shifts = dict(zip(value_columns, column_means(df, value_columns)))
+    for group_name in group_columns:
+        codes, labels = pd.factorize(df[group_name], sort=True)
+        value_names = [col_name for col_name in value_columns if col_name != group_name]
+        # as many value columns at a time as keep the bins under MAX_BINS
+        batch_size = max(1, MAX_BINS // max(len(labels), 1))
+        for batch_start in range(0, len(value_names), batch_size):
+            batch = value_names[batch_start:batch_start + batch_size]
+            sums = AnovaSums(group_name, batch, [shifts[col_name] for col_name in batch])
+            sums.add_codes(df, codes, labels, block_rows=block_rows)
+            results.update(sums.result())
+    return results
+
+class AnovaSums(object):
+    """The per group sums anova_matrix() is calculated from for one group column, which rows
+    can be added to
+
+    .labels are the groups seen so far, sorted, and .counts, .sums and .squares have a row
+    per value column and a column per label. Rows with groups not seen before add labels.
+    The sums are the size of the value columns times the groups, so they are only worth
+    keeping for group columns with few groups (see MAX_KEPT_GROUPS).
+    """
+
+    def __init__(self, group_name, value_columns, shifts):
+        self.group_name = group_name
+        self.value_columns = [col_name for col_name in value_columns if col_name != group_name]
+        self.shifts = np.array([
+            shift for col_name, shift in zip(value_columns, shifts) if col_name != group_name], dtype=np.float64)
+        self.labels = np.array([], dtype=object)
+        k = len(self.value_columns)
+        self.counts = np.zeros((k, 0))
+        self.sums = np.zeros((k, 0))
+        self.squares = np.zeros((k, 0))
+
+    def add(self, df, start_row=0, block_rows=BLOCK_ROWS):
+        """Add the rows of df from start_row on, returning self
+        """
+        codes, labels = pd.factorize(df[self.group_name].iloc[start_row:], sort=True)
+        return self.add_codes(df, codes, labels, start_row, block_rows)
+
+    def add_codes(self, df, codes, labels, start_row=0, block_rows=BLOCK_ROWS):
+        """Add the rows of df from start_row on, their groups already factorized into codes
+        (with one code per row from start_row) and sorted labels
+        """
+        labels = np.asarray(labels, dtype=object)
+        if len(self.labels):
+            merged = np.union1d(self.labels, labels)
+            # move the existing sums to their labels' new positions
+            positions = np.searchsorted(merged, self.labels)
+            for name in ['counts', 'sums', 'squares']:
+                moved = np.zeros((len(self.value_columns), len(merged)))
+                moved[:, positions] = getattr(self, name)
+                setattr(self, name, moved)
+            codes = np.where(codes >= 0, np.searchsorted(merged, labels)[np.maximum(codes, 0)], -1)
+            labels = merged
+        else:
+            for name in ['counts', 'sums', 'squares']:
+                setattr(self, name, np.zeros((len(self.value_columns), len(labels))))
+        counts, sums, squares = _grouped_sums(
+            df, codes, len(labels), self.value_columns, self.shifts, block_rows, start_row)
+        self.labels = labels
+        self.counts += counts
+        self.sums += sums
+        self.squares += squares
+        return self
+
+    def result(self):
+        """(group column, value column) -> (F, p), see anova_matrix()
+        """
+        results = {}
+        for j, value_name in enumerate(self.value_columns):
+            present = self.counts[j] > 0
+            grouped = dfx_stats.GroupedStats(
+                self.labels[present], self.counts[j][present], self.sums[j][present], self.squares[j][present],
+                self.shifts[j])
+            try:
+                results[(self.group_name, value_name)] = dfx_stats.one_way_anova(grouped)
+            except ValueError:
+                pass
+        return results
+
+def _grouped_sums(df, codes, group_count, value_columns, shifts, block_rows, start_row=0):
+    """Count, sum and sum of squares of each value column for each group code
+
+    codes has one code per row of df from start_row on. Returns three arrays of shape
+    (value columns, groups), gathered with one bincount per block of rows, using a bin for
+    every (value column, group).
+    """
+    k = len(value_columns)
+    bin_count = k * group_count
+    counts = np.zeros(bin_count)
+    sums = np.zeros(bin_count)
+    squares = np.zeros(bin_count)
+    offsets = np.arange(k) * group_count
+    for start in range(start_row, len(df), block_rows):
+        block_codes = codes[start - start_row:start - start_row + block_rows]
+        x = _float_block(df, value_columns, start, start + block_rows) - shifts
+        present = ~np.isnan(x) & (block_codes >= 0)[:, None]
+        x[~present] = 0
+        bins = (offsets + np.where(block_codes >= 0, block_codes, 0)[:, None]).ravel()
+        counts += np.bincount(bins, weights=present.ravel(), minlength=bin_count)
+        sums += np.bincount(bins, weights=x.ravel(), minlength=bin_count)
+        squares += np.bincount(bins, weights=(x * x).ravel(), minlength=bin_count)
+    return counts.reshape(k, group_count), sums.reshape(k, group_count), squares.reshape(k, group_count)
+
+# #######################################################################################
+# Helpers
+
+def column_means(df, columns):
+    """The mean of each numeric column, which values are shifted by before they are summed
+    """
+    return np.array([np.nanmean(_float_values(df[col_name])) if len(df) else 0.0 for col_name in columns])
+
+def _float_values(col):
+    return np.asarray(col.values, dtype=np.float64)
+
+def _float_block(df, columns, start, stop):
+    """Rows start:stop of columns as a 2d float array, converting only those rows
+    """
+    block = np.empty((len(df.index[start:stop]), len(columns)))
+    for j, col_name in enumerate(columns):
+        block[:, j] = df[col_name].values[start:stop]
+    return block
@@ -0,0 +1,178 @@
+import math
+import weakref
+import threading
+import collections
+
+import numpy as np
+
+from . import fingerprint as dfx_fingerprint
+from . import dependencies as dfx_dependencies
+
+"""
+Samples of large dataframes, for approximate describers
+
+A describer calculated on sample_frame(df, rows) instead of df reads a fraction of the rows,
+and is saved under the sample's own hash, so it never stands in for the exact one. See
+describers.SamplingFactory, which pages use to show approximate results first.
+
+    sample = sample_frame(df, 100000)                   # uniform
+    sample = sample_frame(df, 100000, strata='region', columns=['region', 'sales'])
+    get_sample_info(sample)     # SampleInfo: rows of the sample and of df
+
+Samples are drawn with a seed from the dataframe's hash, so the same dataframe always gives
+the same sample, and describers calculated on it are found in the store again.
+
+Describers calculated on a sample report intervals where the sample supports one:
+
+    wilson_interval()       for a proportion, e.g. the null rate
+    correlation_interval()  for Pearson's r, by Fisher's z transformation
+"""
+
+# rows of a sample, for describers that don't set their own (see Describer._sample_rows)
+SAMPLE_ROWS = 100000
+
+# dataframes with more rows than this are sampled by describers.SamplingFactory
+SAMPLING_THRESHOLD = 1000000
+
+# rows kept from each stratum of a stratified sample, unless the stratum is smaller, so
+# that small groups are represented
+MIN_STRATUM_ROWS = 30
+
+# rows processed at once when drawing a stratified sample
+BLOCK_ROWS = 2 ** 20
+
+# z of a two-sided 95% interval
+Z_95 = 1.959964
+
+# number of samples kept in memory
+MAX_SAMPLES = 16
+
+# (df hash, rows, strata, columns) -> sample, least recently used first
+_samples = collections.OrderedDict()
+_samples_lock = threading.Lock()
+
+# id(sample) -> (weakref to sample, SampleInfo), like fingerprint._memo
+_sample_info = {}
+
+class SampleInfo(object):
+    """How a sample was drawn, see get_sample_info()
+
+    .population_rows    rows of the dataframe sampled
+    .rows               rows of the sample
+    .strata             column the sample was stratified by, or None for a uniform sample
+    """
+
+    def __init__(self, population_rows, rows, strata):
+        self.population_rows = population_rows
+        self.rows = rows
+        self.strata = strata
+
+    def __str__(self):
+        return "sample of {:,} of {:,} rows".format(self.rows, self.population_rows)
+
+def should_sample(df, rows, threshold=SAMPLING_THRESHOLD):
+    """Whether describers of df should be calculated on a sample of rows
+    """
+    if rows is None or get_sample_info(df) is not None:
+        return False
+    return len(df) > max(threshold, rows)
+
+def sample_frame(df, rows, strata=None, columns=None):
+    """A sample of about rows rows of df, in the order of df, memoized
+
+    With strata (a column name), rows are sampled in proportion from each value of the
+    column, keeping at least MIN_STRATUM_ROWS of each as long as that fits. With columns, the sample only has
+    those columns.
+    """
+    df_hash = dfx_fingerprint.get_fingerprint(df).df_hash
+    key = (df_hash, rows, strata, None if columns is None else tuple(columns))
+    with _samples_lock:
+        sample = _samples.get(key)
+        if sample is not None:
+            _samples.move_to_end(key)
+            return sample
+
+    random = np.random.default_rng(int(df_hash[:8], 16))
+    if strata is None:
+        positions = np.sort(random.choice(len(df), size=min(rows, len(df)), replace=False))
+    else:
+        positions = _stratified_positions(df[strata], rows, random)
+    sample = df.take(positions)
+    if columns is not None:
+        sample = sample[list(columns)]
+    sample_key = id(sample)
+    _sample_info[sample_key] = (
+        weakref.ref(sample, lambda ref: _forget(sample_key, ref)),
+        SampleInfo(len(df), len(sample), strata))
+
+    with _samples_lock:
+        _samples[key] = sample
+        while len(_samples) > MAX_SAMPLES:
+            _samples.popitem(last=False)
+    return sample
+
+def get_sample_info(df):
+    """SampleInfo of a sample from sample_frame(), or None for any other dataframe
+    """
+    entry = _sample_info.get(id(df))
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    return None
+
+def _forget(key, ref):
+    entry = _sample_info.get(key)
+    if entry is not None and entry[0] is ref:
+        del _sample_info[key]
+
+def _stratified_positions(col, rows, random):
+    """Positions of a Poisson sample of col, each row kept with its stratum's probability
+    """
+    codes, cardinality = dfx_dependencies.factorize_with_nulls(col)
+    sizes = np.bincount(codes, minlength=cardinality)
+    probabilities = np.minimum(_stratum_rows(sizes, rows) / np.maximum(sizes, 1), 1.0)
+    positions = []
+    for start in range(0, len(codes), BLOCK_ROWS):
+        block = codes[start:start + BLOCK_ROWS]
+        keep = random.random(len(block)) < probabilities[block]
+        positions.append(np.flatnonzero(keep) + start)
+    return np.concatenate(positions) if positions else np.empty(0, dtype=np.int64)
+
+def _stratum_rows(sizes, rows):
+    """Expected rows of each stratum of a sample of about rows rows, at least MIN_STRATUM_ROWS
+    (fewer when there are too many strata for that) and the rest in proportion to sizes
+    """
+    minimum = np.minimum(sizes, min(MIN_STRATUM_ROWS, rows / float(max(len(sizes), 1))))
+    # strata whose share in proportion is less than the minimum get the minimum, which
+    # leaves less for the others, so that more may get it
+    fraction = rows / float(max(sizes.sum(), 1))
+    at_minimum = sizes * fraction <= minimum
+    while True:
+        others = sizes[~at_minimum].sum()
+        fraction = (rows - minimum[at_minimum].sum()) / float(others) if others else 0.0
+        more = ~at_minimum & (sizes * fraction <= minimum)
+        if not more.any():
+            return np.where(at_minimum, minimum, sizes * fraction)
+        at_minimum |= more
+
+# #######################################################################################
+# Intervals
+
+def wilson_interval(count, n, z=Z_95):
+    """Wilson score interval of the proportion count / n, as (low, high)
+    """
+    if n == 0:
+        return (0.0, 1.0)
+    p = count / float(n)
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return (max(0.0, center - margin), min(1.0, center + margin))
+
+def correlation_interval(r, n, z=Z_95):
+    """Interval of Pearson's r from n pairs, by Fisher's z transformation, as (low, high)
+    """
+    if n <= 3 or abs(r) >= 1:
+        return (r, r)
+    fisher_z = math.atanh(r)
+    margin = z / math.sqrt(n - 3)
+    return (math.tanh(fisher_z - margin), math.tanh(fisher_z + margin))
@@ -0,0 +1,124 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+import contextlib
+import collections
+
+from . import columnar
+from . import fingerprint as dfx_fingerprint
+
+logger = logging.getLogger(__name__)
+
+"""
+Sharing a dataframe with worker processes without copying it to each one
+
+publish() gives a SharedFrame, a handle small enough to send with every task, and attach()
+turns it back into a dataframe in the worker:
+
+    with publish(df) as handle:
+        executor.submit(work, handle)
+
+    def work(handle):
+        df = attach(handle)
+
+The dataframe is shared as a columnar dataset (see dfx.columnar), whose fixed width columns
+are memory-mapped, so every process reads the same pages of the operating system's cache
+rather than its own copy:
+
+    - a dataframe opened from a dataset is already backed by one, so the handle refers to it
+    - any other dataframe is written once to SHARED_DIRECTORY, and removed when the last
+      publish() of it exits
+
+Text (object) columns can't be shared as python objects. Each process rebuilds them from
+the shared int32 codes and its own copy of the distinct values.
+
+attach() memoizes dataframes by fingerprint, so a worker opens each one once however many
+tasks it runs, and the dataframe keeps the fingerprint of the published one, so describers
+calculated in workers have the same hashes.
+"""
+
+SHARED_DIRECTORY = os.path.join(tempfile.gettempdir(), 'dfx-shared')
+
+# number of dataframes attach() keeps open in a process
+MAX_ATTACHED = 4
+
+# df hash -> [SharedFrame, number of publish() using it], for datasets this process wrote
+_published = {}
+_published_lock = threading.Lock()
+
+# df hash -> dataframe, least recently used first
+_attached = collections.OrderedDict()
+_attached_lock = threading.Lock()
+
+class SharedFrame(object):
+    """Handle to a published dataframe, see publish()
+
+    .path           the dataset
+    .columns        the dataset's columns in the dataframe, or None for all of them
+    .fingerprint    of the published dataframe
+    .dataset_hash   df hash recorded in the dataset when it was published, to detect a
+                    dataset that has been replaced since
+    .temporary      True if publish() wrote the dataset, and will remove it
+    """
+
+    def __init__(self, path, columns, fingerprint, dataset_hash, temporary):
+        self.path = path
+        self.columns = columns
+        self.fingerprint = fingerprint
+        self.dataset_hash = dataset_hash
+        self.temporary = temporary
+
+    def __repr__(self):
+        return "SharedFrame({}, {})".format(self.path, self.fingerprint.df_hash)
+
+@contextlib.contextmanager
+def publish(df):
+    """Share df with other processes until the block exits, see module notes
+    """
+    fingerprint = dfx_fingerprint.get_fingerprint(df)
+    reference = columnar.get_reference(df)
+    if reference is not None:
+        yield SharedFrame(reference.path, reference.columns, fingerprint, fingerprint.df_hash, False)
+        return
+
+    with _published_lock:
+        entry = _published.get(fingerprint.df_hash)
+        if entry is None:
+            path = os.path.join(SHARED_DIRECTORY, '{}-{}.dfx'.format(fingerprint.df_hash, os.getpid()))
+            schema = columnar.write_frame(df, path)
+            dataset_hash = dfx_fingerprint.Fingerprint.from_dict(schema['fingerprint']).df_hash
+            entry = _published[fingerprint.df_hash] = [SharedFrame(path, None, fingerprint, dataset_hash, True), 0]
+            logger.debug("published %s", entry[0])
+        entry[1] += 1
+    try:
+        yield entry[0]
+    finally:
+        with _published_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _published[fingerprint.df_hash]
+                # processes still attached keep their memory maps, which outlive the files
+                shutil.rmtree(entry[0].path, ignore_errors=True)
+
+def attach(handle):
+    """The dataframe published as handle, opened once per process
+    """
+    key = handle.fingerprint.df_hash
+    with _attached_lock:
+        df = _attached.get(key)
+        if df is not None:
+            _attached.move_to_end(key)
+            return df
+
+    df = columnar.open_frame(handle.path, columns=handle.columns)
+    if dfx_fingerprint.get_fingerprint(df).df_hash != handle.dataset_hash:
+        raise ValueError("Dataset has changed since it was published", handle.path)
+    dfx_fingerprint.set_fingerprint(df, handle.fingerprint)
+
+    with _attached_lock:
+        _attached[key] = df
+        while len(_attached) > MAX_ATTACHED:
+            _attached.popitem(last=False)
+    return df
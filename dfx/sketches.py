@@ -0,0 +1,529 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from . import stats as dfx_stats
+from . import fingerprint as dfx_fingerprint
+
+"""
+Probabilistic sketches of columns too large to hash exactly
+
+profile_column() factorizes the whole column, which for a high-cardinality text column means
+a hash table of every distinct value. The sketches here use a fixed amount of memory however
+many rows and distinct values there are:
+
+    HyperLogLog     distinct count, within about 1.04 / sqrt(2 ** precision) (0.8% by default)
+    MisraGries      most common values, each count at most .max_error below the true count
+    Histogram       counts of numeric values in bins that widen as the range grows
+
+Moments keeps the mean and variance, exactly but without the values.
+
+Both are mergeable: sketches of two chunks merged give the sketch of both, so a column can
+be sketched a chunk at a time, or chunks sketched separately and combined. ColumnSketch keeps
+one of each plus the exact counts, and gives dfx.stats.ColumnStats with .approximate set
+(dfx.streaming uses it to profile files without opening them):
+
+    sketch = ColumnSketch()
+    for chunk in chunks:
+        sketch.add(chunk)
+    stats = sketch.stats()
+
+describers.ColumnProfile uses sketch_column() instead of profile_column() for dataframes
+where is_sketched(): ones with more than SKETCH_THRESHOLD rows, unless set_sketched() says
+otherwise for the dataframe (e.g. per dataset, see DFX_SKETCH_DATASETS in dfx.web).
+"""
+
+# dataframes with more rows than this are sketched, unless set_sketched() says otherwise
+SKETCH_THRESHOLD = 10000000
+
+# rows of a column added to a sketch at once, which bounds the memory of the exact counts
+# of each chunk
+CHUNK_ROWS = 2 ** 20
+
+# HyperLogLog has 2 ** precision registers of one byte each
+HLL_PRECISION = 14
+
+# bins kept by Histogram, grouped into dfx.stats.HISTOGRAM_BINS for ColumnStats
+HISTOGRAM_SKETCH_BINS = 8 * dfx_stats.HISTOGRAM_BINS
+
+# counters kept by MisraGries, far more than the TOP_VALUES shown so that their order and
+# counts are close to exact
+MG_COUNTERS = 1000
+
+# counters of a MisraGries that keeps every value, see ColumnSketch(exact=True)
+EXACT = float('inf')
+
+# df hash -> whether its ColumnProfile is sketched, see set_sketched()
+_sketched = {}
+
+def is_sketched(df):
+    """Whether describers of df use sketches instead of exact counts
+    """
+    sketched = _sketched.get(dfx_fingerprint.get_fingerprint(df).df_hash)
+    if sketched is None:
+        return len(df) > SKETCH_THRESHOLD
+    return sketched
+
+def set_sketched(df, sketched):
+    """Sketch (True) or count exactly (False) for df and any dataframe with the same data, or
+    None to decide by SKETCH_THRESHOLD
+    """
+    df_hash = dfx_fingerprint.get_fingerprint(df).df_hash
+    if sketched is None:
+        _sketched.pop(df_hash, None)
+    else:
+        _sketched[df_hash] = bool(sketched)
+
+def sketch_column(col, chunk_rows=CHUNK_ROWS):
+    """Like dfx.stats.profile_column(), but approximating distinct and duplicate counts and the
+    most common values with sketches
+    """
+    sketch = ColumnSketch()
+    for start in range(0, max(len(col), 1), chunk_rows):
+        sketch.add(col.iloc[start:start + chunk_rows])
+    return sketch.stats()
+
+def hash_values(values):
+    """uint64 hash of each value, the same for equal values in any chunk
+
+    Whole floats are hashed as integers, so that a chunk read as integers and one read as
+    floats (because of a null) agree. Integers aren't converted to floats, which can't hold
+    every integer above 2 ** 53.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind != 'f':
+        return pd.util.hash_array(values)
+    hashes = pd.util.hash_array(values)
+    with np.errstate(invalid='ignore'):
+        whole = (values == np.floor(values)) & (values >= -2.0 ** 63) & (values < 2.0 ** 63)
+    if whole.any():
+        hashes[whole] = pd.util.hash_array(values[whole].astype(np.int64))
+    return hashes
+
+# #######################################################################################
+# HyperLogLog
+
+class HyperLogLog(object):
+    """Distinct count estimate (Flajolet et al. 2007), from the uint64 hashes of values
+
+    Each hash picks one of 2 ** precision registers by its first bits, which keeps the longest
+    run of leading zeros of the remaining bits; more distinct values make longer runs likely.
+    """
+
+    def __init__(self, precision=HLL_PRECISION):
+        # the rest of each hash has to fit a float64, see _bit_length()
+        if not 11 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be from 11 to 18", precision)
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self):
+        """Standard error of count(), relative to the count
+        """
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return
+        bits = 64 - self.precision
+        indexes = (hashes >> np.uint64(bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        ranks = (bits + 1 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, indexes, ranks)
+
+    def add(self, values):
+        self.add_hashes(hash_values(values))
+
+    def merge(self, other):
+        """Combine other's values into this one, returning self
+        """
+        if other.precision != self.precision:
+            raise ValueError("Can't merge HyperLogLog of different precisions", self.precision, other.precision)
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        m = float(len(self.registers))
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        zeros = int((self.registers == 0).sum())
+        # linear counting is more accurate while many registers are empty
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+def _bit_length(values):
+    """Number of bits of each uint64 below 2 ** 53, 0 for 0
+
+    These convert to float64 exactly, so the exponent is the number of bits.
+    """
+    return np.frexp(values.astype(np.float64))[1]
+
+# #######################################################################################
+# Misra-Gries
+
+class MisraGries(object):
+    """Most common values (Misra & Gries 1982), in the mergeable form of Agarwal et al. 2012
+
+    Keeps at most .counters values. Whenever there would be more, every count is lowered by
+    the count of the first value left out, and values reaching zero are dropped. A value more
+    common than .total / (.counters + 1) is always kept. With EXACT counters, every value is
+    kept, so counts are exact.
+
+    .counts         series of value -> count, in order of first appearance, each at most
+                    .max_error below the value's true count
+    .total          number of values added
+    .max_error      sum of the counts lowered by, so far
+    """
+
+    def __init__(self, counters=None):
+        self.counters = counters or MG_COUNTERS
+        self.counts = pd.Series([], dtype=np.int64)
+        self.total = 0
+        self.max_error = 0
+
+    def add(self, values):
+        """Add a series of non-null values
+        """
+        chunk = MisraGries(self.counters)
+        chunk.counts = pd.Series(values).value_counts(sort=False)
+        chunk.total = int(chunk.counts.sum())
+        chunk._reduce()
+        self.merge(chunk)
+
+    def merge(self, other):
+        """Combine other's values into this one, returning self
+        """
+        if len(self.counts) and len(other.counts):
+            self.counts = pd.concat([self.counts, other.counts]).groupby(level=0, sort=False).sum()
+        elif len(other.counts):
+            self.counts = other.counts.copy()
+        self.total += other.total
+        self.max_error += other.max_error
+        self._reduce()
+        return self
+
+    def top(self, n):
+        """The n values with the highest counts, as a list of (value, count)
+        """
+        order = np.argsort(-self.counts.values, kind='stable')[:n]
+        return [(dfx_stats._python_value(self.counts.index[i]), int(self.counts.iloc[i])) for i in order]
+
+    def _reduce(self):
+        if len(self.counts) <= self.counters:
+            return
+        threshold = int(np.partition(self.counts.values, -(self.counters + 1))[-(self.counters + 1)])
+        self.counts = self.counts[self.counts > threshold] - threshold
+        self.max_error += threshold
+
+# #######################################################################################
+# Numeric accumulators
+
+class Moments(object):
+    """Count, mean and sum of squared differences from the mean of numbers, merged with the
+    formula of Chan et al. 1979 so that adding chunks doesn't lose precision
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    @property
+    def std(self):
+        """Standard deviation with one degree of freedom, like pd.Series.std(), or None
+        """
+        if self.count < 2:
+            return None
+        return math.sqrt(self.m2 / (self.count - 1))
+
+    def add(self, values):
+        """Add an array of finite numbers
+        """
+        chunk = Moments()
+        chunk.count = len(values)
+        if chunk.count:
+            chunk.mean = float(values.mean())
+            chunk.m2 = float(((values - chunk.mean) ** 2).sum())
+        return self.merge(chunk)
+
+    def merge(self, other):
+        count = self.count + other.count
+        if not other.count:
+            return self
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        return self
+
+class Histogram(object):
+    """Counts of numbers in equal bins (an even number of them), which double in width as
+    values outside them are added
+
+    Bins start at .origin and are .width wide. Doubling merges neighbouring bins, so counts
+    stay exact for the bins they end up in. merge() adds another histogram's counts at the
+    centers of its bins, which is only exact if the bins line up.
+    """
+
+    def __init__(self, bins=None):
+        self.counts = np.zeros(bins or HISTOGRAM_SKETCH_BINS, dtype=np.int64)
+        self.origin = None
+        self.width = None
+
+    def add(self, values, weights=None):
+        """Add an array of finite numbers, each counted weights times if given
+        """
+        if not len(values):
+            return self
+        low, high = float(values.min()), float(values.max())
+        if self.origin is None:
+            self.origin = low
+            self.width = (high - low) / len(self.counts) or 1.0
+        self._cover(low, high)
+        # the highest value is the last bin's upper edge, like np.histogram()
+        indexes = np.minimum(((values - self.origin) // self.width).astype(np.int64), len(self.counts) - 1)
+        self.counts += np.bincount(indexes, weights=weights, minlength=len(self.counts)).astype(np.int64)
+        return self
+
+    def merge(self, other):
+        if other.origin is not None:
+            centers = other.origin + (np.arange(len(other.counts)) + 0.5) * other.width
+            used = other.counts > 0
+            self.add(centers[used], other.counts[used])
+        return self
+
+    def result(self, bins=dfx_stats.HISTOGRAM_BINS):
+        """(counts, bin edges) of at most bins bins, like np.histogram(), or None if empty
+        """
+        used = np.flatnonzero(self.counts)
+        if not len(used):
+            return None
+        counts = self.counts[used[0]:used[-1] + 1]
+        group = -(-len(counts) // bins)
+        counts = np.concatenate([counts, np.zeros(-len(counts) % group, dtype=np.int64)])
+        counts = counts.reshape(-1, group).sum(axis=1)
+        start = self.origin + used[0] * self.width
+        edges = start + np.arange(len(counts) + 1) * self.width * group
+        return counts, edges
+
+    def _cover(self, low, high):
+        """Double the bins until they cover low to high
+        """
+        bins = len(self.counts)
+        while low < self.origin or high > self.origin + bins * self.width:
+            halved = self.counts.reshape(-1, 2).sum(axis=1)
+            self.counts = np.zeros(bins, dtype=np.int64)
+            if low < self.origin:
+                # the old bins become the right half
+                self.counts[bins // 2:] = halved
+                self.origin -= bins * self.width
+            else:
+                self.counts[:bins // 2] = halved
+            self.width *= 2
+
+# #######################################################################################
+# Column sketch
+
+class ColumnSketch(object):
+    """Mergeable statistics of a column, added a chunk at a time, see stats()
+
+    Rows, nulls, min, max, mean and standard deviation are exact; distinct values are a
+    HyperLogLog estimate, the most common values a MisraGries summary, and the histogram a
+    Histogram's. Chunks are expected in row order: merge() treats other as the rows after
+    this sketch's, for the first values and whether values are monotonic.
+
+    With exact, the MisraGries keeps every value, so distinct counts and top values are exact
+    too, at the cost of memory for every distinct value. dfx.incremental keeps these to update
+    a column's profile as rows are appended.
+    """
+
+    def __init__(self, exact=False):
+        self.exact = exact
+        self.dtype = None
+        self.inferred_type = None
+        self.row_count = 0
+        self.null_count = 0
+        self.min = None
+        self.max = None
+        self.is_monotonic = True
+        self.is_consecutive = True
+        self.first = None
+        self.last = None
+        self.first_values = []
+        self._first_characters = -2
+        self.distinct = HyperLogLog()
+        self.top = MisraGries(EXACT if exact else None)
+        self.moments = Moments()
+        self.histogram = Histogram()
+
+    def add(self, col):
+        """Add the next rows of a column, as a series
+        """
+        chunk = ColumnSketch(self.exact)
+        # values go straight into this histogram, whose bins the chunk's wouldn't line up with
+        chunk._calculate(col, first_values=self._first_characters <= dfx_stats.FIRST_VALUES_CHARACTERS, histogram=self.histogram)
+        return self.merge(chunk)
+
+    def merge(self, other):
+        """Combine the sketch of the rows after this one's into this one, returning self
+        """
+        if other.row_count == 0 and other.dtype is None:
+            return self
+        if self.row_count == 0 and self.dtype is None:
+            self.dtype = other.dtype
+            self.inferred_type = other.inferred_type
+        else:
+            self.dtype = _merge_dtypes(self.dtype, other.dtype)
+            self.inferred_type = _merge_types(self.inferred_type, other.inferred_type)
+
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        if self.last is not None and other.first is not None:
+            # compared rather than subtracted, as in dfx.stats._monotonic_and_consecutive()
+            self.is_monotonic = self.is_monotonic and other.is_monotonic and bool(other.first >= self.last)
+            self.is_consecutive = self.is_consecutive and other.is_consecutive and bool(other.first == self.last + 1)
+        else:
+            self.is_monotonic = self.is_monotonic and other.is_monotonic
+            self.is_consecutive = self.is_consecutive and other.is_consecutive
+        if not self.row_count:
+            self.first = other.first
+        if other.row_count:
+            self.last = other.last
+
+        self.row_count += other.row_count
+        self.null_count += other.null_count
+        self.distinct.merge(other.distinct)
+        self.top.merge(other.top)
+        self.moments.merge(other.moments)
+        self.histogram.merge(other.histogram)
+        for value in other.first_values:
+            if self._first_characters > dfx_stats.FIRST_VALUES_CHARACTERS:
+                break
+            if value not in self.first_values:
+                self.first_values.append(value)
+                self._first_characters += len(str(value)) + 2
+        return self
+
+    def stats(self, top_values=dfx_stats.TOP_VALUES):
+        """dfx.stats.ColumnStats of the rows added, with .approximate set unless exact
+        """
+        stats = dfx_stats.ColumnStats()
+        stats.approximate = not self.exact
+        stats.distinct_error = self.distinct.relative_error
+        stats.top_values_error = self.top.max_error
+        stats.dtype = self.dtype
+        stats.inferred_type = self.inferred_type
+        stats.row_count = self.row_count
+        stats.null_count = self.null_count
+
+        values = self.row_count - self.null_count
+        if self.top.max_error == 0:
+            # every value fit in the top values, which are then exact
+            distinct = len(self.top.counts)
+            stats.distinct_error = 0.0
+        else:
+            distinct = min(self.distinct.count(), values)
+            # within the error of every value being distinct, e.g. an id column
+            if values - distinct <= 3 * stats.distinct_error * values:
+                distinct = values
+        stats.distinct_count = distinct
+        stats.duplicate_count = self.row_count - distinct - (1 if self.null_count else 0)
+        stats.top_values = self.top.top(top_values)
+        stats.first_values = list(self.first_values)
+
+        # chunks may have been numeric in a column that isn't, e.g. all null
+        if not _is_numeric_name(self.dtype):
+            return stats
+        # values of chunks read as integers, in a column of floats
+        convert = lambda value: dfx_stats._python_value(np.dtype(self.dtype).type(value))
+        stats.top_values = [(convert(value), count) for value, count in stats.top_values]
+        stats.first_values = _first_values(convert(value) for value in self.first_values)
+        stats.min = None if self.min is None else convert(self.min)
+        stats.max = None if self.max is None else convert(self.max)
+        if self.row_count > 1:
+            stats.is_monotonic = self.is_monotonic
+            stats.is_consecutive = self.is_consecutive
+        if self.moments.count:
+            stats.mean = self.moments.mean
+            stats.std = self.moments.std
+        stats.histogram = self.histogram.result()
+        return stats
+
+    def _calculate(self, col, first_values=True, histogram=None):
+        self.dtype = str(col.dtype)
+        self.inferred_type = dfx_stats.infer_type(col)
+        self.row_count = len(col)
+        nulls = col.isnull().values
+        self.null_count = int(nulls.sum())
+        values = col.values[~nulls] if self.null_count else col.values
+        self.distinct.add(values)
+        self.top.add(values)
+
+        # first distinct values, in order of appearance, until an earlier chunk has enough
+        for value in (pd.unique(values) if first_values else ()):
+            if self._first_characters > dfx_stats.FIRST_VALUES_CHARACTERS:
+                break
+            self.first_values.append(dfx_stats._python_value(value))
+            self._first_characters += len(str(value)) + 2
+
+        if dfx_stats.is_numeric_dtype(col.dtype) and self.row_count:
+            if len(values):
+                self.min = dfx_stats._python_value(values.min())
+                self.max = dfx_stats._python_value(values.max())
+            self.first = col.values[0]
+            self.last = col.values[-1]
+            self.is_monotonic, self.is_consecutive = dfx_stats._monotonic_and_consecutive(col.values)
+            finite = np.asarray(values, dtype=np.float64)
+            finite = finite[np.isfinite(finite)]
+            self.moments.add(finite)
+            (self.histogram if histogram is None else histogram).add(finite)
+
+def _first_values(values):
+    """The first of values, until they are longer than FIRST_VALUES_CHARACTERS when joined
+    with ', ', like dfx.stats.profile_column()
+    """
+    first_values = []
+    # the first value has no separator
+    characters = -2
+    for value in values:
+        if characters > dfx_stats.FIRST_VALUES_CHARACTERS:
+            break
+        first_values.append(value)
+        characters += len(str(value)) + 2
+    return first_values
+
+def _merge_dtypes(a, b):
+    """Dtype of two chunks together, as pd.concat() would make it
+    """
+    if a == b:
+        return a
+    if _is_numeric_name(a) and _is_numeric_name(b):
+        return str(np.result_type(a, b))
+    return 'object'
+
+def _is_numeric_name(dtype):
+    if dtype is None:
+        return False
+    try:
+        return dfx_stats.is_numeric_dtype(np.dtype(dtype))
+    except TypeError:
+        # pandas extension dtypes, e.g. 'category'
+        return False
+
+def _merge_types(a, b):
+    """Inferred type of two chunks together, see dfx.stats.infer_type()
+    """
+    if a == b or b == 'empty':
+        return a
+    if a == 'empty':
+        return b
+    # e.g. a chunk of integers and one with a null, read as floats
+    if set([a, b]) == set(['integer', 'floating']):
+        return 'floating'
+    return 'mixed'
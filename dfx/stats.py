@@ -0,0 +1,262 @@
+import numpy as np
+import pandas as pd
+
+"""
+Vectorized statistics kernels used by dfx.describers
+
+Describers call these, rather than computing statistics themselves, so that the same
+statistic isn't recomputed by several describers. Results are cached in the describer
+store by wrapping them in a describer (e.g. ColumnProfile).
+"""
+
+# number of most common values kept by profile_column()
+TOP_VALUES = 10
+
+# profile_column() keeps the first distinct values, until they are this many characters
+# long when joined with ', '
+FIRST_VALUES_CHARACTERS = 100
+
+# bins of the histogram of numeric columns kept by profile_column()
+HISTOGRAM_BINS = 10
+
+# values of pd.api.types.infer_dtype(col, skipna=False) for columns where every value is a
+# string, including columns with no values
+TEXT_TYPES = ('string', 'empty')
+
+# #######################################################################################
+# Column profile
+
+class ColumnStats(object):
+    """Statistics about one column, see profile_column()
+
+    .dtype              name of the column's dtype
+    .inferred_type      type of the values, from pd.api.types.infer_dtype() (see infer_type())
+    .is_text            every value is a string (no nulls)
+    .row_count          number of rows, including nulls
+    .null_count         number of null values
+    .distinct_count     number of distinct non-null values
+    .duplicate_count    number of rows whose value (including null) appeared in an earlier row,
+                        the same as col.duplicated().sum()
+    .min, .max          of non-null values, for numeric columns, otherwise None
+    .is_monotonic       values never decrease, for numeric columns
+    .is_consecutive     each value is one more than the previous, for numeric columns
+    .mean, .std         of finite values, for numeric columns, otherwise None (std with one
+                        degree of freedom, like col.std())
+    .histogram          (counts, bin edges) of finite values, like np.histogram(), for numeric
+                        columns with any, otherwise None
+    .top_values         list of (value, count) for the most common non-null values, like
+                        col.value_counts().head(TOP_VALUES)
+    .first_values       the first distinct values, in order of appearance, until they are
+                        longer than FIRST_VALUES_CHARACTERS when joined with ', '
+    .approximate        distinct and duplicate counts and top values are estimates from
+                        sketches (see dfx.sketches), in which case
+    .distinct_error     is the relative standard error of .distinct_count (0 if exact), and
+    .top_values_error   the most each count of .top_values may be below the true count
+    """
+
+    dtype = None
+    inferred_type = None
+    row_count = 0
+    null_count = 0
+    distinct_count = 0
+    duplicate_count = 0
+    min = None
+    max = None
+    is_monotonic = False
+    is_consecutive = False
+    mean = None
+    std = None
+    histogram = None
+    top_values = ()
+    first_values = ()
+    approximate = False
+    distinct_error = 0.0
+    top_values_error = 0
+
+    @property
+    def is_text(self):
+        return self.inferred_type in TEXT_TYPES
+
+    @property
+    def null_rate(self):
+        return self.null_count / float(self.row_count) if self.row_count else float('nan')
+
+    @property
+    def duplicate_rate(self):
+        return self.duplicate_count / float(self.row_count) if self.row_count else float('nan')
+
+def profile_column(col, top_values=TOP_VALUES):
+    """Calculate ColumnStats for a pandas series
+
+    The column is hashed once (pd.factorize); counts, nulls, duplicates, min/max and the most
+    common values are all derived from the codes and distinct values it returns.
+    """
+    stats = ColumnStats()
+    stats.dtype = str(col.dtype)
+    stats.inferred_type = infer_type(col)
+    stats.row_count = len(col)
+
+    codes, uniques = pd.factorize(col)
+    uniques = np.asarray(uniques)
+    stats.distinct_count = len(uniques)
+    stats.null_count = int((codes == -1).sum())
+    # nulls count as one more distinct value for duplicated()
+    stats.duplicate_count = stats.row_count - stats.distinct_count - (1 if stats.null_count else 0)
+
+    # counts and most common values
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    order = np.argsort(-counts, kind='stable')[:top_values]
+    stats.top_values = [(_python_value(uniques[i]), int(counts[i])) for i in order]
+
+    # first distinct values, which factorize returns in order of appearance
+    first_values = []
+    # the first value has no separator
+    characters = -2
+    for value in uniques:
+        if characters > FIRST_VALUES_CHARACTERS:
+            break
+        first_values.append(_python_value(value))
+        characters += len(str(value)) + 2
+    stats.first_values = first_values
+
+    # numeric
+    if is_numeric_dtype(col.dtype):
+        if len(uniques):
+            stats.min = _python_value(uniques.min())
+            stats.max = _python_value(uniques.max())
+        if stats.row_count > 1:
+            stats.is_monotonic, stats.is_consecutive = _monotonic_and_consecutive(col.values)
+        values = np.asarray(col.values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values):
+            stats.mean = float(values.mean())
+            stats.histogram = np.histogram(values, bins=HISTOGRAM_BINS)
+        if len(values) > 1:
+            stats.std = float(values.std(ddof=1))
+
+    return stats
+
+# #######################################################################################
+# Grouped statistics
+
+class GroupedStats(object):
+    """Count, sum and sum of squares of a numeric column for each group, see group_stats()
+
+    Values are shifted by .shift (the overall mean) before summing, so that the sums of
+    squares don't lose precision on values that are large relative to their spread.
+
+    .labels             distinct group values, sorted like groupby()
+    .counts             number of non-null values in each group
+    .sums               sum of (value - shift) in each group
+    .sums_of_squares    sum of (value - shift) ** 2 in each group
+    """
+
+    def __init__(self, labels, counts, sums, sums_of_squares, shift):
+        self.labels = labels
+        self.counts = counts
+        self.sums = sums
+        self.sums_of_squares = sums_of_squares
+        self.shift = shift
+
+    @property
+    def means(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sums / self.counts + self.shift
+
+    def means_frame(self, group_name, value_name):
+        """The same as df.groupby(group_name)[value_name].mean().to_frame().reset_index()
+        """
+        return pd.DataFrame({group_name: self.labels, value_name: self.means}, columns=[group_name, value_name])
+
+def group_stats(groups, values):
+    """Calculate GroupedStats of values (a numeric series) grouped by groups
+
+    Rows where either the group or the value is null are left out, like groupby().
+    """
+    codes, labels = pd.factorize(groups, sort=True)
+    values = np.asarray(values, dtype=np.float64)
+    keep = (codes >= 0) & ~np.isnan(values)
+    if not keep.all():
+        codes = codes[keep]
+        values = values[keep]
+    shift = values.mean() if len(values) else 0.0
+    shifted = values - shift
+    counts = np.bincount(codes, minlength=len(labels))
+    sums = np.bincount(codes, weights=shifted, minlength=len(labels))
+    sums_of_squares = np.bincount(codes, weights=shifted * shifted, minlength=len(labels))
+
+    # groups whose values were all null
+    present = counts > 0
+    if not present.all():
+        labels = labels[present]
+        counts, sums, sums_of_squares = counts[present], sums[present], sums_of_squares[present]
+    return GroupedStats(np.asarray(labels), counts, sums, sums_of_squares, shift)
+
+def one_way_anova(grouped):
+    """F and p of a one-way ANOVA, from GroupedStats, matching scipy.stats.f_oneway()
+
+    Raises ValueError if there aren't at least two groups and more values than groups.
+    """
+    from scipy import stats as scipy_stats
+    group_count = len(grouped.counts)
+    value_count = grouped.counts.sum()
+    if group_count < 2:
+        raise ValueError("ANOVA requires at least two groups")
+    if value_count <= group_count:
+        raise ValueError("ANOVA requires more values than groups")
+
+    total = grouped.sums.sum()
+    between_squares = (grouped.sums ** 2 / grouped.counts).sum() - total ** 2 / value_count
+    within_squares = (grouped.sums_of_squares - grouped.sums ** 2 / grouped.counts).sum()
+    between_df = group_count - 1
+    within_df = value_count - group_count
+    with np.errstate(invalid='ignore', divide='ignore'):
+        f = (between_squares / between_df) / (within_squares / within_df)
+    p = scipy_stats.f.sf(f, between_df, within_df)
+    return float(f), float(p)
+
+# #######################################################################################
+# Types
+
+def infer_type(col):
+    """The type of the values in col, e.g. 'string', 'integer', 'floating' or 'mixed'
+
+    This is pd.api.types.infer_dtype(), which checks object columns in C and stops at the first
+    value that doesn't fit, instead of calling type() on every value. Nulls are not skipped, so
+    a column of strings with a null is 'mixed'.
+    """
+    return pd.api.types.infer_dtype(col, skipna=False)
+
+def is_text(col):
+    """True if every value in col is a string
+    """
+    return infer_type(col) in TEXT_TYPES
+
+# #######################################################################################
+# Helpers
+
+def is_numeric_dtype(dtype):
+    """The same test as dfx.describers.is_numeric(), for a dtype
+    """
+    try:
+        return np.issubdtype(dtype, np.number)
+    except TypeError:
+        # pandas extension dtypes, which numpy doesn't understand
+        return False
+
+def _monotonic_and_consecutive(values):
+    """Whether values never decrease, and whether each is one more than the one before
+
+    Neighbours are compared rather than subtracted, since differences of unsigned integers
+    wrap around instead of going negative.
+    """
+    previous, following = values[:-1], values[1:]
+    is_monotonic = bool((following >= previous).all())
+    return is_monotonic, is_monotonic and bool((following == previous + 1).all())
+
+def _python_value(value):
+    """Convert numpy scalars to python values, so they format and pickle like the originals
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
@@ -0,0 +1,161 @@
+import os
+import sys
+import collections
+
+import numpy as np
+import pandas as pd
+
+from . import describers as dfx_describers
+from . import sketches as dfx_sketches
+
+"""
+Profiling csv files without opening them as a dataframe
+
+profile_csv() reads a file in chunks of rows and adds each chunk to a TableSketch, one
+dfx.sketches.ColumnSketch per column, so memory use is bounded by the chunk size times the
+columns, however large the file is. The result has the statistics the column describers
+read, and the descriptions of the table and column pages built from them:
+
+    profile = profile_csv('big.csv')
+    profile.row_count
+    profile.stats['price']                  # dfx.stats.ColumnStats, with .approximate set
+    profile.summary()                       # [(col_name, description)], like the table page
+    profile.column_describers('price')      # qualified COLUMN_CLASSES, like the column page
+
+Describers are calculated on a dataframe with no rows and the file's dtypes, with a factory
+that gives them the streamed ColumnProfile instead of reading the (empty) column. Pages that
+relate columns to each other (relationships, keys, dependencies) need the rows, so they
+aren't available this way.
+
+From the command line:
+
+    python -m dfx.streaming big.csv
+"""
+
+CHUNK_ROWS = 100000
+
+def profile_csv(csv_path, chunk_rows=CHUNK_ROWS, progress=None, encoding='utf-8'):
+    """Read csv_path in chunks into a StreamedProfile
+
+    progress, if given, is called after each chunk with (rows read, bytes read), like
+    dfx.ingest.load_csv().
+    """
+    table = TableSketch()
+    with open(csv_path, 'rb') as f:
+        for chunk in pd.read_csv(f, encoding=encoding, chunksize=chunk_rows):
+            table.add(chunk)
+            if progress is not None:
+                # the parser reads ahead in blocks, so this is approximate
+                progress(table.row_count, f.tell())
+    if not table.columns:
+        # only a header
+        for col_name in pd.read_csv(csv_path, encoding=encoding, nrows=0).columns:
+            table.columns[col_name] = dfx_sketches.ColumnSketch().add(pd.Series([], dtype=object))
+    if progress is not None:
+        progress(table.row_count, os.path.getsize(csv_path))
+    return table.profile()
+
+class TableSketch(object):
+    """A ColumnSketch of each column of a table, added a chunk of rows at a time
+
+    Chunks are expected in row order, see ColumnSketch.merge().
+    """
+
+    def __init__(self):
+        self.row_count = 0
+        self.columns = collections.OrderedDict()
+
+    def add(self, chunk):
+        """Add the next rows of the table, as a dataframe
+        """
+        for col_name in chunk.columns:
+            if col_name not in self.columns:
+                self.columns[col_name] = dfx_sketches.ColumnSketch()
+            self.columns[col_name].add(chunk[col_name])
+        self.row_count += len(chunk)
+        return self
+
+    def merge(self, other):
+        """Combine the sketch of the rows after this one's into this one, returning self
+        """
+        for col_name, column in other.columns.items():
+            if col_name not in self.columns:
+                self.columns[col_name] = dfx_sketches.ColumnSketch()
+            self.columns[col_name].merge(column)
+        self.row_count += other.row_count
+        return self
+
+    def profile(self):
+        return StreamedProfile(self.row_count, collections.OrderedDict(
+            (col_name, column.stats()) for col_name, column in self.columns.items()))
+
+class StreamedProfile(object):
+    """Statistics of a table read by profile_csv(), and the describers built from them
+
+    .row_count  rows of the table
+    .stats      col_name -> dfx.stats.ColumnStats
+    .frame      a dataframe with the table's columns and dtypes, but no rows
+    """
+
+    def __init__(self, row_count, stats):
+        self.row_count = row_count
+        self.stats = stats
+        self.frame = pd.DataFrame(collections.OrderedDict(
+            (col_name, pd.Series([], dtype=_dtype(col_stats.dtype))) for col_name, col_stats in stats.items()))
+        self._factory = ProfileFactory(self)
+
+    def summary(self):
+        """(col_name, description) of each column, the descriptions of the table page
+        """
+        with self._describers():
+            return [
+                (col_name, self._factory.get_or_create(dfx_describers.ColumnSummary, self.frame, col_name).description)
+                for col_name in self.frame.columns]
+
+    def column_describers(self, col_name):
+        """The qualified COLUMN_CLASSES describers of a column, those of its column page
+        """
+        with self._describers():
+            found = [
+                self._factory.get_or_create(describer_class, self.frame, col_name)
+                for describer_class in dfx_describers.COLUMN_CLASSES]
+            return [describer for describer in found if describer.qualified]
+
+    def _describers(self):
+        """Describers read each other through their factory, so it is this profile's while
+        they are calculated
+        """
+        return dfx_describers.use_factory(self._factory)
+
+class ProfileFactory(dfx_describers.DescriberFactory):
+    """Creates describers of a StreamedProfile's .frame, giving them the streamed ColumnProfile
+    """
+
+    def __init__(self, profile):
+        self._profile = profile
+        # hash -> describer, so that each is only calculated once
+        self._describers = {}
+
+    def get_or_create(self, klass, df, *args, **kwargs):
+        instance = klass(df, *args)
+        found = self._describers.get(instance.hash)
+        if found is not None:
+            return found
+        if klass is dfx_describers.ColumnProfile:
+            col_name, = args
+            instance = klass.from_stats(df, col_name, self._profile.stats[col_name])
+        self._describers[instance.hash] = instance
+        return instance
+
+def _dtype(name):
+    try:
+        return np.dtype(name)
+    except TypeError:
+        # pandas extension dtypes, which are only read from csv files when asked for
+        return object
+
+if __name__ == '__main__':
+    profile = profile_csv(sys.argv[1])
+    print("{} rows, {} columns".format(profile.row_count, len(profile.stats)))
+    for col_name, description in profile.summary():
+        print("{}: {}".format(col_name, description))
@@ -0,0 +1,226 @@
+import os
+import pickle
+import logging
+import threading
+import collections
+
+import numpy as np
+import pandas as pd
+
+from . import columnar
+from . import fingerprint as dfx_fingerprint
+
+logger = logging.getLogger(__name__)
+
+"""
+Value indexes: the rows of each distinct value of a column
+
+Value pages look up rows by a value taken from a url, so values are keyed by str(value),
+which is what the page used to compare against every row. An index is built once per column
+with one pd.factorize() and a stable argsort of the codes:
+
+    keys        str(value) of each distinct value, including null
+    order       row positions sorted by value, in row order within each value
+    offsets     the rows of keys[k] are order[offsets[k]:offsets[k + 1]]
+
+so a lookup is a dictionary lookup and a slice, no matter how many rows the column has.
+
+For dataframes opened from a columnar dataset, the index is saved in the dataset's index
+directory, named by the column hash, and memory-mapped when it is opened again:
+
+    cars.dfx/
+        index/
+            <column hash>.order.npy
+            <column hash>.offsets.npy
+            <column hash>.keys.pickle
+
+Usage:
+    index = get_value_index(df, 'origin')
+    rows = df.iloc[index.positions('US')[:5]]
+"""
+
+INDEX_DIRECTORY = 'index'
+
+# number of indexes get_value_index() keeps open
+MAX_CACHED_INDEXES = 32
+
+# column hash -> ValueIndex, least recently used first
+_indexes = collections.OrderedDict()
+_indexes_lock = threading.Lock()
+
+class ValueIndex(object):
+    """Row positions of every distinct value of a column, see module notes
+    """
+
+    def __init__(self, keys, order, offsets):
+        self.keys = keys
+        self.order = order
+        self.offsets = offsets
+        self._key_numbers = dict((key, k) for k, key in enumerate(keys))
+
+    @classmethod
+    def build(cls, col):
+        codes, uniques = pd.factorize(col)
+        keys = [str(value) for value in uniques]
+        nulls = (codes == -1)
+        if nulls.any():
+            # nulls get the next code, keyed by how the first of them prints (e.g. 'nan')
+            keys.append(str(col.iloc[int(nulls.argmax())]))
+            codes = np.where(nulls, len(keys) - 1, codes)
+
+        # distinct values can print the same (e.g. 1 and '1'), which then share a key
+        key_codes, keys = pd.factorize(np.array(keys, dtype=object))
+        row_keys = key_codes[codes]
+        order = np.argsort(row_keys, kind='stable')
+        if len(order) < 2 ** 31:
+            order = order.astype(np.int32)
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row_keys, minlength=len(keys)), out=offsets[1:])
+        return cls(list(keys), order, offsets)
+
+    def extended(self, col, start_row):
+        """The index of col, whose first start_row rows are the ones this index was built
+        from, indexing only the rows after them
+
+        The new rows of each value go after its existing rows, so nothing is sorted again.
+        """
+        new = ValueIndex.build(col.iloc[start_row:])
+        keys = self.keys + [key for key in new.keys if key not in self._key_numbers]
+        key_numbers = dict((key, k) for k, key in enumerate(keys))
+        old_counts = np.zeros(len(keys), dtype=np.int64)
+        old_counts[:len(self.keys)] = np.diff(self.offsets)
+        new_keys = np.array([key_numbers[key] for key in new.keys], dtype=np.int64)
+        new_counts = np.zeros(len(keys), dtype=np.int64)
+        new_counts[new_keys] = np.diff(new.offsets)
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(old_counts + new_counts, out=offsets[1:])
+
+        row_count = len(self.order) + len(new.order)
+        order = np.empty(row_count, dtype=np.int32 if row_count < 2 ** 31 else np.int64)
+        # the existing rows of each value move up by the new rows of the values before it...
+        old_shifts = offsets[:len(self.keys)] - self.offsets[:-1]
+        order[np.arange(len(self.order)) + np.repeat(old_shifts, old_counts[:len(self.keys)])] = self.order
+        # ...and its new rows go after them
+        new_shifts = offsets[new_keys] + old_counts[new_keys] - new.offsets[:-1]
+        order[np.arange(len(new.order)) + np.repeat(new_shifts, np.diff(new.offsets))] = \
+            new.order.astype(order.dtype) + start_row
+        return ValueIndex(keys, order, offsets)
+
+    def positions(self, key):
+        """Row positions whose value prints as key, in row order
+        """
+        k = self._key_numbers.get(key)
+        if k is None:
+            return np.array([], dtype=np.int64)
+        return np.asarray(self.order[self.offsets[k]:self.offsets[k + 1]])
+
+    def count(self, key):
+        k = self._key_numbers.get(key)
+        if k is None:
+            return 0
+        return int(self.offsets[k + 1] - self.offsets[k])
+
+    def save(self, path):
+        """Save as files beginning with path, see module notes
+        """
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        # write under temporary names and rename, so a reader never sees a partial index
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path + '.offsets.npy', 'wb') as f:
+            np.save(f, self.offsets)
+        with open(tmp_path + '.keys.pickle', 'wb') as f:
+            pickle.dump(self.keys, f, pickle.HIGHEST_PROTOCOL)
+        with open(tmp_path + '.order.npy', 'wb') as f:
+            np.save(f, self.order)
+        # order last, since load() checks for it
+        for suffix in ['.offsets.npy', '.keys.pickle', '.order.npy']:
+            os.replace(tmp_path + suffix, path + suffix)
+
+    @classmethod
+    def load(cls, path):
+        """Returns the index saved at path, or None if there isn't one
+        """
+        if not os.path.exists(path + '.order.npy'):
+            return None
+        with open(path + '.keys.pickle', 'rb') as f:
+            keys = pickle.load(f)
+        offsets = np.load(path + '.offsets.npy')
+        order = np.load(path + '.order.npy', mmap_mode='r')
+        return cls(keys, order, offsets)
+
+    @staticmethod
+    def remove(path):
+        """Remove the index saved at path
+        """
+        for suffix in ['.order.npy', '.offsets.npy', '.keys.pickle']:
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+def get_value_index(df, col_name):
+    """The ValueIndex of a column, building it if it isn't cached or saved with the dataset
+    """
+    column_hash = dfx_fingerprint.get_fingerprint(df).column_hash(col_name)
+    with _indexes_lock:
+        index = _indexes.get(column_hash)
+        if index is not None:
+            _indexes.move_to_end(column_hash)
+            return index
+
+    path = _index_path(df, column_hash)
+    if path is not None:
+        index = ValueIndex.load(path)
+    if index is None:
+        index = ValueIndex.build(df[col_name])
+        _save(index, path)
+    _cache(column_hash, index)
+    return index
+
+def extend_value_index(previous_df, df, col_name):
+    """For df, whose first rows are previous_df's (see dfx.incremental), extend previous_df's
+    index of a column with the rest of the rows, if it has been built
+
+    Returns df's index, or None if previous_df's hasn't been built, in which case
+    get_value_index() builds df's when it is needed.
+    """
+    previous_hash = dfx_fingerprint.get_fingerprint(previous_df).column_hash(col_name)
+    column_hash = dfx_fingerprint.get_fingerprint(df).column_hash(col_name)
+    with _indexes_lock:
+        previous = _indexes.get(previous_hash)
+    previous_path = _index_path(previous_df, previous_hash)
+    if previous is None and previous_path is not None:
+        previous = ValueIndex.load(previous_path)
+    if previous is None:
+        return None
+
+    index = previous.extended(df[col_name], len(previous_df))
+    path = _index_path(df, column_hash)
+    _save(index, path)
+    if previous_path is not None and previous_path != path:
+        # the rows of previous_df are in df's index, so its own is no longer needed
+        ValueIndex.remove(previous_path)
+    _cache(column_hash, index)
+    return index
+
+def _save(index, path):
+    if path is None:
+        return
+    try:
+        index.save(path)
+    except OSError:
+        logger.exception("Could not save value index %s", path)
+
+def _cache(column_hash, index):
+    with _indexes_lock:
+        _indexes[column_hash] = index
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+
+def _index_path(df, column_hash):
+    """Where the index is saved, or None if df wasn't opened from a dataset
+    """
+    reference = columnar.get_reference(df)
+    if reference is None:
+        return None
+    return os.path.join(reference.path, INDEX_DIRECTORY, column_hash)
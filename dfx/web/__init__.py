@@ -1,13 +1,18 @@
 #!/usr/bin/env python
 import os
-import pickle
 import logging
 
-from flask import Flask, redirect, session, url_for, render_template, request, g, flash, send_from_directory, send_file, Blueprint
+from flask import Flask, redirect, url_for, render_template, request, g, flash, send_from_directory, jsonify, abort
 
 # from dfx
-from .data_blueprint import data_bp, df_pickle_path
+from .data_blueprint import data_bp, df_dataset_path, dataset_names, dataset_cache, get_store, open_dataset, DEFAULT_STORE_BACKEND
 from .annotate import annotate_bp
+from . import jobs
+from .scheduler import PrecomputeScheduler
+from .. import sampling
+from .. import sketches
+from .. import incremental
+from .. import describers
 
 # #################################################################
 # App setup
@@ -17,6 +22,36 @@ app.secret_key = '1>k\x07\xf7\xe6\xeflO\x9e\x80\x9c\xc7qp\xef\xed2\xfc9$\x10\xbb
 app.register_blueprint(data_bp)
 app.register_blueprint(annotate_bp)
 
+# describer store backend, 'sqlite' or 'shelve' (see dfx.datastore.DfxStore)
+app.config['DFX_STORE_BACKEND'] = os.environ.get('DFX_STORE_BACKEND', DEFAULT_STORE_BACKEND)
+# memory budget, in bytes, for datasets kept open between requests
+app.config['DFX_DF_CACHE_BYTES'] = int(os.environ.get('DFX_DF_CACHE_BYTES', 2 * 1024 ** 3))
+# processes used to parse large csv files
+app.config['DFX_LOAD_WORKERS'] = int(os.environ.get('DFX_LOAD_WORKERS', os.cpu_count() or 1))
+# processes used to calculate the describers of a page that isn't saved yet (1 to not use a pool)
+app.config['DFX_WORKERS'] = int(os.environ.get('DFX_WORKERS', os.cpu_count() or 1))
+# calculate pages in the background after datasets are loaded (see dfx.web.scheduler)
+app.config['DFX_PRECOMPUTE'] = os.environ.get('DFX_PRECOMPUTE', '1') == '1'
+# processes used by the background calculation, leaving the rest for requests
+app.config['DFX_PRECOMPUTE_WORKERS'] = int(os.environ.get('DFX_PRECOMPUTE_WORKERS', 1))
+# show pages that aren't calculated yet right away, filling them in as the precompute scheduler
+# calculates their describers (see data_blueprint.get_page())
+app.config['DFX_PROGRESSIVE'] = os.environ.get('DFX_PROGRESSIVE', '1') == '1'
+# seconds a page spends calculating before listing the rest of its work as skipped (see
+# describers.PAGE_TIME_BUDGET), or 0 for no limit
+app.config['DFX_PAGE_TIME_BUDGET'] = float(os.environ.get('DFX_PAGE_TIME_BUDGET', 10)) or None
+# datasets with more rows than this show approximate results from samples first (see
+# dfx.sampling), or 0 to always calculate on all rows
+app.config['DFX_SAMPLING_THRESHOLD'] = int(os.environ.get('DFX_SAMPLING_THRESHOLD', sampling.SAMPLING_THRESHOLD))
+# datasets with more rows than this estimate distinct counts and top values with sketches
+# instead of exact hash tables (see dfx.sketches), or 0 to only sketch DFX_SKETCH_DATASETS
+app.config['DFX_SKETCH_THRESHOLD'] = int(os.environ.get('DFX_SKETCH_THRESHOLD', sketches.SKETCH_THRESHOLD))
+# comma separated names of datasets that are always sketched
+app.config['DFX_SKETCH_DATASETS'] = [name for name in os.environ.get('DFX_SKETCH_DATASETS', '').split(',') if name]
+# when a file is loaded again as the same dataset with only records added to its end, read
+# just the new records and update the saved describers from them (see dfx.incremental)
+app.config['DFX_APPEND_LOADS'] = os.environ.get('DFX_APPEND_LOADS', '1') == '1'
+
 # #################################################################
 # helpers
 
@@ -26,7 +61,7 @@ def instance_path(rel_path=''):
     return os.path.join(os.getcwd(), '.dfx_data', rel_path)
 
 def setup_instance():
-    for dir in [instance_path(), instance_path('df')]:        
+    for dir in [instance_path(), instance_path('df'), instance_path('images')]:
         if not os.path.exists(dir):
             os.makedirs(dir)
 
@@ -51,13 +86,59 @@ def setup_logging():
 
 setup_logging()
 
+# #################################################################
+# background precompute
+
+def _precompute_open_dataset(data_alias):
+    with app.app_context():
+        return open_dataset(data_alias)
+
+def _precompute_open_store():
+    with app.app_context():
+        return get_store()
+
+def setup_precompute():
+    """Create the scheduler, unless precompute is turned off
+
+    dbm files don't support a writer besides the request threads, so the shelve backend
+    doesn't precompute.
+    """
+    if not app.config['DFX_PRECOMPUTE'] or app.config['DFX_STORE_BACKEND'] == 'shelve':
+        return
+    app.extensions['dfx_precompute'] = PrecomputeScheduler(
+        _precompute_open_dataset, _precompute_open_store, workers=app.config['DFX_PRECOMPUTE_WORKERS'],
+        image_base_path=instance_path('images'))
+
+setup_precompute()
+
+# datasets loaded before the server started are queued on the first request
+_existing_datasets_scheduled = False
+
+@app.before_request
+def schedule_existing_datasets():
+    global _existing_datasets_scheduled
+    scheduler = app.extensions.get('dfx_precompute')
+    if scheduler is None or _existing_datasets_scheduled:
+        return
+    _existing_datasets_scheduled = True
+    for data_name in dataset_names():
+        scheduler.schedule(data_name)
+
+@app.route('/precompute/status')
+def precompute_status():
+    scheduler = app.extensions.get('dfx_precompute')
+    if scheduler is None:
+        return jsonify({'enabled': False})
+    status = scheduler.status()
+    status['enabled'] = True
+    return jsonify(status)
+
 # ########################################################################
 # Main pages
 
 @app.route('/')
 def home():
-    candidate_files = os.listdir(instance_path('df'))
-    data_names = [_[:-len('.pickle')] for _ in candidate_files if _.endswith('.pickle')]
+    data_names = dataset_names()
     files = build_file_links('')
 
     # build commands
@@ -85,8 +166,9 @@ def data_sets():
 
 @app.route('/reload')
 def reload():
-    db = get_db()
+    db = get_store()
     db.delete_all()
+    describers.remove_unused_images(db, instance_path('images'))
     return redirect(url_for('home'))
 
 # ########################################################################
@@ -149,20 +231,65 @@ def load_file():
     data_alias = data['data_alias']
     logger.info('load_file() {} as {}'.format(data_path, data_alias))
 
-    # import data and save pickle
-    import pandas as pd
-    df = pd.read_csv(data_path, encoding='utf-8')
-    df_path = df_pickle_path(data_alias)
-    df.to_pickle(df_path)
+    if not os.path.isfile(data_path):
+        flash("File does not exist: {}".format(data_path))
+        return redirect(url_for('file_navigate'))
 
-    return redirect(url_for('data.summary', data_name = data_alias))
+    # import data in the background, saving it as a columnar dataset
+    def on_done(job):
+        dataset_cache.invalidate(job.dataset_path)
+        if job.previous_df is not None:
+            with app.app_context():
+                df = open_dataset(job.data_alias)
+                sketches.set_sketched(job.previous_df, sketches.is_sketched(df))
+                incremental.update_describers(get_store(), job.previous_df, df)
+            job.previous_df = None
+        scheduler = app.extensions.get('dfx_precompute')
+        if scheduler is not None:
+            scheduler.schedule(job.data_alias)
+    job = jobs.start_load_job(data_path, df_dataset_path(data_alias), data_alias, on_done=on_done,
+        workers=app.config['DFX_LOAD_WORKERS'], append=app.config['DFX_APPEND_LOADS'])
+
+    return redirect(url_for('load_progress', job_id = job.id))
+
+@app.route('/load/<job_id>')
+def load_progress(job_id):
+    """Page that polls load_status() until the load finishes, then opens the summary
+    """
+    job = jobs.get_job(job_id)
+    if job is None:
+        abort(404)
+    return render_template('load_progress.html', job = job)
+
+@app.route('/load/<job_id>/status')
+def load_status(job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        abort(404)
+    status = job.to_dict()
+    status['summary_url'] = url_for('data.summary', data_name = job.data_alias)
+    return jsonify(status)
 
 # ########################################################################
 # Image serving
 
+# seconds browsers may keep images, which never change since they are named by their content
+# (see describers.propose_image_path())
+IMAGE_MAX_AGE = 365 * 24 * 60 * 60
+
 @app.route('/images/<path:path>')
 def serve_image(path):
-    return send_from_directory(instance_path('images'), path)
+    response = send_from_directory(instance_path('images'), path, max_age=IMAGE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/images/collect', methods=['POST'])
+def collect_images():
+    """Remove images no saved describer refers to (see describers.remove_unused_images())
+    """
+    removed = describers.remove_unused_images(get_store(), instance_path('images'))
+    return jsonify(removed=len(removed))
 
 
 
@@ -1,10 +1,18 @@
 import os
+import time
+import shutil
+import contextlib
 
 import pandas as pd
-from flask import Blueprint, g, url_for, render_template, request, flash, redirect
+from flask import Blueprint, g, url_for, render_template, request, flash, redirect, current_app, jsonify, abort
 
+from .. import html as dfx_html
 from .. import datastore
 from .. import describers
+from .. import columnar
+from .. import parallel
+from .. import sketches
+from .df_cache import DataFrameCache
 
 
 # #################################################################################
@@ -12,19 +20,25 @@ from .. import describers
 
 data_bp = Blueprint('data', '__name__', url_prefix='/data/<data_name>')
 
+# opened datasets, shared by all requests in this process (see DFX_DF_CACHE_BYTES)
+dataset_cache = DataFrameCache(max_bytes=2 * 1024 ** 3)
+
+# describer store backend unless DFX_STORE_BACKEND names another
+DEFAULT_STORE_BACKEND = 'sqlite'
+
 @data_bp.url_value_preprocessor
 def populate_data_df(endpoint, values):
 
     # dataframe
     g._data_name = values.pop('data_name')
-    import pandas as pd
-    g.df = pd.read_pickle(df_pickle_path(g._data_name))
+    if endpoint == 'data.relationship_page':
+        # its describers only read the two columns, so the others aren't opened
+        g.df = open_dataset(g._data_name, columns=[values['col_1_name'], values['col_2_name']])
+    else:
+        g.df = open_dataset(g._data_name)
 
     # data store
-    file_path = instance_path('dfx-web-store')
-    g.db = datastore.DfxStore(file_path)
-    # set it as the factory for all describers
-    describers.factory = g.db
+    g.db = get_store()
 
     # if refresh in URL params, put the db in force_create mode
     if ('refresh' in request.args):
@@ -33,9 +47,84 @@ def populate_data_df(endpoint, values):
     # tell describer which folder to save images in
     describers._IMAGE_BASE_PATH = instance_path('images')
 
+    # describers get the describers they read from the store, and pages may take the time
+    # budget unless ?complete asks for everything; both only for this request's thread, since
+    # other requests are handled at the same time (see reset_describer_context())
+    budget = None if 'complete' in request.args else current_app.config.get('DFX_PAGE_TIME_BUDGET')
+    g._describer_context = contextlib.ExitStack()
+    g._describer_context.enter_context(describers.use_factory(g.db))
+    g._describer_context.enter_context(describers.use_page_time_budget(budget))
+
+    # precompute what the user is looking at first (fragments are polled from a page already open)
+    scheduler = current_app.extensions.get('dfx_precompute')
+    if scheduler is not None and endpoint != 'data.fragments':
+        scheduler.prioritize(g._data_name, values.get('col_name', values.get('col_1_name')))
+
+@data_bp.teardown_request
+def reset_describer_context(exception):
+    context = g.pop('_describer_context', None)
+    if context is not None:
+        context.close()
+
+def get_store():
+    """Create a DfxStore using the backend named by the DFX_STORE_BACKEND config
+    """
+    backend = current_app.config.get('DFX_STORE_BACKEND', DEFAULT_STORE_BACKEND)
+    if backend == 'shelve':
+        # same file name as before backends were configurable, to keep existing stores
+        file_path = instance_path('dfx-web-store')
+    else:
+        file_path = instance_path('dfx-web-store.{}'.format(backend))
+    return datastore.DfxStore(file_path, backend=backend)
+
+def open_dataset(data_alias, columns=None):
+    """Open a dataset, memory-mapping its columns (see dfx.columnar)
+
+    columns limits the dataframe to those columns. Text columns are decoded as they are
+    opened, so for a large dataset that is much quicker than opening all of them, though
+    the dataframe isn't kept in dataset_cache.
+
+    Datasets loaded before columnar storage was added are pickles, which are converted
+    the first time they are opened.
+    """
+    dataset_path = df_dataset_path(data_alias)
+    if not columnar.is_dataset(dataset_path):
+        pickle_path = df_pickle_path(data_alias)
+        if not os.path.exists(pickle_path):
+            raise ValueError("No dataset", data_alias)
+        columnar.write_frame(pd.read_pickle(pickle_path), dataset_path)
+        os.remove(pickle_path)
+    if columns is not None:
+        df = columnar.open_frame(dataset_path, columns=columns)
+    else:
+        dataset_cache.max_bytes = current_app.config.get('DFX_DF_CACHE_BYTES', dataset_cache.max_bytes)
+        df = dataset_cache.get(dataset_path, columnar.open_frame)
+
+    # sketched if chosen for the dataset, or if it is large (see DFX_SKETCH_THRESHOLD)
+    threshold = current_app.config.get('DFX_SKETCH_THRESHOLD', sketches.SKETCH_THRESHOLD)
+    sketched = data_alias in current_app.config.get('DFX_SKETCH_DATASETS', ()) or bool(threshold and len(df) > threshold)
+    sketches.set_sketched(df, sketched)
+    return df
+
+def df_dataset_path(data_alias, sub_directory=""):
+    return os.path.join(os.getcwd(), '.dfx_data', 'df', sub_directory, "{}.dfx".format(data_alias))
+
 def df_pickle_path(data_alias, sub_directory=""):
+    """Path of datasets saved before columnar storage, see open_dataset()
+    """
     return os.path.join(os.getcwd(), '.dfx_data', 'df', sub_directory, "{}.pickle".format(data_alias))
 
+def dataset_names():
+    """Names of all loaded datasets
+    """
+    names = set()
+    for file_name in os.listdir(instance_path('df')):
+        if file_name.endswith('.dfx') and columnar.is_dataset(instance_path(os.path.join('df', file_name))):
+            names.add(file_name[:-len('.dfx')])
+        elif file_name.endswith('.pickle'):
+            names.add(file_name[:-len('.pickle')])
+    return sorted(names)
+
 def instance_path(rel_path):
     """Append rel_path to the application's instance folder
     """
@@ -64,14 +153,14 @@ def url_for_data(data_method_name, **kwargs):
 #         describers.factory = db
 #     return db
 
-def get_commands(df):
-    """Generate the command list for the jQuery autocomplete
+def get_commands(columns):
+    """Generate the command list for the jQuery autocomplete, from the dataset's column names
     """
     commands = []
     commands.extend( [{'label': 'summary', 'value': url_for_data('summary')}] )
-    commands.extend( [{'label': 'column {}'.format(col), 'value': url_for_data('column_page', col_name=col)} for col in df.columns] )
-    # for col_1 in df.columns:
-    #     for col_2 in df.columns:
+    commands.extend( [{'label': 'column {}'.format(col), 'value': url_for_data('column_page', col_name=col)} for col in columns] )
+    # for col_1 in columns:
+    #     for col_2 in columns:
     #         if col_1 == col_2:
     #             pass
     #         commands.append( {
@@ -80,6 +169,77 @@ def get_commands(df):
     commands.extend( [{'label': 'reload', 'value': '/reload'}] )
     return commands
 
+def calculate_page_describers(page_class, *args):
+    """If a page isn't saved yet, calculate the describers it reads in worker processes first
+
+    See dfx.parallel and DFX_WORKERS. With ?refresh, the page recalculates everything itself.
+    The workers and the page share the page's time budget (see DFX_PAGE_TIME_BUDGET).
+    """
+    workers = current_app.config.get('DFX_WORKERS', 1)
+    if workers < 2 or g.db._force_create:
+        return
+    if g.db.has(page_class(g.df, *args).hash):
+        return
+    budget = describers.get_page_time_budget()
+    deadline = None if budget is None else time.time() + budget
+    parallel.calculate_describers(g.db, g.df, page_class.required_describers(g.df, *args), workers=workers, deadline=deadline,
+        image_base_path=instance_path('images'))
+    if deadline is not None:
+        # the rest of the budget is the page's, for the rest of this request
+        g._describer_context.enter_context(describers.use_page_time_budget(max(0, deadline - time.time())))
+
+def get_page(page_class, *args):
+    """The page describer for a view
+
+    A page that isn't saved yet is built right away from the describers that are, and the
+    precompute scheduler calculates it ahead of everything else (see build_partial_page()):
+
+        - for datasets with more rows than DFX_SAMPLING_THRESHOLD, the rest are calculated
+          on samples and marked approximate (see describers.SamplingFactory)
+        - otherwise in progressive mode (DFX_PROGRESSIVE, with the scheduler running), the
+          rest are placeholders (see describers.DeferringFactory)
+
+    deferred.js replaces approximate results and placeholders from fragments() as they are
+    calculated. Otherwise, or with ?refresh or ?complete, the page is calculated before it
+    is returned, see calculate_page_describers().
+    """
+    scheduler = current_app.extensions.get('dfx_precompute')
+    if not g.db._force_create and 'complete' not in request.args and not g.db.has(page_class(g.df, *args).hash):
+        threshold = current_app.config.get('DFX_SAMPLING_THRESHOLD')
+        if threshold and len(g.df) > threshold:
+            flash("Approximate results, from samples of the {:,} rows, are replaced as exact ones are calculated".format(len(g.df)))
+            return build_partial_page(describers.SamplingFactory(g.db, threshold), page_class, *args)
+        if current_app.config.get('DFX_PROGRESSIVE', False) and scheduler is not None:
+            return build_partial_page(describers.DeferringFactory(g.db), page_class, *args)
+
+    calculate_page_describers(page_class, *args)
+    page = g.db.get_or_create(page_class, g.df, *args)
+    # a page that skipped describers to stay within DFX_PAGE_TIME_BUDGET isn't saved, so
+    # calculate the rest in the background for next time
+    if not page._complete and scheduler is not None:
+        scheduler.request(g._data_name, page_class, args)
+    return page
+
+def build_partial_page(factory, page_class, *args):
+    """Build a page from the describers factory gives it (a DeferringFactory), without
+    calculating the ones it defers
+
+    The page is only saved if nothing was deferred. Otherwise the precompute scheduler, if
+    it is running, calculates the whole page.
+    """
+    # only this request's describers get the factory's placeholders
+    with describers.use_factory(factory), g.db.batch():
+        page = page_class(g.df, *args)
+        page._ensure_calculated()
+    if not factory.deferred and page._complete:
+        # everything it reads was saved, so the page is complete
+        g.db.save(page.hash, page)
+    else:
+        scheduler = current_app.extensions.get('dfx_precompute')
+        if scheduler is not None:
+            scheduler.request(g._data_name, page_class, args)
+    return page
+
 def set_describer_url_prefix(describer):
     """Set the url prefix to the paths used by data_blueprint
     """
@@ -94,9 +254,9 @@ def set_describer_url_prefix(describer):
 def summary():
     # db = get_db()
     # df = get_df()
-    describer = g.db.get_or_create(describers.TablePageDescriber, g.df)
+    describer = get_page(describers.TablePageDescriber)
     set_describer_url_prefix(describer)
-    g.commands = get_commands(g.df)
+    g.commands = get_commands(g.df.columns)
     return render_template('table.html',
         describer = describer,
         )
@@ -130,9 +290,9 @@ def column_page(col_name):
         next_col_hyperlink = next_col_hyperlink,
         )
 
-    describer = g.db.get_or_create(describers.ColumnPageDescriber, g.df, col_name)
+    describer = get_page(describers.ColumnPageDescriber, col_name)
     set_describer_url_prefix(describer)
-    g.commands = get_commands(df)
+    g.commands = get_commands(df.columns)
 
     return render_template('column.html', 
         #col_index=col_index, 
@@ -145,7 +305,7 @@ def column_page(col_name):
 def row_page(row_num):    
     describer = g.db.get_or_create(describers.RowPageDescriber, g.df, row_num)
     set_describer_url_prefix(describer)
-    g.commands = get_commands(g.df)
+    g.commands = get_commands(g.df.columns)
 
     return render_template('row.html', 
         describer = describer,
@@ -181,38 +341,79 @@ def column_modify():
 
 @data_bp.route('/column/<string:col_1_name>/relates-to/<string:col_2_name>')
 def relationship_page(col_1_name, col_2_name):
-    g.commands = get_commands(g.df)
-    describer = g.db.get_or_create(describers.RelationshipPageDescriber, g.df, col_1_name, col_2_name)
+    # g.df only has the two columns, see populate_data_df()
+    schema = columnar.read_schema(df_dataset_path(g._data_name))
+    g.commands = get_commands([col_schema['name'] for col_schema in schema['columns']])
+    describer = get_page(describers.RelationshipPageDescriber, col_1_name, col_2_name)
     set_describer_url_prefix(describer)
     return render_template('relationship.html', describer = describer)
 
 @data_bp.route('/column/<string:col_name>/values/<string:val>')
 def value_page(col_name, val):
-    g.commands = get_commands(g.df)
+    g.commands = get_commands(g.df.columns)
     describer = g.db.get_or_create(describers.ValuePageDescriber, g.df, col_name, val)
     set_describer_url_prefix(describer)
     return render_template('value.html', describer = describer)
 
+@data_bp.route('/fragments', methods=['POST'])
+def fragments():
+    """Describers for the placeholders of a progressive page, see get_page() and deferred.js
+
+    Takes {"describers": [[class name, args, "description" or "html"], ...]} and returns
+    {"fragments": [...]}, with {"qualified": ..., "html": ...} for each describer that has
+    been calculated, and null for each that hasn't yet.
+    """
+    scheduler = current_app.extensions.get('dfx_precompute')
+    # with nothing queued for the dataset (e.g. its task failed), calculate them here rather than wait
+    calculate = scheduler is None or not scheduler.is_busy(g._data_name)
+    results = []
+    with g.db.batch():
+        for class_name, args, field in request.get_json()['describers']:
+            describer_class = describers.FRAGMENT_CLASSES.get(class_name)
+            if describer_class is None or field not in ('description', 'html'):
+                abort(400)
+            if not calculate and not g.db.has(describer_class(g.df, *args).hash):
+                results.append(None)
+                continue
+            describer = g.db.get_or_create(describer_class, g.df, *args)
+            set_describer_url_prefix(describer)
+            text = getattr(describer, field).replace(dfx_html._URL_PREFIX, describer._url_prefix)
+            results.append({'qualified': describer.qualified, 'html': text})
+    return jsonify(fragments=results)
+
 @data_bp.route('/rename', methods=['POST'])
 def rename():
-    """Rename a dataset picke file
+    """Rename a dataset directory
     """
     old_name = g._data_name
-    old_path = df_pickle_path(old_name)
+    old_path = df_dataset_path(old_name)
     new_name = request.form['new_data_alias']
-    new_path = df_pickle_path(new_name)
+    new_path = df_dataset_path(new_name)
     os.rename(old_path, new_path)
+    dataset_cache.invalidate(old_path)
+    scheduler = current_app.extensions.get('dfx_precompute')
+    if scheduler is not None:
+        scheduler.cancel(old_name)
+        scheduler.schedule(new_name)
     flash('Renamed data from {} to {}'.format(old_name, new_name))
     g._data_name = new_name
     return redirect(url_for_data('summary'))
 
 @data_bp.route('/delete', methods=['POST'])
 def delete():
-    """Move a dataset pickle file to instance/df/recycle
+    """Move a dataset directory to instance/df/recycle
     """
-    old_path = df_pickle_path(g._data_name)
-    new_path = df_pickle_path(g._data_name, sub_directory="recycle")
+    old_path = df_dataset_path(g._data_name)
+    new_path = df_dataset_path(g._data_name, sub_directory="recycle")
+    if not os.path.exists(os.path.dirname(new_path)):
+        os.makedirs(os.path.dirname(new_path))
+    if os.path.exists(new_path):
+        shutil.rmtree(new_path)
     os.rename(old_path, new_path)
+    dataset_cache.invalidate(old_path)
+    scheduler = current_app.extensions.get('dfx_precompute')
+    if scheduler is not None:
+        scheduler.cancel(g._data_name)
     flash('Moved data {} to recyling bin'.format(g._data_name))
     return redirect(url_for('home'))
 
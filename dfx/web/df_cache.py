@@ -0,0 +1,108 @@
+import os
+import logging
+import threading
+import collections
+
+import numpy as np
+
+from .. import columnar
+
+logger = logging.getLogger(__name__)
+
+class DataFrameCache(object):
+    """Keeps recently used dataframes in memory, so each request doesn't re-open its dataset
+
+    Entries are keyed by the dataset's path, modification time and size, so a dataset that
+    is re-loaded gets a new entry, and the old one ages out. When the dataframes in the
+    cache add up to more than max_bytes, the least recently used ones are evicted. The most
+    recent dataframe is always kept, even if it is larger than max_bytes on its own.
+    Memory-mapped columns (see dfx.columnar) don't count, since the operating system pages
+    them in and out as needed.
+
+    Usage:
+        cache = DataFrameCache(max_bytes=2 * 1024 ** 3)
+        df = cache.get('data/cars.dfx', columnar.open_frame)
+        cache.invalidate('data/cars.dfx')
+
+    Cached dataframes are shared by every request, so they must not be modified.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        # (path, mtime, size) -> (df, bytes), least recently used first
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, loader):
+        """Return the dataframe for path, calling loader(path) if it isn't cached
+        """
+        key = _file_key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        # load outside the lock, so other datasets can be served meanwhile
+        df = loader(path)
+        nbytes = _memory_bytes(df)
+        logger.debug("caching %s (%s bytes)", path, nbytes)
+        with self._lock:
+            self._discard(key[0])
+            self._entries[key] = (df, nbytes)
+            self._evict()
+        return df
+
+    def invalidate(self, path):
+        """Drop every cached version of path, e.g. after it is renamed or deleted
+        """
+        with self._lock:
+            self._discard(os.path.abspath(path))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def nbytes(self):
+        return sum(nbytes for df, nbytes in self._entries.values())
+
+    def _discard(self, abs_path):
+        for key in [key for key in self._entries if key[0] == abs_path]:
+            del self._entries[key]
+
+    def _evict(self):
+        total = self.nbytes
+        while total > self.max_bytes and len(self._entries) > 1:
+            key, (df, nbytes) = self._entries.popitem(last=False)
+            logger.debug("evicting %s (%s bytes)", key[0], nbytes)
+            total -= nbytes
+
+def _memory_bytes(df):
+    """Bytes of memory df holds, counting the values of object columns but not memory-mapped
+    columns
+    """
+    nbytes = df.index.memory_usage(deep=True)
+    for i in range(len(df.columns)):
+        col = df.iloc[:, i]
+        if not _is_memmapped(col.values):
+            nbytes += col.memory_usage(index=False, deep=True)
+    return int(nbytes)
+
+def _is_memmapped(values):
+    while isinstance(values, np.ndarray):
+        if isinstance(values, np.memmap):
+            return True
+        values = values.base
+    return False
+
+def _file_key(path):
+    """Identify a version of a dataset by path, modification time and size
+
+    For a columnar dataset, that's its schema, which is rewritten whenever the dataset is.
+    """
+    stat_path = path
+    if os.path.isdir(path):
+        stat_path = os.path.join(path, columnar.SCHEMA_FILE)
+    stat = os.stat(stat_path)
+    return (os.path.abspath(path), stat.st_mtime, stat.st_size)
@@ -0,0 +1,129 @@
+import os
+import time
+import uuid
+import logging
+import threading
+
+from .. import ingest
+from .. import columnar
+
+logger = logging.getLogger(__name__)
+
+"""
+Background jobs for the web app
+
+Loading a large csv can take minutes, so load_file() starts a LoadJob on a background
+thread and returns right away. The browser polls the job's status until it finishes,
+while the server keeps handling requests for other datasets.
+
+With append, a file loaded into a dataset before, with records added to its end since, only
+has the new records read and appended (see dfx.ingest.append_csv()), unless they have
+text in a column that had none, in which case the whole file is loaded. The job keeps the
+dataframe from before as .previous_df, for on_done to update describers from with
+dfx.incremental.
+"""
+
+# job id -> job, for every job started by this process
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+class LoadJob(object):
+    """Loads a csv into a dataset on a background thread, tracking progress
+    """
+
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, data_path, dataset_path, data_alias, on_done=None, workers=1, append=False):
+        self.id = uuid.uuid4().hex
+        self.data_path = data_path
+        self.dataset_path = dataset_path
+        self.data_alias = data_alias
+        self._on_done = on_done
+        self._workers = workers
+        self._append = append
+        # whether rows were appended, and the dataset before them until on_done is called
+        self.appended = False
+        self.previous_df = None
+
+        self.status = self.RUNNING
+        self.error = None
+        self.rows = 0
+        self.bytes = 0
+        self.total_bytes = os.path.getsize(data_path)
+        self.started = time.time()
+        self.finished = None
+
+        self._thread = threading.Thread(target=self._run, name='load-{}'.format(data_alias))
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def _progress(self, rows, bytes_read):
+        self.rows = rows
+        self.bytes = bytes_read
+
+    def _run(self):
+        logger.info('LoadJob {} started: {} as {}'.format(self.id, self.data_path, self.data_alias))
+        try:
+            self._load()
+            if self._on_done is not None:
+                self._on_done(self)
+            self.status = self.DONE
+        except Exception as e:
+            logger.exception('LoadJob {} failed'.format(self.id))
+            self.error = str(e)
+            self.status = self.FAILED
+        self.finished = time.time()
+        logger.info('LoadJob {} {} after {:.1f}s'.format(self.id, self.status, self.finished - self.started))
+
+    def _load(self):
+        if self._append and columnar.is_dataset(self.dataset_path):
+            # opened before the append, so it keeps the rows it had
+            previous_df = columnar.open_frame(self.dataset_path)
+            start_row = ingest.append_csv(self.data_path, self.dataset_path, progress=self._progress)
+            if start_row is not None:
+                self.appended = True
+                # describers are only updated if the file had new rows
+                if columnar.read_schema(self.dataset_path)['row_count'] > start_row:
+                    self.previous_df = previous_df
+                return
+            del previous_df
+        # starting worker processes only pays off for files with several parts
+        if self._workers > 1 and self.total_bytes >= 2 * ingest.PART_BYTES:
+            ingest.load_csv_parallel(self.data_path, self.dataset_path, workers=self._workers, progress=self._progress)
+        else:
+            ingest.load_csv(self.data_path, self.dataset_path, progress=self._progress)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'data_alias': self.data_alias,
+            'status': self.status,
+            'error': self.error,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'total_bytes': self.total_bytes,
+            'elapsed': (self.finished or time.time()) - self.started,
+            'appended': self.appended,
+            }
+
+def start_load_job(data_path, dataset_path, data_alias, on_done=None, workers=1, append=False):
+    """Start loading data_path, or return the job already loading the same dataset
+    """
+    with _jobs_lock:
+        for job in _jobs.values():
+            if job.dataset_path == dataset_path and job.status == LoadJob.RUNNING:
+                return job
+        job = LoadJob(data_path, dataset_path, data_alias, on_done=on_done, workers=workers, append=append)
+        _jobs[job.id] = job
+    job.start()
+    return job
+
+def get_job(job_id):
+    """Returns the job, or None if no job has that id
+    """
+    with _jobs_lock:
+        return _jobs.get(job_id)
@@ -0,0 +1,282 @@
+import time
+import heapq
+import logging
+import itertools
+import threading
+
+from .. import parallel
+from .. import describers
+
+logger = logging.getLogger(__name__)
+
+"""
+Background precomputing of pages
+
+Nothing is calculated until a page is opened, so the first visit to each page is slow. The
+PrecomputeScheduler calculates pages in the background after a dataset is loaded (and, for
+datasets loaded earlier, once the server handles its first request), so they are already in
+the store when they are opened:
+
+    TABLE           the table page, which finds the relationships between columns
+    COLUMN          every column page, in column order
+    RELATIONSHIP    relationship pages for the pairs the table page lists, up to
+                    MAX_RELATIONSHIP_PAGES per dataset
+
+Column and relationship pages are queued once the dataset's table page is done. Opening a
+page moves the dataset's work ahead of other datasets, and the work for the column opened
+(its column page and its relationships) ahead of that. A page shown with placeholders (see
+data_blueprint.get_page()) is requested, which puts it ahead of everything else.
+
+Pages are calculated by dfx.parallel in a pool of worker processes, so they don't hold the
+GIL the request threads need. The scheduler's thread only opens datasets and saves results.
+
+Usage:
+    scheduler = PrecomputeScheduler(open_dataset, open_store, workers=1, image_base_path='instance/images')
+    scheduler.schedule('cars')
+    scheduler.prioritize('cars', 'mpg')
+    scheduler.request('cars', ColumnPageDescriber, ('mpg',))
+    scheduler.status()      # {'queued': 12, 'done': 30, ...}
+"""
+
+# relationship pages queued per dataset, in the order the table page lists them
+MAX_RELATIONSHIP_PAGES = 500
+
+# task kinds, in the order they are calculated
+TABLE = 0
+COLUMN = 1
+RELATIONSHIP = 2
+
+_KIND_PAGES = {
+    TABLE: describers.TablePageDescriber,
+    COLUMN: describers.ColumnPageDescriber,
+    RELATIONSHIP: describers.RelationshipPageDescriber,
+    }
+
+# boosts, which come before the kind in a task's priority
+REQUESTED = 0   # a page the user is waiting for, see PrecomputeScheduler.request()
+FOCUS = 1       # the column the user last opened
+DATASET = 2     # the dataset the user last opened
+DEFAULT = 3
+
+class PrecomputeTask(object):
+    """A page to calculate, see PrecomputeScheduler
+    """
+
+    def __init__(self, data_alias, kind, args, order):
+        self.data_alias = data_alias
+        self.kind = kind
+        self.args = args
+        # position among tasks of the same kind, e.g. the column's position
+        self.order = order
+        self.requested = False
+        self.priority = None
+
+    @property
+    def key(self):
+        return (self.data_alias, self.kind, self.args)
+
+    @property
+    def page_class(self):
+        return _KIND_PAGES[self.kind]
+
+    def __str__(self):
+        return "{}: {}({})".format(self.data_alias, self.page_class.__name__, ", ".join(str(arg) for arg in self.args))
+
+class PrecomputeScheduler(object):
+    """Calculates pages in the background, see module notes
+
+    open_dataset(data_alias) returns the dataset's dataframe, and open_store() a DfxStore.
+    Both are called from the scheduler's thread. Plots are saved in image_base_path (see
+    dfx.parallel.calculate_describers()).
+    """
+
+    def __init__(self, open_dataset, open_store, workers=1, max_relationship_pages=MAX_RELATIONSHIP_PAGES, image_base_path=None):
+        self._open_dataset = open_dataset
+        self._open_store = open_store
+        self._workers = workers
+        self._image_base_path = image_base_path
+        self._max_relationship_pages = max_relationship_pages
+
+        # heap of (priority, sequence, task), with stale entries left in until popped
+        self._heap = []
+        self._sequence = itertools.count()
+        # key -> task, for queued tasks
+        self._tasks = {}
+        # (data alias, column name) the user last opened
+        self._focus = (None, None)
+        self._condition = threading.Condition()
+
+        self._running = None
+        self._started = time.time()
+        # data alias -> {'done': n, 'failed': n}
+        self._finished = {}
+        self._thread = None
+        self._executor = None
+
+    def schedule(self, data_alias):
+        """Queue the pages of a dataset, replacing any queued for it before (e.g. when it is
+        loaded again)
+        """
+        self.cancel(data_alias)
+        with self._condition:
+            self._finished[data_alias] = {'done': 0, 'failed': 0}
+            self._add(PrecomputeTask(data_alias, TABLE, (), 0))
+            self._start()
+
+    def cancel(self, data_alias):
+        """Drop the queued pages of a dataset, e.g. when it is deleted
+        """
+        with self._condition:
+            for key in [key for key in self._tasks if key[0] == data_alias]:
+                del self._tasks[key]
+            self._finished.pop(data_alias, None)
+
+    def prioritize(self, data_alias, col_name=None):
+        """Move the work for a dataset, and for one of its columns, ahead of other work
+        """
+        with self._condition:
+            self._focus = (data_alias, col_name)
+            for task in self._tasks.values():
+                priority = self._priority(task)
+                if priority != task.priority:
+                    task.priority = priority
+                    heapq.heappush(self._heap, (priority, next(self._sequence), task))
+
+    def request(self, data_alias, page_class, args):
+        """Queue a page the user is waiting for, ahead of all other work
+        """
+        kind = [kind for kind, kind_page_class in _KIND_PAGES.items() if kind_page_class is page_class][0]
+        with self._condition:
+            task = self._tasks.get((data_alias, kind, tuple(args)))
+            if task is None:
+                task = PrecomputeTask(data_alias, kind, tuple(args), 0)
+                task.requested = True
+                self._add(task)
+            elif not task.requested:
+                task.requested = True
+                task.priority = self._priority(task)
+                heapq.heappush(self._heap, (task.priority, next(self._sequence), task))
+            self._start()
+
+    def is_busy(self, data_alias):
+        """Whether pages of a dataset are queued or being calculated
+        """
+        with self._condition:
+            if self._running is not None and self._running.data_alias == data_alias:
+                return True
+            return any(key[0] == data_alias for key in self._tasks)
+
+    def status(self):
+        """Queue depth and progress, as a json serializable dictionary
+        """
+        with self._condition:
+            datasets = dict(
+                (data_alias, dict(finished, queued=0))
+                for data_alias, finished in self._finished.items())
+            for task in self._tasks.values():
+                datasets.setdefault(task.data_alias, {'done': 0, 'failed': 0, 'queued': 0})['queued'] += 1
+            return {
+                'queued': len(self._tasks),
+                'running': str(self._running) if self._running is not None else None,
+                'done': sum(finished['done'] for finished in self._finished.values()),
+                'failed': sum(finished['failed'] for finished in self._finished.values()),
+                'elapsed': time.time() - self._started,
+                'datasets': datasets,
+                }
+
+    # ###################################################################################
+    # Queue, called with self._condition held
+
+    def _add(self, task):
+        if task.key in self._tasks:
+            return
+        task.priority = self._priority(task)
+        self._tasks[task.key] = task
+        heapq.heappush(self._heap, (task.priority, next(self._sequence), task))
+        self._condition.notify()
+
+    def _priority(self, task):
+        focus_alias, focus_col_name = self._focus
+        boost = DEFAULT
+        if task.requested:
+            boost = REQUESTED
+        elif task.data_alias == focus_alias:
+            boost = DATASET
+            if focus_col_name is not None and task.args and task.args[0] == focus_col_name:
+                boost = FOCUS
+        return (boost, task.kind, task.order)
+
+    def _pop(self):
+        """The queued task with the best priority, or None
+        """
+        while self._heap:
+            priority, sequence, task = heapq.heappop(self._heap)
+            # skip entries for tasks that were re-prioritized, replaced or already run
+            if self._tasks.get(task.key) is task and task.priority == priority:
+                del self._tasks[task.key]
+                return task
+        return None
+
+    # ###################################################################################
+    # Background thread
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='precompute')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                task = self._pop()
+                while task is None:
+                    self._condition.wait()
+                    task = self._pop()
+                self._running = task
+            result = 'done'
+            try:
+                self._calculate(task)
+            except Exception:
+                logger.exception("Precompute of %s failed", task)
+                result = 'failed'
+            with self._condition:
+                self._running = None
+                finished = self._finished.setdefault(task.data_alias, {'done': 0, 'failed': 0})
+                finished[result] += 1
+
+    def _calculate(self, task):
+        df = self._open_dataset(task.data_alias)
+        store = self._open_store()
+        page_class = task.page_class
+        page_hash = page_class(df, *task.args).hash
+        if not store.has(page_hash):
+            logger.debug("Precomputing %s", task)
+            stages = page_class.required_describers(df, *task.args) + [[(page_class, task.args)]]
+            if self._executor is None:
+                self._executor = parallel.new_executor(self._workers)
+            parallel.calculate_describers(store, df, stages, workers=self._workers, executor=self._executor, image_base_path=self._image_base_path)
+            # workers log describers that fail, and leave them out
+            if not store.has(page_hash):
+                raise ValueError("Page was not calculated", str(task))
+        if task.kind == TABLE:
+            self._add_dataset_pages(task.data_alias, df, store)
+
+    def _add_dataset_pages(self, data_alias, df, store):
+        """Queue column pages, and the relationship pages the table page lists
+        """
+        try:
+            relationships = store._get_without_df(describers.TableRelationships(df).hash).relationships
+        except KeyError:
+            relationships = []
+        pairs = []
+        for col_1_name, col_2_name, description in relationships:
+            if not pairs or pairs[-1] != (col_1_name, col_2_name):
+                pairs.append((col_1_name, col_2_name))
+
+        with self._condition:
+            for i, col_name in enumerate(df.columns):
+                self._add(PrecomputeTask(data_alias, COLUMN, (col_name,), i))
+            for i, pair in enumerate(pairs[:self._max_relationship_pages]):
+                self._add(PrecomputeTask(data_alias, RELATIONSHIP, pair, i))
@@ -0,0 +1,65 @@
+// Fills in the placeholders of a page built before all of its describers were calculated
+// (see describers.DeferredDescriber), asking the fragments endpoint for them until none are left
+
+var DEFERRED_POLL_MIN = 500;
+var DEFERRED_POLL_MAX = 5000;
+
+function loadDeferred(delay) {
+	var placeholders = $('.dfx-deferred');
+	if (placeholders.length == 0) {
+		return;
+	};
+
+	// one request per fragments url, normally just the page's dataset
+	var batches = {};
+	placeholders.each(function() {
+		var url = $(this).attr('data-url');
+		if (!(url in batches)) {
+			batches[url] = [];
+		};
+		batches[url].push(this);
+	});
+
+	var pending = Object.keys(batches).length;
+	var progress = false;
+	$.each(batches, function(url, elements) {
+		var request = $.map(elements, function(element) {
+			return [[
+				$(element).attr('data-describer'),
+				JSON.parse($(element).attr('data-args')),
+				$(element).attr('data-field'),
+				]];
+		});
+		$.ajax({
+			url: url,
+			method: 'POST',
+			contentType: 'application/json',
+			data: JSON.stringify({describers: request}),
+			dataType: 'json',
+		}).done(function(response) {
+			$.each(response.fragments, function(i, fragment) {
+				if (fragment === null) {
+					return;
+				};
+				progress = true;
+				var element = $(elements[i]);
+				if (!fragment.qualified && element.attr('data-qualified-only') == 'true') {
+					// the page only lists qualified describers
+					var item = element.closest('.dfx-deferred-item');
+					(item.length ? item : element).remove();
+				} else {
+					element.replaceWith(fragment.html);
+				};
+			});
+		}).always(function() {
+			pending -= 1;
+			if (pending == 0) {
+				// poll quickly while results arrive, and back off while they don't
+				var next_delay = progress ? DEFERRED_POLL_MIN : Math.min(delay * 2, DEFERRED_POLL_MAX);
+				setTimeout(function() { loadDeferred(next_delay); }, next_delay);
+			};
+		});
+	});
+};
+
+$(function() { loadDeferred(DEFERRED_POLL_MIN); });
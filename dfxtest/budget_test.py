@@ -0,0 +1,85 @@
+import unittest
+import os
+import glob
+import shutil
+import threading
+
+import pandas as pd
+
+from dfx import describers
+from dfx.datastore import DfxStore
+
+class PageTimeBudgetTest(unittest.TestCase):
+
+	def setUp(self):
+		self.image_path = 'budget_test_images'
+		os.makedirs(self.image_path)
+		self.base_path = describers._IMAGE_BASE_PATH
+		describers._IMAGE_BASE_PATH = self.image_path
+		self.file_path = 'budget_test.sqlite'
+		self.db = DfxStore(self.file_path, backend='sqlite')
+		describers.factory = self.db
+		self.df = pd.DataFrame(dict(
+			a = ['x', 'y', 'x', 'y'],
+			b = [1.0, 2.0, 3.0, 4.5],
+			c = ['p', 'q', 'r', 's'],
+			d = [10, 20, 30, 40],
+			), columns=['a', 'b', 'c', 'd'])
+
+	def tearDown(self):
+		describers.PAGE_TIME_BUDGET = None
+		describers._IMAGE_BASE_PATH = self.base_path
+		describers.factory = describers.DescriberFactory()
+		shutil.rmtree(self.image_path)
+		for path in glob.glob(self.file_path + '*'):
+			os.remove(path)
+
+	# ###############################################################
+
+	def test_order(self):
+		# b and d are numeric, so their correlation costs the most, even though they are closer
+		self.assertEqual(describers.ColumnPageDescriber._relationship_order(self.df, 'b'), ['a', 'c', 'd'])
+		# saved relationships cost nothing
+		for relationship_class in describers.RELATIONSHIP_CLASSES:
+			self.db.get_or_create(relationship_class, self.df, 'b', 'd')
+		self.assertEqual(describers.ColumnPageDescriber._relationship_order(self.df, 'b'), ['d', 'a', 'c'])
+
+	def test_skipped(self):
+		for relationship_class in describers.RELATIONSHIP_CLASSES:
+			self.db.get_or_create(relationship_class, self.df, 'a', 'b')
+		describers.PAGE_TIME_BUDGET = 0
+		page = self.db.get_or_create(describers.ColumnPageDescriber, self.df, 'a')
+		self.assertFalse(page._complete)
+		# only the saved relationships are read, and the page isn't saved
+		self.assertEqual(len(page.skipped), 2)
+		self.assertTrue('/column/a/relates-to/c' in page.skipped[0])
+		self.assertTrue('relates-to/b' in page.html)
+		self.assertFalse(self.db.has(page.hash))
+		self.assertFalse(self.db.has(describers.RelationshipOneToMany(self.df, 'a', 'c').hash))
+
+		# with no budget, everything is calculated
+		describers.PAGE_TIME_BUDGET = None
+		page = self.db.get_or_create(describers.ColumnPageDescriber, self.df, 'a')
+		self.assertTrue(page._complete)
+		self.assertEqual(page.skipped, [])
+		self.assertTrue(self.db.has(page.hash))
+
+	def test_use_budget(self):
+		for relationship_class in describers.RELATIONSHIP_CLASSES:
+			self.db.get_or_create(relationship_class, self.df, 'a', 'b')
+		# only this thread's pages get the budget
+		with describers.use_page_time_budget(0):
+			self.assertEqual(describers.get_page_time_budget(), 0)
+			seen = []
+			thread = threading.Thread(target=lambda: seen.append(describers.get_page_time_budget()))
+			thread.start()
+			thread.join()
+			self.assertEqual(seen, [None])
+			page = self.db.get_or_create(describers.ColumnPageDescriber, self.df, 'a')
+			self.assertFalse(page._complete)
+		self.assertEqual(describers.get_page_time_budget(), None)
+		page = self.db.get_or_create(describers.ColumnPageDescriber, self.df, 'a')
+		self.assertTrue(page._complete)
+
+if __name__ == '__main__':
+	unittest.main()
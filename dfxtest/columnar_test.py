@@ -0,0 +1,113 @@
+import unittest
+import os
+import glob
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from dfx import columnar
+from dfx import fingerprint
+from dfx.datastore import DfxStore
+import dfx.describers
+
+class ColumnarTest(unittest.TestCase):
+
+	def setUp(self):
+		self.path = 'columnar_test.dfx'
+		self.df = pd.DataFrame({
+			'id': [1, 2, 3],
+			'name': ['a', None, 'a'],
+			'val': [1.5, 2.5, np.nan],
+			'flag': [True, False, True],
+			})
+
+	def tearDown(self):
+		for path in glob.glob('columnar_test*'):
+			if os.path.isdir(path):
+				shutil.rmtree(path)
+			else:
+				os.remove(path)
+
+	# ###############################################################
+
+	def test_round_trip(self):
+		columnar.write_frame(self.df, self.path)
+		df2 = columnar.open_frame(self.path)
+		self.assertTrue(self.df.equals(df2))
+		# fingerprint comes from the schema, and matches a fresh calculation
+		self.assertEqual(
+			fingerprint.get_fingerprint(df2).df_hash,
+			fingerprint.calculate_fingerprint(self.df).df_hash)
+
+	def test_memory_mapped(self):
+		columnar.write_frame(self.df, self.path)
+		df2 = columnar.open_frame(self.path)
+		self.assertTrue(isinstance(df2['id'].values.base, np.memmap) or isinstance(df2['id'].values, np.memmap))
+
+	def test_columns(self):
+		columnar.write_frame(self.df, self.path)
+		df2 = columnar.open_frame(self.path, columns=['val'])
+		self.assertEqual(list(df2.columns), ['val'])
+		self.assertEqual(
+			fingerprint.get_fingerprint(df2).column_hash('val'),
+			fingerprint.calculate_fingerprint(self.df).column_hash('val'))
+
+	def test_chunks(self):
+		writer = columnar.ColumnarWriter(self.path)
+		writer.append(pd.DataFrame({'x': [1, 2], 'y': ['a', 'b']}))
+		writer.append(pd.DataFrame({'x': [np.nan, 4.0], 'y': ['c', 'a']}, index=[2, 3]))
+		writer.close()
+		df2 = columnar.open_frame(self.path)
+		pd.testing.assert_frame_equal(df2, pd.DataFrame({'x': [1.0, 2.0, np.nan, 4.0], 'y': ['a', 'b', 'c', 'a']}))
+
+	def test_store_reference(self):
+		columnar.write_frame(self.df, self.path)
+		df2 = columnar.open_frame(self.path)
+		db = DfxStore('columnar_test_store', backend='sqlite')
+		d = dfx.describers.ShapeRows(df2)
+		db.save(d.hash, d)
+		# the store keeps a reference to the dataset, not a copy of the dataframe
+		self.assertTrue(isinstance(db._get_without_df(d._hash_df), columnar.DatasetReference))
+		d2 = db.get(d.hash)
+		self.assertTrue(self.df.equals(d2.df))
+		# describers read while it is in use share the dataframe
+		self.assertTrue(db.get(d.hash).df is d2.df)
+
+		# once the dataset has changed, the old dataframe is missing
+		writer = columnar.ColumnarWriter(self.path, append=True)
+		writer.append(self.df.set_axis(range(len(self.df), 2 * len(self.df))))
+		writer.close()
+		self.assertRaises(KeyError, db.get, d._hash_df)
+		self.assertRaises(KeyError, db.get, d.hash)
+
+	def test_append(self):
+		columnar.write_frame(self.df, self.path)
+		before = columnar.open_frame(self.path)
+		more = pd.DataFrame({'id': [4, 5], 'name': ['b', 'a'], 'val': [3.5, 4.5], 'flag': [False, False]}, index=[3, 4])
+		writer = columnar.ColumnarWriter(self.path, append=True)
+		writer.append(more)
+		writer.close()
+		df2 = columnar.open_frame(self.path)
+		expected = pd.concat([self.df, more])
+		self.assertTrue(expected.equals(df2))
+		self.assertEqual(
+			fingerprint.get_fingerprint(df2).df_hash,
+			fingerprint.calculate_fingerprint(expected).df_hash)
+		# the dataframe opened before the append still has its rows
+		self.assertTrue(self.df.equals(before))
+
+	def test_append_converts(self):
+		columnar.write_frame(pd.DataFrame({'x': [1, 2]}), self.path)
+		# rows left over from an append that didn't finish are dropped
+		with open(os.path.join(self.path, '0.bin'), 'ab') as f:
+			f.write(b'partial')
+		writer = columnar.ColumnarWriter(self.path, append=True)
+		writer.append(pd.DataFrame({'x': [np.nan]}, index=pd.RangeIndex(2, 3)))
+		writer.close()
+		df2 = columnar.open_frame(self.path)
+		pd.testing.assert_frame_equal(df2, pd.DataFrame({'x': [1.0, 2.0, np.nan]}))
+		self.assertEqual(sorted(os.listdir(self.path)), ['0.1.bin', 'schema.json'])
+		self.assertEqual(
+			fingerprint.get_fingerprint(df2).df_hash,
+			fingerprint.calculate_fingerprint(df2.copy()).df_hash)
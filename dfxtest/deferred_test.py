@@ -0,0 +1,93 @@
+import unittest
+import os
+import glob
+import shutil
+import json
+import threading
+
+import pandas as pd
+
+from dfx import describers
+from dfx.datastore import DfxStore
+
+class DeferringFactoryTest(unittest.TestCase):
+
+	def setUp(self):
+		self.image_path = 'deferred_test_images'
+		os.makedirs(self.image_path)
+		self.base_path = describers._IMAGE_BASE_PATH
+		describers._IMAGE_BASE_PATH = self.image_path
+		self.file_path = 'deferred_test.sqlite'
+		self.db = DfxStore(self.file_path, backend='sqlite')
+		self.df = pd.DataFrame(dict(
+			region = ['west', 'west', 'east', 'east'],
+			state = ['CA', 'WA', 'NC', 'NY'],
+			sales = [10, 20, 30, 45],
+			))
+
+	def tearDown(self):
+		describers._IMAGE_BASE_PATH = self.base_path
+		describers.factory = describers.DescriberFactory()
+		shutil.rmtree(self.image_path)
+		for path in glob.glob(self.file_path + '*'):
+			os.remove(path)
+
+	# ###############################################################
+
+	def test_deferred(self):
+		factory = describers.DeferringFactory(self.db)
+		describers.factory = factory
+		d = factory.get_or_create(describers.ColumnNull, self.df, 'sales')
+		self.assertTrue(isinstance(d, describers.DeferredDescriber))
+		self.assertEqual(factory.deferred, [(describers.ColumnNull, ('sales',))])
+		self.assertTrue('dfx-deferred' in d.description)
+		# nothing was calculated or saved
+		self.assertFalse(self.db.has(describers.ColumnProfile(self.df, 'sales').hash))
+
+		# the placeholder names what to ask for
+		self.assertTrue("data-describer='ColumnNull'" in d.html)
+		self.assertTrue("data-args='{}'".format(json.dumps(['sales']).replace('"', '&quot;')) in d.html)
+		self.assertTrue("data-qualified-only='false'" in d.html)
+		self.assertTrue(d.qualified)
+		self.assertTrue("data-qualified-only='true'" in d.html)
+
+	def test_saved(self):
+		saved = self.db.get_or_create(describers.ColumnNull, self.df, 'sales')
+		factory = describers.DeferringFactory(self.db)
+		describers.factory = factory
+		d = factory.get_or_create(describers.ColumnNull, self.df, 'sales')
+		self.assertEqual(d.description, saved.description)
+		self.assertEqual(factory.deferred, [])
+
+	def test_page(self):
+		# shape describers are saved, everything else is a placeholder
+		self.db.get_or_create(describers.ShapeRows, self.df)
+		factory = describers.DeferringFactory(self.db)
+		describers.factory = factory
+		page = describers.TablePageDescriber(self.df)
+		self.assertTrue('4 rows' in page.html)
+		self.assertTrue("data-describer='ColumnSummary'" in page.html)
+		self.assertTrue("data-describer='TableRelationships'" in page.html)
+		self.assertFalse(self.db.has(describers.TableRelationships(self.df).hash))
+
+		# and it renders the same as a calculated one once they are
+		describers.factory = self.db
+		complete = describers.TablePageDescriber(self.df)
+		self.assertFalse('dfx-deferred' in complete.html)
+
+	def test_other_threads(self):
+		# a page built with placeholders in one thread doesn't give them to describers
+		# calculated at the same time in another
+		describers.factory = self.db
+		factory = describers.DeferringFactory(self.db)
+		seen = []
+		with describers.use_factory(factory):
+			self.assertTrue(describers.get_factory() is factory)
+			thread = threading.Thread(target=lambda: seen.append(describers.get_factory()))
+			thread.start()
+			thread.join()
+		self.assertEqual(seen, [self.db])
+		self.assertTrue(describers.get_factory() is self.db)
+
+if __name__ == '__main__':
+	unittest.main()
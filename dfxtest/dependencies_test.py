@@ -0,0 +1,85 @@
+import unittest
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from dfx import dependencies
+from dfx import describers
+
+def _determines(df, col_1_name, col_2_name):
+	return df.groupby(col_1_name, dropna=False)[col_2_name].nunique(dropna=False).max() == 1
+
+class DependenciesTest(unittest.TestCase):
+
+	def setUp(self):
+		random = np.random.RandomState(0)
+		n = 2000
+		city = random.randint(0, 200, n)
+		self.df = pd.DataFrame({
+			'id': np.arange(n),
+			'city': ['city{}'.format(c) for c in city],
+			'city_code': city * 7,
+			'state': ['state{}'.format(c // 10) for c in city],
+			'region': ['region{}'.format(c // 50) for c in city],
+			'other': random.randint(0, 5, n),
+			'constant': 1,
+			})
+		self.df['other'] = self.df['other'].astype(float)
+		self.df.loc[5, 'other'] = np.nan
+
+	# ###############################################################
+
+	def test_hierarchies(self):
+		found = dependencies.find_dependencies(self.df, sample_rows=100)
+		self.assertEqual(found.hierarchies(), [['region', 'state', 'city']])
+		self.assertEqual(found.equivalence_classes(), [['city', 'city_code']])
+		self.assertEqual(found.columns, ['city', 'city_code', 'state', 'region', 'other'])
+
+	def test_matches_groupby(self):
+		found = dependencies.find_dependencies(self.df, sample_rows=100)
+		for col_1_name, col_2_name in itertools.permutations(found.columns, 2):
+			self.assertEqual(
+				found.determines(col_1_name, col_2_name), _determines(self.df, col_1_name, col_2_name),
+				(col_1_name, col_2_name))
+
+	def test_mappings(self):
+		found = dependencies.find_dependencies(self.df)
+		for (col_1_name, col_2_name), counts in found.mappings().items():
+			codes_1, cardinality_1 = dependencies.factorize_with_nulls(self.df[col_1_name])
+			codes_2, cardinality_2 = dependencies.factorize_with_nulls(self.df[col_2_name])
+			self.assertEqual(counts, dependencies.mapping_counts(codes_1, cardinality_1, codes_2, cardinality_2))
+
+	def test_equivalent(self):
+		df = pd.DataFrame({'a': ['x', 'y', 'y', 'z'], 'b': [3, 1, 1, 2], 'c': ['p', 'p', 'p', 'q']})
+		found = dependencies.find_dependencies(df)
+		self.assertEqual(found.equivalence_classes(), [['a', 'b']])
+		self.assertEqual(found.hierarchies(), [['c', 'a']])
+		self.assertEqual(found.mapping_counts('b', 'c'), (1, 2))
+		self.assertEqual(found.mapping_counts('c', 'a'), (2, 1))
+
+	def test_mapping_counts(self):
+		df = pd.DataFrame({'first': ['john', 'john', 'mike', 'mike'], 'last': ['smith', 'jones', 'smith', 'jones']})
+		codes_1, cardinality_1 = dependencies.factorize_with_nulls(df['first'])
+		codes_2, cardinality_2 = dependencies.factorize_with_nulls(df['last'])
+		self.assertEqual(dependencies.mapping_counts(codes_1, cardinality_1, codes_2, cardinality_2), (2, 2))
+
+	def test_one_to_many_nulls(self):
+		# a null isn't a value, so state still determines region
+		df = pd.DataFrame({
+			'region': ['west', 'west', None, 'east', 'east'],
+			'state': ['CA', 'WA', 'CA', 'NY', None],
+			})
+		d = describers.RelationshipOneToMany(df, 'region', 'state')
+		col_1_to_2 = df.groupby('region')['state'].nunique().max()
+		col_2_to_1 = df.groupby('state')['region'].nunique().max()
+		self.assertEqual((col_1_to_2, col_2_to_1), (2, 1))
+		self.assertEqual(d.description, describers.mapping_description('region', 'state', col_1_to_2, col_2_to_1))
+
+	def test_pair_counts(self):
+		counts = dependencies.pair_counts(self.df, 'region', 'other')
+		expected = self.df.groupby(['region', 'other']).size().to_frame().reset_index()
+		self.assertEqual(counts.values.tolist(), expected.values.tolist())
+
+if __name__ == '__main__':
+	unittest.main()
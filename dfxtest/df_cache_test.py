@@ -0,0 +1,65 @@
+import unittest
+import os
+import glob
+import shutil
+
+import pandas as pd
+
+from dfx import columnar
+from dfx.web.df_cache import DataFrameCache
+
+class DataFrameCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.df = pd.DataFrame({'id': list(range(100)), 'name': ['name{}'.format(i) for i in range(100)]})
+		columnar.write_frame(self.df, 'df_cache_test_1.dfx')
+		columnar.write_frame(self.df, 'df_cache_test_2.dfx')
+		self.loads = []
+
+	def tearDown(self):
+		for path in glob.glob('df_cache_test*'):
+			shutil.rmtree(path)
+
+	def loader(self, path):
+		self.loads.append(path)
+		return columnar.open_frame(path)
+
+	# ###############################################################
+
+	def test_hit(self):
+		cache = DataFrameCache(max_bytes=10 ** 6)
+		df1 = cache.get('df_cache_test_1.dfx', self.loader)
+		df2 = cache.get('df_cache_test_1.dfx', self.loader)
+		self.assertTrue(df1 is df2)
+		self.assertEqual(len(self.loads), 1)
+
+	def test_reloaded_file(self):
+		cache = DataFrameCache(max_bytes=10 ** 6)
+		cache.get('df_cache_test_1.dfx', self.loader)
+		columnar.write_frame(self.df.head(10), 'df_cache_test_1.dfx')
+		df = cache.get('df_cache_test_1.dfx', self.loader)
+		self.assertEqual(len(df), 10)
+		self.assertEqual(len(self.loads), 2)
+
+	def test_evict(self):
+		# budget only fits one of the two dataframes
+		cache = DataFrameCache(max_bytes=1000)
+		cache.get('df_cache_test_1.dfx', self.loader)
+		cache.get('df_cache_test_2.dfx', self.loader)
+		cache.get('df_cache_test_2.dfx', self.loader)
+		cache.get('df_cache_test_1.dfx', self.loader)
+		self.assertEqual(len(self.loads), 3)
+
+	def test_nbytes(self):
+		cache = DataFrameCache(max_bytes=10 ** 6)
+		df = cache.get('df_cache_test_1.dfx', self.loader)
+		# the memory-mapped ids don't count, but each name does
+		self.assertEqual(cache.nbytes, df.memory_usage(deep=True)['name'] + df.index.memory_usage())
+		self.assertTrue(cache.nbytes > df.memory_usage(deep=False)['name'])
+
+	def test_invalidate(self):
+		cache = DataFrameCache(max_bytes=10 ** 6)
+		cache.get('df_cache_test_1.dfx', self.loader)
+		cache.invalidate('df_cache_test_1.dfx')
+		cache.get('df_cache_test_1.dfx', self.loader)
+		self.assertEqual(len(self.loads), 2)
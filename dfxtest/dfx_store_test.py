@@ -1,5 +1,6 @@
 import unittest
 import os
+import glob
 
 import pandas as pd
 
@@ -13,8 +14,9 @@ class DfxStoreTest(unittest.TestCase):
 		self.db = DfxStore(self.file_path, exception_if_not_exists=False)
 
 	def tearDown(self):
-		if os.path.exists(self.file_path):
-			os.remove(self.file_path)
+		# dbm implementations may add extensions like .db or .dat/.dir/.bak
+		for path in glob.glob(self.file_path + '*'):
+			os.remove(path)
 
 	# ###############################################################
 
@@ -39,4 +41,95 @@ class DfxStoreTest(unittest.TestCase):
 		self.assertTrue((d.df==d2.df).all().all())
 
 
-		
\ No newline at end of file
+	def test_column_keys(self):
+		df = pd.DataFrame({'id': [1,2,3], 'val':[10, 20, 30], 'other': ['a', 'b', 'c']})
+		df2 = df.copy()
+		df2['other'] = ['a', 'b', 'z']
+		# column and relationship describers only depend on the columns they read
+		self.assertEqual(dfx.describers.ColumnNull(df, 'id').hash, dfx.describers.ColumnNull(df2, 'id').hash)
+		self.assertEqual(
+			dfx.describers.RelationshipCorrelation(df, 'id', 'val').hash,
+			dfx.describers.RelationshipCorrelation(df2, 'id', 'val').hash)
+		self.assertNotEqual(dfx.describers.ColumnNull(df, 'other').hash, dfx.describers.ColumnNull(df2, 'other').hash)
+		# table and column pages depend on the whole dataframe
+		self.assertNotEqual(dfx.describers.ShapeRows(df).hash, dfx.describers.ShapeRows(df2).hash)
+		self.assertNotEqual(
+			dfx.describers.ColumnPageDescriber(df, 'id').hash,
+			dfx.describers.ColumnPageDescriber(df2, 'id').hash)
+
+	def test_batch(self):
+		with self.db.batch():
+			self.db.save('x', 1)
+			self.assertTrue(self.db.has('x'))
+			self.assertEqual(self.db.get('x'), 1)
+			with self.db.batch():
+				self.db.save('y', 2)
+			# nested batch doesn't commit, outermost one does
+			self.assertFalse(DfxStore(self.file_path, backend=self.db._backend_name).has('y'))
+		self.assertTrue(self.db.has('x'))
+		self.assertEqual(self.db.get('y'), 2)
+		self.assertEqual(sorted(self.db.keys()), ['x', 'y'])
+
+	def test_delete(self):
+		self.db.delete('x')
+		self.db.save('x', 1)
+		self.db.save('y', 2)
+		self.db.delete('x')
+		self.assertFalse(self.db.has('x'))
+		with self.db.batch():
+			self.db.save('z', 3)
+			self.db.delete('z')
+			self.db.delete('y')
+		self.assertEqual(self.db.keys(), [])
+
+		db = DfxStore(self.file_path + '.sqlite', backend='sqlite')
+		db.save('x', 1)
+		db.delete('x')
+		self.assertFalse(db.has('x'))
+
+	def test_get_or_create(self):
+		df = pd.DataFrame({'id': [1,2,3], 'val':[10, 20, 30]})
+		d = self.db.get_or_create(dfx.describers.ShapeRows, df)
+		self.assertEqual(d.description, '3 rows')
+		self.assertTrue(self.db.has(d.hash))
+		d2 = self.db.get_or_create(dfx.describers.ShapeRows, df)
+		self.assertEqual(d2.description, '3 rows')
+		self.assertTrue(d2.df is df)
+
+	def test_not_cacheable(self):
+		df = pd.DataFrame({'region': ['west', 'west', 'east'], 'state': ['CA', 'WA', 'NC']})
+		d = self.db.get_or_create(dfx.describers.ValuePageDescriber, df, 'region', 'east')
+		self.assertTrue(d.valid)
+		self.assertFalse(self.db.has(d.hash))
+
+	def test_has_empty(self):
+		self.assertFalse(self.db.has('x'))
+		self.assertEqual(self.db.keys(), [])
+
+class DfxStoreSqliteTest(DfxStoreTest):
+	"""Runs every DfxStoreTest against the sqlite backend
+	"""
+
+	def setUp(self):
+		self.file_path = 'dfx_store_test.sqlite'
+		self.db = DfxStore(self.file_path, exception_if_not_exists=False, backend='sqlite')
+
+	def test_concurrent_stores(self):
+		other_db = DfxStore(self.file_path, backend='sqlite')
+		with self.db.batch():
+			self.db.save('x', 1)
+			# other connections don't see uncommitted saves
+			self.assertFalse(other_db.has('x'))
+		self.assertEqual(other_db.get('x'), 1)
+
+	def test_commit(self):
+		other_db = DfxStore(self.file_path, backend='sqlite')
+		with self.db.batch():
+			self.db.save('x', 1)
+			self.db.commit()
+			# committed inside the batch, so other connections see it
+			self.assertEqual(other_db.get('x'), 1)
+			self.db.save('y', 2)
+			self.assertFalse(other_db.has('y'))
+		self.assertEqual(other_db.get('y'), 2)
+
@@ -0,0 +1,60 @@
+import unittest
+import os
+
+import pandas as pd
+
+from dfx import fingerprint
+
+class FingerprintTest(unittest.TestCase):
+
+	def setUp(self):
+		self.df = pd.DataFrame({'id': [1, 2, 3], 'val': ['a', 'b', 'c']})
+
+	def test_same_data_same_hash(self):
+		fp1 = fingerprint.calculate_fingerprint(self.df)
+		fp2 = fingerprint.calculate_fingerprint(self.df.copy())
+		self.assertEqual(fp1.df_hash, fp2.df_hash)
+
+	def test_changed_column(self):
+		df2 = self.df.copy()
+		df2.loc[1, 'val'] = 'z'
+		fp1 = fingerprint.calculate_fingerprint(self.df)
+		fp2 = fingerprint.calculate_fingerprint(df2)
+		self.assertNotEqual(fp1.df_hash, fp2.df_hash)
+		self.assertEqual(fp1.column_hash('id'), fp2.column_hash('id'))
+		self.assertNotEqual(fp1.column_hash('val'), fp2.column_hash('val'))
+
+	def test_dtype_changes_hash(self):
+		fp1 = fingerprint.calculate_fingerprint(pd.DataFrame({'x': [1, 2]}))
+		fp2 = fingerprint.calculate_fingerprint(pd.DataFrame({'x': [1.0, 2.0]}))
+		self.assertNotEqual(fp1.df_hash, fp2.df_hash)
+
+	def test_memoized(self):
+		fp1 = fingerprint.get_fingerprint(self.df)
+		fp2 = fingerprint.get_fingerprint(self.df)
+		self.assertTrue(fp1 is fp2)
+
+	def test_extended(self):
+		old_block_rows = fingerprint.BLOCK_ROWS
+		fingerprint.BLOCK_ROWS = 2
+		try:
+			df_long = pd.DataFrame({'id': list(range(7)), 'val': list('abcdefg')})
+			fp_short = fingerprint.calculate_fingerprint(df_long.head(5))
+			fp_extended = fp_short.extended(df_long, 5)
+			fp_full = fingerprint.calculate_fingerprint(df_long)
+			self.assertEqual(fp_extended.df_hash, fp_full.df_hash)
+		finally:
+			fingerprint.BLOCK_ROWS = old_block_rows
+
+	def test_file_fingerprint(self):
+		path = 'fingerprint_test.pickle'
+		try:
+			self.df.to_pickle(path)
+			df1 = pd.read_pickle(path)
+			df2 = pd.read_pickle(path)
+			fp1 = fingerprint.get_file_fingerprint(df1, path)
+			fp2 = fingerprint.get_file_fingerprint(df2, path)
+			self.assertTrue(fp1 is fp2)
+			self.assertTrue(fingerprint.get_fingerprint(df2) is fp1)
+		finally:
+			os.remove(path)
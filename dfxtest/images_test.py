@@ -0,0 +1,77 @@
+import unittest
+import os
+import glob
+import time
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from dfx import describers
+from dfx.datastore import DfxStore
+
+class ImagesTest(unittest.TestCase):
+
+	def setUp(self):
+		self.image_path = 'images_test_images'
+		os.makedirs(self.image_path)
+		self.base_path = describers._IMAGE_BASE_PATH
+		describers._IMAGE_BASE_PATH = self.image_path
+		self.db = DfxStore('images_test.sqlite', backend='sqlite')
+		describers.factory = self.db
+		self.df = pd.DataFrame(dict(x=np.arange(50.0), y=np.arange(50.0) * 2 + np.sin(np.arange(50.0))))
+
+	def tearDown(self):
+		describers._IMAGE_BASE_PATH = self.base_path
+		describers.factory = describers.DescriberFactory()
+		shutil.rmtree(self.image_path)
+		for path in glob.glob('images_test.sqlite*'):
+			os.remove(path)
+
+	def images(self):
+		return sorted(os.listdir(self.image_path))
+
+	# ###############################################################
+
+	def test_same_name(self):
+		numeric = describers.ColumnNumeric(self.df, 'x')
+		self.assertEqual(describers.propose_image_path(numeric, 1), describers.propose_image_path(numeric, 1))
+		self.assertNotEqual(describers.propose_image_path(numeric, 1), describers.propose_image_path(numeric, 2))
+		self.assertNotEqual(
+			describers.propose_image_path(numeric, 1),
+			describers.propose_image_path(describers.ColumnNumeric(self.df, 'y'), 1))
+
+		numeric.html
+		images = self.images()
+		self.assertEqual(len(images), 1)
+		self.assertTrue(images[0] in numeric.html)
+		# calculated again, e.g. on a refresh, the image is reused
+		mtime = os.path.getmtime(os.path.join(self.image_path, images[0]))
+		again = describers.ColumnNumeric(self.df, 'x')
+		self.assertEqual(again.html, numeric.html)
+		self.assertEqual(self.images(), images)
+		self.assertEqual(os.path.getmtime(os.path.join(self.image_path, images[0])), mtime)
+
+	def test_remove_unused(self):
+		self.db.get_or_create(describers.ColumnNumeric, self.df, 'x')
+		self.db.get_or_create(describers.RelationshipCorrelation, self.df, 'x', 'y')
+		used = self.images()
+		self.assertEqual(len(used), 2)
+		for name in ['image_abcdefgh.png', 'image_0123.png']:
+			open(os.path.join(self.image_path, name), 'w').close()
+		old = time.time() - 2 * describers.IMAGE_MIN_AGE
+		os.utime(os.path.join(self.image_path, 'image_abcdefgh.png'), (old, old))
+		open(os.path.join(self.image_path, 'other.txt'), 'w').close()
+
+		removed = describers.remove_unused_images(self.db)
+		self.assertEqual(removed, ['image_abcdefgh.png'])
+		# recent images may belong to describers that aren't saved yet
+		self.assertEqual(self.images(), sorted(used + ['image_0123.png', 'other.txt']))
+		removed = describers.remove_unused_images(self.db, min_age=0)
+		self.assertEqual(removed, ['image_0123.png'])
+
+		self.db.delete_all()
+		self.assertEqual(sorted(describers.remove_unused_images(self.db, min_age=0)), used)
+
+if __name__ == '__main__':
+	unittest.main()
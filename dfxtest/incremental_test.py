@@ -0,0 +1,118 @@
+import unittest
+import os
+import glob
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from dfx import columnar
+from dfx import ingest
+from dfx import incremental
+from dfx import stats
+from dfx import value_index
+from dfx import describers
+from dfx.datastore import DfxStore
+
+class UpdateDescribersTest(unittest.TestCase):
+
+	def setUp(self):
+		self.csv_path = 'incremental_test.csv'
+		self.dataset_path = 'incremental_test.dfx'
+		self.db = DfxStore('incremental_test.sqlite', backend='sqlite')
+		describers.factory = self.db
+		value_index._indexes.clear()
+		self.write_rows(0, 300, header=True)
+		ingest.load_csv(self.csv_path, self.dataset_path)
+
+	def tearDown(self):
+		describers.factory = describers.DescriberFactory()
+		value_index._indexes.clear()
+		for path in glob.glob('incremental_test*') + glob.glob('image_*.png'):
+			if os.path.isdir(path):
+				shutil.rmtree(path)
+			else:
+				os.remove(path)
+
+	def write_rows(self, start, stop, header=False):
+		random = np.random.RandomState(start)
+		with open(self.csv_path, 'a') as f:
+			if header:
+				f.write('region,x,y\n')
+			for i in range(start, stop):
+				# a region only in the appended rows, and y follows x
+				region = random.choice(['north', 'south', 'east'] if i < 300 else ['north', 'west'])
+				x = random.normal()
+				f.write('{},{:.4f},{:.4f}\n'.format(region, x, 2 * x + random.normal() + (region == 'west')))
+
+	# ###############################################################
+
+	def test_update(self):
+		previous_df = columnar.open_frame(self.dataset_path)
+		self.db.get_or_create(describers.TableRelationships, previous_df)
+		value_index.get_value_index(previous_df, 'region')
+
+		self.write_rows(300, 400)
+		self.assertEqual(ingest.append_csv(self.csv_path, self.dataset_path), 300)
+		df = columnar.open_frame(self.dataset_path)
+		incremental.update_describers(self.db, previous_df, df)
+
+		for col_name in df.columns:
+			self.assertTrue(self.db.has(describers.ColumnProfile(df, col_name).hash))
+			profile = self.db.get_or_create(describers.ColumnProfile, df, col_name).profile
+			exact = stats.profile_column(df[col_name])
+			self.assertFalse(profile.approximate)
+			for name in ['row_count', 'null_count', 'distinct_count', 'top_values', 'min', 'max', 'is_monotonic']:
+				self.assertEqual(getattr(profile, name), getattr(exact, name), (col_name, name))
+			if col_name != 'region':
+				self.assertAlmostEqual(profile.std, exact.std)
+				self.assertEqual(profile.histogram[0].sum(), 400)
+
+		relationships = describers.TableRelationships(df)
+		self.assertTrue(self.db.has(relationships.hash))
+		describers.factory = describers.DescriberFactory()
+		self.assertEqual(self.db.get(relationships.hash).relationships, relationships.relationships)
+
+		# the index was extended and saved for the new rows, replacing the old one
+		value_index._indexes.clear()
+		self.assertEqual(len(glob.glob(self.dataset_path + '/index/*.order.npy')), 1)
+		index = value_index.get_value_index(df, 'region')
+		self.assertTrue(isinstance(index.order, np.memmap))
+		self.assertEqual(list(index.positions('west')), list(np.flatnonzero(df['region'] == 'west')))
+
+		# only the latest tallies are kept
+		self.assertTrue(self.db.has(describers.ColumnTally(df, 'x').hash))
+		self.assertFalse(self.db.has(describers.ColumnTally(previous_df, 'x').hash))
+
+		# without new rows, there is nothing to update
+		keys = sorted(self.db.keys())
+		incremental.update_describers(self.db, df, columnar.open_frame(self.dataset_path))
+		self.assertEqual(sorted(self.db.keys()), keys)
+
+	def test_dtype_changed(self):
+		previous_df = pd.DataFrame(dict(n=[3, 1, 2], x=[0.5, 1.5, 2.5]))
+		df = pd.DataFrame(dict(n=[3, 1, 2, np.nan], x=[0.5, 1.5, 2.5, 3.5]))
+		previous = self.db.get_or_create(describers.ColumnTally, previous_df, 'n')
+		self.db.get_or_create(describers.TableRelationships, previous_df)
+		incremental.update_describers(self.db, previous_df, df)
+		# the integers are floats now, so n is calculated again from all of its rows
+		self.assertFalse(self.db.has(previous.hash))
+		self.assertFalse(self.db.has(describers.ColumnTally(df, 'n').hash))
+		self.assertFalse(self.db.has(describers.ColumnProfile(df, 'n').hash))
+		self.assertFalse(self.db.has(describers.TableRelationships(df).hash))
+		self.assertTrue(self.db.has(describers.ColumnProfile(df, 'x').hash))
+		profile = self.db.get_or_create(describers.ColumnProfile, df, 'n').profile
+		self.assertEqual(profile.null_count, 1)
+		self.assertEqual(profile.min, stats.profile_column(df['n']).min)
+
+	def test_tally(self):
+		df = pd.DataFrame(dict(val=[3, 1, 1, 2, 5, 5, 5]))
+		previous = describers.ColumnTally(df[:4], 'val')
+		tally = describers.ColumnTally.extended(previous, df, 4)
+		self.assertEqual(tally.sketch.stats().top_values, stats.profile_column(df['val']).top_values)
+		self.assertEqual(tally.sketch.stats().distinct_count, 4)
+		# previous is unchanged
+		self.assertEqual(previous.sketch.row_count, 4)
+
+if __name__ == '__main__':
+	unittest.main()
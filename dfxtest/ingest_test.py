@@ -0,0 +1,127 @@
+import unittest
+import os
+import glob
+import shutil
+
+import pandas as pd
+
+from dfx import columnar
+from dfx import ingest
+
+class IngestTest(unittest.TestCase):
+
+	def setUp(self):
+		self.csv_path = 'ingest_test.csv'
+		self.dataset_path = 'ingest_test.dfx'
+		with open(self.csv_path, 'w') as f:
+			f.write('id,name,val\n')
+			for i in range(25):
+				# val is an integer until a null in the last chunk
+				f.write('{},"name {}",{}\n'.format(i, i % 3, '' if i == 24 else i * 10))
+
+	def tearDown(self):
+		for path in glob.glob('ingest_test*'):
+			if os.path.isdir(path):
+				shutil.rmtree(path)
+			else:
+				os.remove(path)
+
+	# ###############################################################
+
+	def test_load_csv(self):
+		progress = []
+		ingest.load_csv(self.csv_path, self.dataset_path, chunk_rows=10,
+			progress=lambda rows, bytes_read: progress.append((rows, bytes_read)))
+		df = columnar.open_frame(self.dataset_path)
+		self.assertTrue(df.equals(pd.read_csv(self.csv_path)))
+		self.assertEqual(progress[-1], (25, os.path.getsize(self.csv_path)))
+		self.assertEqual([rows for rows, bytes_read in progress[:3]], [10, 20, 25])
+
+	def test_text_in_last_chunk(self):
+		with open(self.csv_path, 'w') as f:
+			f.write('a,b\n')
+			for i in range(200):
+				f.write('{},{}\n'.format(i, i if i % 7 else '00{}'.format(i)))
+			f.write('200,abc\n201,\n')
+		ingest.load_csv(self.csv_path, self.dataset_path, chunk_rows=50)
+		df = columnar.open_frame(self.dataset_path)
+		expected = pd.read_csv(self.csv_path)
+		self.assertTrue(df.equals(expected))
+		# the numbers are text as they appear in the file
+		self.assertEqual(df['b'].map(type).value_counts().to_dict(), {str: 201, float: 1})
+		self.assertEqual(df['b'][7], '007')
+		self.assertEqual(df['a'].dtype, expected['a'].dtype)
+
+	def test_append_csv(self):
+		ingest.load_csv(self.csv_path, self.dataset_path, chunk_rows=10)
+		with open(self.csv_path, 'a') as f:
+			f.write('25,"name 7",250\n26,,\n')
+		progress = []
+		start_row = ingest.append_csv(self.csv_path, self.dataset_path, chunk_rows=1,
+			progress=lambda rows, bytes_read: progress.append(rows))
+		self.assertEqual(start_row, 25)
+		self.assertEqual(progress, [1, 2])
+		df = columnar.open_frame(self.dataset_path)
+		self.assertTrue(df.equals(pd.read_csv(self.csv_path)))
+		# unchanged since, so nothing to append
+		self.assertEqual(ingest.append_csv(self.csv_path, self.dataset_path), 27)
+
+	def test_append_changed(self):
+		ingest.load_csv(self.csv_path, self.dataset_path)
+		with open(self.csv_path, 'r+') as f:
+			f.write('ID')
+		self.assertEqual(ingest.append_csv(self.csv_path, self.dataset_path), None)
+		self.assertEqual(columnar.read_schema(self.dataset_path)['row_count'], 25)
+
+	def test_append_text(self):
+		with open(self.csv_path, 'w') as f:
+			f.write('a,b\n')
+			for i in range(50):
+				f.write('{},{}\n'.format(i, i))
+		ingest.load_csv(self.csv_path, self.dataset_path)
+		with open(self.csv_path, 'a') as f:
+			f.write('50,1.5\n51,xyz\n')
+		# b is text in the whole file, so it has to be loaded again
+		self.assertEqual(ingest.append_csv(self.csv_path, self.dataset_path, chunk_rows=1), None)
+		schema = columnar.read_schema(self.dataset_path)
+		self.assertEqual(schema['row_count'], 50)
+		self.assertLess(schema['source']['bytes'], os.path.getsize(self.csv_path))
+		self.assertEqual(columnar.open_frame(self.dataset_path)['b'].dtype, 'int64')
+		ingest.load_csv(self.csv_path, self.dataset_path)
+		df = columnar.open_frame(self.dataset_path)
+		self.assertTrue(df.equals(pd.read_csv(self.csv_path)))
+		self.assertEqual(df['b'].map(type).value_counts().to_dict(), {str: 52})
+
+	def test_header_only(self):
+		with open(self.csv_path, 'w') as f:
+			f.write('id,name\n')
+		ingest.load_csv(self.csv_path, self.dataset_path)
+		df = columnar.open_frame(self.dataset_path)
+		self.assertEqual(list(df.columns), ['id', 'name'])
+		self.assertEqual(len(df), 0)
+
+	def test_record_boundaries(self):
+		with open(self.csv_path, 'w') as f:
+			f.write('id,text\n1,"a\nb"\n2,"c ""quoted""\nd"\n3,e\n')
+		# every possible split lands at the start of a record
+		boundaries = ingest.find_record_boundaries(self.csv_path, 8, 20, block_size=4)
+		self.assertEqual(boundaries, [8, 16, 35, 39])
+
+	def test_load_csv_parallel(self):
+		with open(self.csv_path, 'a') as f:
+			f.write('25,"multi\nline, with comma",250\n')
+		ingest.load_csv_parallel(self.csv_path, self.dataset_path, workers=2, part_bytes=50)
+		df = columnar.open_frame(self.dataset_path)
+		self.assertTrue(df.equals(pd.read_csv(self.csv_path)))
+
+	def test_text_in_later_part(self):
+		# text after the rows infer_schema() reads, in one of the later parts
+		with open(self.csv_path, 'w') as f:
+			f.write('a,b\n')
+			for i in range(ingest.SCHEMA_SAMPLE_ROWS + 200):
+				f.write('{},{}\n'.format(i, 'abc' if i == ingest.SCHEMA_SAMPLE_ROWS + 100 else i))
+		ingest.load_csv_parallel(self.csv_path, self.dataset_path, workers=2, part_bytes=20000)
+		df = columnar.open_frame(self.dataset_path)
+		self.assertTrue(df.equals(pd.read_csv(self.csv_path)))
+		ingest.load_csv(self.csv_path, self.dataset_path, chunk_rows=5000)
+		self.assertTrue(df.equals(columnar.open_frame(self.dataset_path)))
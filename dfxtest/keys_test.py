@@ -0,0 +1,60 @@
+import unittest
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from dfx import keys
+
+def _brute_force_keys(df, max_columns):
+	"""Every minimal key, by checking every combination of columns
+	"""
+	found = []
+	columns = [col_name for col_name in df.columns if not df[col_name].isnull().any()]
+	for size in range(1, max_columns + 1):
+		for candidate in itertools.combinations(columns, size):
+			if any(set(key) <= set(candidate) for key in found):
+				continue
+			if not df.duplicated(list(candidate)).any():
+				found.append(candidate)
+	return found
+
+class FindKeysTest(unittest.TestCase):
+
+	def test_composite(self):
+		df = pd.DataFrame({
+			'customer': [1, 1, 1, 2, 2, 3],
+			'date': ['a', 'a', 'b', 'a', 'a', 'a'],
+			'line': [1, 2, 1, 1, 2, 1],
+			'amount': [5.0, 5.0, 7.0, 5.0, 9.0, 1.0],
+			'id': [10, 11, 12, 13, 14, 15],
+			})
+		found = keys.find_keys(df)
+		self.assertEqual(found[0], ('id',))
+		self.assertTrue(('customer', 'date', 'line') in found)
+		self.assertEqual(set(found), set(_brute_force_keys(df, keys.MAX_KEY_COLUMNS)))
+
+	def test_matches_brute_force(self):
+		random = np.random.RandomState(0)
+		for trial in range(5):
+			df = pd.DataFrame(dict(('c{}'.format(i), random.randint(0, 2 + i, 60)) for i in range(7)))
+			self.assertEqual(set(keys.find_keys(df, max_keys=1000)), set(_brute_force_keys(df, keys.MAX_KEY_COLUMNS)))
+
+	def test_narrow_beam(self):
+		# a beam too narrow to keep every set misses keys, but the keys it finds are minimal
+		for seed in range(100):
+			random = np.random.RandomState(seed)
+			df = pd.DataFrame(dict(('c{}'.format(i), random.randint(0, 2 + i, 10)) for i in range(5)))
+			found = keys.find_keys(df, beam_width=1, max_keys=1000)
+			self.assertTrue(set(found) <= set(_brute_force_keys(df, keys.MAX_KEY_COLUMNS)), seed)
+
+	def test_nulls_and_constants(self):
+		df = pd.DataFrame({'a': [1, 2, None], 'b': [1, 1, 1], 'c': [1, 1, 2], 'd': [1, 2, 2]})
+		self.assertEqual(keys.find_keys(df), [('c', 'd')])
+
+	def test_no_keys(self):
+		df = pd.DataFrame({'a': [1, 1], 'b': [2, 2]})
+		self.assertEqual(keys.find_keys(df), [])
+
+if __name__ == '__main__':
+	unittest.main()
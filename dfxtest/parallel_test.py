@@ -0,0 +1,87 @@
+import unittest
+import os
+import glob
+import time
+import shutil
+import tempfile
+
+import pandas as pd
+
+from dfx import parallel
+from dfx import describers
+from dfx.datastore import DfxStore
+
+class ParallelTest(unittest.TestCase):
+
+	def setUp(self):
+		self.image_path = 'parallel_test_images'
+		os.makedirs(self.image_path)
+		self.base_path = describers._IMAGE_BASE_PATH
+		describers._IMAGE_BASE_PATH = self.image_path
+		self.file_path = 'parallel_test.sqlite'
+		self.db = DfxStore(self.file_path, backend='sqlite')
+		self.df = pd.DataFrame(dict(
+			region = ['west', 'west', 'east', 'east', 'east', 'west'],
+			state = ['CA', 'WA', 'NC', 'NY', 'NY', 'CA'],
+			sales = [10, 20, 30, 40, 45, 12],
+			))
+
+	def tearDown(self):
+		describers._IMAGE_BASE_PATH = self.base_path
+		describers.factory = describers.DescriberFactory()
+		shutil.rmtree(self.image_path)
+		for path in glob.glob(self.file_path + '*'):
+			os.remove(path)
+
+	# ###############################################################
+
+	def test_calculate_describers(self):
+		stages = describers.TablePageDescriber.required_describers(self.df)
+		saved = parallel.calculate_describers(self.db, self.df, stages, workers=2, min_describers=0)
+		# including the column describers each ColumnSummary read
+		self.assertEqual(saved, sum(len(stage) for stage in stages) + len(describers.COLUMN_CLASSES) * len(self.df.columns))
+		for stage in stages:
+			for klass, args in stage:
+				self.assertTrue(self.db.has(klass(self.df, *args).hash), klass.__name__)
+
+		# the same results as calculating them in this process
+		for klass, args in stages[1]:
+			d = self.db.get_or_create(klass, self.df, *args)
+			self.assertEqual(d.description, klass(self.df, *args).description)
+
+		# nothing is left to calculate
+		self.assertEqual(parallel.calculate_describers(self.db, self.df, stages, workers=2, min_describers=0), 0)
+
+	def test_image_base_path(self):
+		# workers save plots where they are told, whatever this process's base path is
+		image_path = tempfile.mkdtemp()
+		try:
+			stages = describers.TablePageDescriber.required_describers(self.df)
+			parallel.calculate_describers(self.db, self.df, stages, workers=2, min_describers=0, image_base_path=image_path)
+			self.assertTrue(glob.glob(os.path.join(image_path, 'image_*.png')))
+		finally:
+			shutil.rmtree(image_path)
+
+	def test_few_describers(self):
+		stages = describers.ColumnPageDescriber.required_describers(self.df, 'region')
+		saved = parallel.calculate_describers(self.db, self.df, stages, workers=2)
+		self.assertEqual(saved, 0)
+
+	def test_deadline(self):
+		stages = describers.TablePageDescriber.required_describers(self.df)
+		saved = parallel.calculate_describers(self.db, self.df, stages, workers=2, min_describers=0, deadline=time.time())
+		self.assertEqual(saved, 0)
+
+	def test_worker_factory(self):
+		factory = parallel.WorkerFactory(None)
+		describers.factory = factory
+		d = factory.get_or_create(describers.ColumnNull, self.df, 'sales')
+		self.assertEqual(d.description, 'No nulls')
+		# the profile ColumnNull read is saved too
+		self.assertEqual(
+			sorted(type(created).__name__ for created in factory.created),
+			['ColumnNull', 'ColumnProfile'])
+		self.assertTrue(factory.get_or_create(describers.ColumnNull, self.df, 'sales') is d)
+
+if __name__ == '__main__':
+	unittest.main()
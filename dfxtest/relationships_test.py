@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from dfx import relationships
+
+class RelationshipsTest(unittest.TestCase):
+
+	def setUp(self):
+		random = np.random.RandomState(0)
+		n = 500
+		self.df = pd.DataFrame({
+			'region': random.choice(['west', 'east', 'north'], n),
+			'x': random.normal(size=n),
+			'y': random.normal(size=n),
+			'count': random.randint(0, 10, n),
+			})
+		self.df['y'] += self.df['x'] * 0.3 + (self.df['region'] == 'west')
+		self.df.loc[::7, 'y'] = np.nan
+		self.df['state'] = self.df['region'] + random.choice(['1', '2'], n)
+
+	# ###############################################################
+
+	def test_correlation_matrix(self):
+		from scipy import stats as scipy_stats
+		columns = ['x', 'y', 'count']
+		r, p, n = relationships.correlation_matrix(self.df, columns, block_rows=64)
+		for col_1_name in columns:
+			for col_2_name in columns:
+				pair = self.df[[col_1_name, col_2_name]].dropna()
+				expected_r, expected_p = scipy_stats.pearsonr(pair.iloc[:, 0], pair.iloc[:, -1])
+				self.assertAlmostEqual(r.loc[col_1_name, col_2_name], expected_r, places=8)
+				self.assertEqual(n.loc[col_1_name, col_2_name], len(pair))
+				if col_1_name != col_2_name:
+					self.assertAlmostEqual(p.loc[col_1_name, col_2_name], expected_p, places=8)
+
+	def test_anova_matrix(self):
+		from scipy import stats as scipy_stats
+		results = relationships.anova_matrix(self.df, ['region', 'state'], ['x', 'y', 'count'], block_rows=64)
+		for group_name in ['region', 'state']:
+			for value_name in ['x', 'y', 'count']:
+				pair = self.df[[group_name, value_name]].dropna()
+				groups = [values for label, values in pair.groupby(group_name)[value_name]]
+				expected_f, expected_p = scipy_stats.f_oneway(*groups)
+				f, p = results[(group_name, value_name)]
+				self.assertAlmostEqual(f, expected_f, places=8)
+				self.assertAlmostEqual(p, expected_p, places=8)
+
+	def test_anova_batches(self):
+		relationships.MAX_BINS, max_bins = 3, relationships.MAX_BINS
+		try:
+			batched = relationships.anova_matrix(self.df, ['region'], ['x', 'y', 'count'])
+		finally:
+			relationships.MAX_BINS = max_bins
+		self.assertEqual(batched, relationships.anova_matrix(self.df, ['region'], ['x', 'y', 'count']))
+
+if __name__ == '__main__':
+	unittest.main()
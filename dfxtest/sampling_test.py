@@ -0,0 +1,150 @@
+import unittest
+import os
+import glob
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from dfx import sampling
+from dfx import describers
+from dfx.datastore import DfxStore
+
+class SampleFrameTest(unittest.TestCase):
+
+	def setUp(self):
+		random = np.random.RandomState(0)
+		self.df = pd.DataFrame(dict(
+			group = np.where(np.arange(5000) < 40, 'rare', random.choice(['a', 'b'], 5000)),
+			val = random.normal(size=5000),
+			))
+
+	def tearDown(self):
+		sampling._samples.clear()
+
+	# ###############################################################
+
+	def test_uniform(self):
+		sample = sampling.sample_frame(self.df, 500)
+		self.assertEqual(len(sample), 500)
+		self.assertTrue(sample.index.is_monotonic_increasing)
+		self.assertTrue(sample.equals(self.df.loc[sample.index]))
+		info = sampling.get_sample_info(sample)
+		self.assertEqual((info.rows, info.population_rows, info.strata), (500, 5000, None))
+		self.assertEqual(str(info), 'sample of 500 of 5,000 rows')
+
+		# the same sample every time, even once forgotten
+		self.assertTrue(sampling.sample_frame(self.df, 500) is sample)
+		sampling._samples.clear()
+		self.assertTrue(sampling.sample_frame(self.df.copy(), 500).equals(sample))
+
+		self.assertTrue(sampling.get_sample_info(self.df) is None)
+		self.assertFalse(sampling.should_sample(sample, 100, threshold=10))
+		self.assertTrue(sampling.should_sample(self.df, 100, threshold=1000))
+		self.assertFalse(sampling.should_sample(self.df, None, threshold=1000))
+
+	def test_stratified(self):
+		sample = sampling.sample_frame(self.df, 100, strata='group', columns=['group', 'val'])
+		counts = sample['group'].value_counts()
+		# the rare group is represented, the others in proportion
+		self.assertTrue(20 <= counts['rare'] <= 40)
+		self.assertTrue(20 < counts['a'] < 80)
+		self.assertEqual(sampling.get_sample_info(sample).strata, 'group')
+
+		# with too many groups to keep the minimum of each, the sample is still about 100 rows
+		df = pd.DataFrame(dict(group = np.arange(5000) // 5, val = np.arange(5000)))
+		sample = sampling.sample_frame(df, 100, strata='group')
+		self.assertTrue(50 < len(sample) < 150)
+
+	def test_intervals(self):
+		low, high = sampling.wilson_interval(10, 100)
+		self.assertAlmostEqual(low, 0.0552, places=4)
+		self.assertAlmostEqual(high, 0.1744, places=4)
+		self.assertEqual(sampling.wilson_interval(0, 100)[0], 0)
+
+		low, high = sampling.correlation_interval(0.5, 103)
+		self.assertAlmostEqual(low, 0.3393, places=3)
+		self.assertAlmostEqual(high, 0.6322, places=3)
+
+class SamplingFactoryTest(unittest.TestCase):
+
+	def setUp(self):
+		self.image_path = 'sampling_test_images'
+		os.makedirs(self.image_path)
+		self.base_path = describers._IMAGE_BASE_PATH
+		describers._IMAGE_BASE_PATH = self.image_path
+		self.file_path = 'sampling_test.sqlite'
+		self.db = DfxStore(self.file_path, backend='sqlite')
+		random = np.random.RandomState(0)
+		self.df = pd.DataFrame(dict(
+			x = random.normal(size=3000),
+			y = np.where(random.random_sample(3000) < 0.1, np.nan, 1.0),
+			))
+		self.df['z'] = self.df['x'] + random.normal(size=3000)
+		self.factory = describers.SamplingFactory(self.db, threshold=1000)
+		describers.factory = self.factory
+		self.sample_rows = (describers.ColumnDescriber._sample_rows, describers.RelationshipCorrelation._sample_rows)
+		describers.ColumnDescriber._sample_rows = 500
+		describers.RelationshipCorrelation._sample_rows = 500
+
+	def tearDown(self):
+		describers.ColumnDescriber._sample_rows, describers.RelationshipCorrelation._sample_rows = self.sample_rows
+		describers._IMAGE_BASE_PATH = self.base_path
+		describers.factory = describers.DescriberFactory()
+		sampling._samples.clear()
+		shutil.rmtree(self.image_path)
+		for path in glob.glob(self.file_path + '*'):
+			os.remove(path)
+
+	# ###############################################################
+
+	def test_approximate(self):
+		d = self.factory.get_or_create(describers.ColumnNull, self.df, 'y')
+		self.assertTrue(isinstance(d, describers.ApproximateDescriber))
+		self.assertFalse(d.qualified)
+		self.assertTrue('95% CI' in d.description)
+		self.assertTrue("data-describer='ColumnNull'" in d.description)
+		self.assertTrue('sample of 500 of 3,000 rows' in d.description)
+		# other attributes are the sample's
+		self.assertEqual(d.profile.row_count, 500)
+		# the exact describer isn't calculated
+		self.assertFalse(self.db.has(describers.ColumnNull(self.df, 'y').hash))
+		self.assertEqual(self.factory.deferred, [(describers.ColumnNull, ('y',))])
+
+	def test_exact_saved(self):
+		exact = self.db.get_or_create(describers.ColumnNull, self.df, 'y')
+		d = self.factory.get_or_create(describers.ColumnNull, self.df, 'y')
+		self.assertEqual(d.description, exact.description)
+		self.assertFalse('95% CI' in d.description)
+
+	def test_not_sampled(self):
+		# shapes have no sample size, and small dataframes aren't sampled
+		d = self.factory.get_or_create(describers.ShapeRows, self.df)
+		self.assertEqual(d.description, '3000 rows')
+		d = self.factory.get_or_create(describers.ColumnNull, self.df.head(100), 'y')
+		self.assertFalse(isinstance(d, describers.DeferredDescriber))
+
+	def test_correlation(self):
+		d = self.factory.get_or_create(describers.RelationshipCorrelation, self.df, 'x', 'z')
+		self.assertTrue(d.qualified)
+		low, high = sampling.correlation_interval(d.r, 500)
+		self.assertTrue('95% CI r {:.2f}-{:.2f}'.format(low, high) in d.description)
+		self.assertTrue(low < np.corrcoef(self.df['x'], self.df['z'])[0, 1] < high)
+
+	def test_anova(self):
+		self.df['group'] = np.where(self.df['x'] > 0, 'high', 'low')
+		self.df['noise'] = np.random.RandomState(1).normal(size=3000)
+		sample_rows = describers.RelationshipAnova._sample_rows
+		describers.RelationshipAnova._sample_rows = 500
+		try:
+			d = self.factory.get_or_create(describers.RelationshipAnova, self.df, 'group', 'z')
+			self.assertTrue(d.qualified)
+			self.assertTrue('in a stratified sample' in d.description)
+			d = self.factory.get_or_create(describers.RelationshipAnova, self.df, 'group', 'noise')
+			self.assertFalse(d.qualified)
+			self.assertTrue('in a stratified sample' in d.description)
+		finally:
+			describers.RelationshipAnova._sample_rows = sample_rows
+
+if __name__ == '__main__':
+	unittest.main()
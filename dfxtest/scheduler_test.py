@@ -0,0 +1,94 @@
+import unittest
+
+import pandas as pd
+
+from dfx import describers
+from dfx.web import scheduler
+
+class QueueOnlyScheduler(scheduler.PrecomputeScheduler):
+	"""Queues tasks without starting the background thread
+	"""
+	def _start(self):
+		pass
+
+	def pop_all(self):
+		with self._condition:
+			tasks = []
+			task = self._pop()
+			while task is not None:
+				tasks.append(str(task))
+				task = self._pop()
+			return tasks
+
+class PrecomputeSchedulerTest(unittest.TestCase):
+
+	def setUp(self):
+		self.df = pd.DataFrame(dict(
+			region = ['west', 'west', 'east', 'east'],
+			state = ['CA', 'WA', 'NC', 'NY'],
+			))
+		self.scheduler = QueueOnlyScheduler(lambda data_alias: self.df, lambda: None)
+
+	def add_pages(self, data_alias):
+		with self.scheduler._condition:
+			for i, col_name in enumerate(self.df.columns):
+				self.scheduler._add(scheduler.PrecomputeTask(data_alias, scheduler.COLUMN, (col_name,), i))
+			self.scheduler._add(scheduler.PrecomputeTask(data_alias, scheduler.RELATIONSHIP, ('state', 'region'), 0))
+
+	# ###############################################################
+
+	def test_order(self):
+		self.scheduler.schedule('a')
+		self.add_pages('a')
+		self.assertEqual(self.scheduler.pop_all(), [
+			'a: TablePageDescriber()',
+			'a: ColumnPageDescriber(region)',
+			'a: ColumnPageDescriber(state)',
+			'a: RelationshipPageDescriber(state, region)',
+			])
+
+	def test_prioritize(self):
+		self.add_pages('a')
+		self.add_pages('b')
+		self.scheduler.prioritize('b', 'state')
+		self.assertEqual(self.scheduler.pop_all(), [
+			# the column opened
+			'b: ColumnPageDescriber(state)',
+			'b: RelationshipPageDescriber(state, region)',
+			# the rest of its dataset
+			'b: ColumnPageDescriber(region)',
+			# other datasets
+			'a: ColumnPageDescriber(region)',
+			'a: ColumnPageDescriber(state)',
+			'a: RelationshipPageDescriber(state, region)',
+			])
+
+	def test_request(self):
+		self.add_pages('a')
+		self.scheduler.prioritize('a', 'region')
+		self.scheduler.request('a', describers.RelationshipPageDescriber, ('state', 'region'))
+		self.scheduler.request('b', describers.ColumnPageDescriber, ('state',))
+		self.assertTrue(self.scheduler.is_busy('b'))
+		self.assertEqual(self.scheduler.pop_all(), [
+			# requested pages, including ones not queued before
+			'b: ColumnPageDescriber(state)',
+			'a: RelationshipPageDescriber(state, region)',
+			'a: ColumnPageDescriber(region)',
+			'a: ColumnPageDescriber(state)',
+			])
+		self.assertFalse(self.scheduler.is_busy('b'))
+
+	def test_status(self):
+		self.scheduler.schedule('a')
+		self.add_pages('b')
+		status = self.scheduler.status()
+		self.assertEqual(status['queued'], 4)
+		self.assertEqual(status['datasets']['a']['queued'], 1)
+		self.assertEqual(status['datasets']['b']['queued'], 3)
+
+		self.scheduler.cancel('b')
+		self.assertEqual(self.scheduler.status()['queued'], 1)
+		self.assertEqual(self.scheduler.pop_all(), ['a: TablePageDescriber()'])
+
+if __name__ == '__main__':
+	unittest.main()
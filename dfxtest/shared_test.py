@@ -0,0 +1,65 @@
+import unittest
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from dfx import shared
+from dfx import columnar
+from dfx import fingerprint as dfx_fingerprint
+
+class SharedTest(unittest.TestCase):
+
+	def setUp(self):
+		self.dataset_path = 'shared_test.dfx'
+		self.df = pd.DataFrame(dict(
+			id = [1, 2, 3],
+			val = [1.5, None, 3.5],
+			name = ['a', None, 'c'],
+			))
+
+	def tearDown(self):
+		shutil.rmtree(self.dataset_path, ignore_errors=True)
+		shared._attached.clear()
+
+	# ###############################################################
+
+	def test_publish(self):
+		with shared.publish(self.df) as handle:
+			self.assertTrue(handle.temporary)
+			self.assertTrue(columnar.is_dataset(handle.path))
+			# publishing the same data again reuses the dataset
+			with shared.publish(self.df.copy()) as handle_2:
+				self.assertEqual(handle_2.path, handle.path)
+			self.assertTrue(columnar.is_dataset(handle.path))
+
+			df = shared.attach(handle)
+			self.assertTrue(df.equals(self.df))
+			self.assertEqual(dfx_fingerprint.get_fingerprint(df).df_hash, dfx_fingerprint.get_fingerprint(self.df).df_hash)
+			# memoized
+			self.assertTrue(shared.attach(handle) is df)
+		# removed by the last publish
+		self.assertFalse(os.path.exists(handle.path))
+
+	def test_publish_dataset(self):
+		columnar.write_frame(self.df, self.dataset_path)
+		df = columnar.open_frame(self.dataset_path, columns=['id', 'val'])
+		with shared.publish(df) as handle:
+			# already a dataset, so nothing is written
+			self.assertFalse(handle.temporary)
+			self.assertEqual(handle.path, os.path.abspath(self.dataset_path))
+			attached = shared.attach(handle)
+			self.assertTrue(attached.equals(df))
+			self.assertTrue(isinstance(attached['id'].values.base, np.memmap))
+		self.assertTrue(columnar.is_dataset(self.dataset_path))
+
+	def test_changed_dataset(self):
+		columnar.write_frame(self.df, self.dataset_path)
+		with shared.publish(columnar.open_frame(self.dataset_path)) as handle:
+			columnar.write_frame(self.df.head(2), self.dataset_path)
+			with self.assertRaises(ValueError):
+				shared.attach(handle)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from dfx import sketches
+from dfx import stats
+from dfx import describers
+
+class HyperLogLogTest(unittest.TestCase):
+
+	def test_count(self):
+		values = np.arange(50000) * 7
+		hll = sketches.HyperLogLog()
+		hll.add(np.concatenate([values, values[:1000]]))
+		error = abs(hll.count() - 50000) / 50000.0
+		self.assertTrue(error < 3 * hll.relative_error)
+		# small counts are close to exact
+		small = sketches.HyperLogLog()
+		small.add(np.array(['a', 'b', 'c', 'a']))
+		self.assertEqual(small.count(), 3)
+
+	def test_merge(self):
+		values = pd.Series(['v{}'.format(i) for i in range(20000)]).values
+		whole = sketches.HyperLogLog()
+		whole.add(values)
+		first, second = sketches.HyperLogLog(), sketches.HyperLogLog()
+		first.add(values[:12000])
+		second.add(values[8000:])
+		self.assertTrue((first.merge(second).registers == whole.registers).all())
+		self.assertRaises(ValueError, first.merge, sketches.HyperLogLog(precision=12))
+
+	def test_large_integers(self):
+		# ids above 2 ** 53 are distinct, though not as floats
+		values = np.arange(200000, dtype=np.int64) + 2 ** 60
+		self.assertEqual(len(np.unique(sketches.hash_values(values))), 200000)
+		hll = sketches.HyperLogLog()
+		hll.add(values)
+		error = abs(hll.count() - 200000) / 200000.0
+		self.assertTrue(error < 3 * hll.relative_error)
+		# whole floats hash as the integers they equal
+		floats = np.array([1.0, 2.0 ** 60, 2.5, np.nan])
+		hashes = sketches.hash_values(floats)
+		self.assertEqual(list(hashes[:2]), list(sketches.hash_values(np.array([1, 2 ** 60]))))
+		self.assertNotEqual(hashes[2], sketches.hash_values(np.array([2]))[0])
+
+class MisraGriesTest(unittest.TestCase):
+
+	def test_top(self):
+		random = np.random.RandomState(0)
+		values = np.concatenate([np.repeat(['a', 'b'], [3000, 2000]), ['x{}'.format(i) for i in random.randint(0, 5000, 10000)]])
+		random.shuffle(values)
+		summary = sketches.MisraGries(counters=50)
+		for start in range(0, len(values), 1000):
+			chunk = sketches.MisraGries(counters=50)
+			chunk.add(values[start:start + 1000])
+			summary.merge(chunk)
+		self.assertEqual(summary.total, len(values))
+		self.assertEqual([value for value, count in summary.top(2)], ['a', 'b'])
+		# counts are never over, and at most max_error under
+		(a, a_count), (b, b_count) = summary.top(2)
+		self.assertTrue(3000 - summary.max_error <= a_count <= 3000)
+		self.assertTrue(2000 - summary.max_error <= b_count <= 2000)
+		self.assertTrue(summary.max_error <= len(values) / 51.0)
+
+	def test_exact(self):
+		summary = sketches.MisraGries()
+		summary.add(pd.Series([1, 2, 2, 3, 3, 3]))
+		self.assertEqual(summary.top(2), [(3, 3), (2, 2)])
+		self.assertEqual(summary.max_error, 0)
+
+class ColumnSketchTest(unittest.TestCase):
+
+	def test_same_as_profile(self):
+		columns = [
+			pd.Series(['b', None, 'a', 'b', 'c', 'a', 'b'] * 3),
+			pd.Series([1.0, np.nan, 3.0, 3.0, 5.0]),
+			pd.Series(np.arange(10, 30)),
+			pd.Series([5, 4, 4, 3]),
+			# decreasing within and across chunks, which wrap around if subtracted
+			pd.Series(np.array([5, 3, 4, 6, 2, 7], dtype=np.uint8)),
+			pd.Series(np.array([1, 2, 3, 4, 5, 6], dtype=np.uint8)),
+			]
+		for col in columns:
+			exact = stats.profile_column(col)
+			sketched = sketches.sketch_column(col, chunk_rows=3)
+			self.assertTrue(sketched.approximate)
+			for name in ['dtype', 'inferred_type', 'row_count', 'null_count', 'distinct_count', 'duplicate_count',
+					'min', 'max', 'is_monotonic', 'is_consecutive', 'top_values', 'first_values']:
+				self.assertEqual(getattr(sketched, name), getattr(exact, name), name)
+
+	def test_unsigned(self):
+		# 3 - 5 wraps around to 254 for uint8, within a chunk and between them
+		for values in [[5, 3, 4], [3, 4, 2, 5]]:
+			sketched = sketches.sketch_column(pd.Series(np.array(values, dtype=np.uint8)), chunk_rows=2)
+			self.assertFalse(sketched.is_monotonic, values)
+			self.assertFalse(sketched.is_consecutive, values)
+
+	def test_mixed_chunks(self):
+		sketch = sketches.ColumnSketch()
+		sketch.add(pd.Series([1, 2]))
+		sketch.add(pd.Series(['a', 'b']))
+		profile = sketch.stats()
+		self.assertEqual((profile.dtype, profile.inferred_type), ('object', 'mixed'))
+
+	def test_exact_distinct(self):
+		# while every value fits in the top values, the distinct count is exact
+		col = pd.Series(np.arange(5000) % 700)
+		self.assertEqual(sketches.sketch_column(col, chunk_rows=1000).distinct_error, 0)
+		counters = sketches.MG_COUNTERS
+		sketches.MG_COUNTERS = 100
+		try:
+			profile = sketches.sketch_column(col, chunk_rows=1000)
+		finally:
+			sketches.MG_COUNTERS = counters
+		self.assertTrue(profile.distinct_error > 0)
+		self.assertTrue(abs(profile.distinct_count - 700) < 700 * 3 * profile.distinct_error)
+
+	def test_describers(self):
+		df = pd.DataFrame(dict(val=[10, 20, 20, 30]))
+		exact = describers.ColumnUnique(df, 'val')
+		counters = sketches.MG_COUNTERS
+		sketches.MG_COUNTERS = 2
+		sketches.set_sketched(df, True)
+		try:
+			self.assertTrue(sketches.is_sketched(df.copy()))
+			sketched = describers.ColumnUnique(df, 'val')
+			# saved separately from the exact describer
+			self.assertNotEqual(sketched.hash, exact.hash)
+			self.assertTrue('HyperLogLog' in sketched.description)
+			self.assertTrue(sketched.description.startswith('25.0% duplicated'))
+			self.assertTrue(describers.ColumnProfile(df, 'val').profile.approximate)
+		finally:
+			sketches.MG_COUNTERS = counters
+			sketches.set_sketched(df, None)
+		self.assertFalse(sketches.is_sketched(df))
+		self.assertEqual(describers.ColumnUnique(df, 'val').hash, exact.hash)
+
+if __name__ == '__main__':
+	unittest.main()
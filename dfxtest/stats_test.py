@@ -0,0 +1,102 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from dfx import stats as dfx_stats
+
+class ProfileColumnTest(unittest.TestCase):
+
+	def assert_matches_pandas(self, col):
+		stats = dfx_stats.profile_column(col)
+		self.assertEqual(stats.row_count, len(col))
+		self.assertEqual(stats.null_count, col.isnull().sum())
+		self.assertEqual(stats.distinct_count, col.nunique())
+		self.assertEqual(stats.duplicate_count, col.duplicated().sum())
+		value_counts = col.value_counts().head(dfx_stats.TOP_VALUES)
+		self.assertEqual(stats.top_values, list(zip(value_counts.index, value_counts.values)))
+		return stats
+
+	# ###############################################################
+
+	def test_integers(self):
+		stats = self.assert_matches_pandas(pd.Series([3, 1, 2, 2, 5, 2]))
+		self.assertEqual(stats.dtype, 'int64')
+		self.assertEqual((stats.min, stats.max), (1, 5))
+		self.assertEqual(stats.top_values[0], (2, 3))
+		self.assertFalse(stats.is_monotonic)
+
+	def test_consecutive(self):
+		stats = self.assert_matches_pandas(pd.Series([4, 5, 6, 7]))
+		self.assertTrue(stats.is_monotonic)
+		self.assertTrue(stats.is_consecutive)
+		self.assertEqual(stats.duplicate_rate, 0)
+
+	def test_unsigned(self):
+		# 3 - 5 wraps around to 254 for uint8
+		stats = self.assert_matches_pandas(pd.Series(np.array([5, 3, 4], dtype=np.uint8)))
+		self.assertFalse(stats.is_monotonic)
+		self.assertFalse(stats.is_consecutive)
+		stats = self.assert_matches_pandas(pd.Series(np.array([3, 4, 5], dtype=np.uint8)))
+		self.assertTrue(stats.is_consecutive)
+
+	def test_floats_with_nulls(self):
+		stats = self.assert_matches_pandas(pd.Series([1.5, np.nan, 1.5, np.nan, -2.0]))
+		self.assertEqual((stats.min, stats.max), (-2.0, 1.5))
+		self.assertEqual(stats.null_rate, 0.4)
+		self.assertFalse(stats.is_monotonic)
+
+	def test_text(self):
+		col = pd.Series(['b', 'a', None, 'b', 'c' * 200, 'd'])
+		stats = self.assert_matches_pandas(col)
+		self.assertEqual(stats.min, None)
+		self.assertEqual(stats.first_values, ['b', 'a', 'c' * 200])
+
+	def test_first_values_truncation(self):
+		values = ['v{:02d}'.format(i) for i in range(50)]
+		stats = dfx_stats.profile_column(pd.Series(values))
+		self.assertTrue(len(', '.join(stats.first_values)) > dfx_stats.FIRST_VALUES_CHARACTERS)
+		self.assertEqual(', '.join(stats.first_values)[:100], ', '.join(values)[:100])
+
+	def test_empty(self):
+		stats = self.assert_matches_pandas(pd.Series([], dtype='float64'))
+		self.assertEqual(stats.min, None)
+		self.assertTrue(np.isnan(stats.null_rate))
+
+class InferTypeTest(unittest.TestCase):
+
+	def test_is_text(self):
+		self.assertTrue(dfx_stats.is_text(pd.Series(['abc', 'def'])))
+		self.assertTrue(dfx_stats.is_text(pd.Series([], dtype=object)))
+		self.assertFalse(dfx_stats.is_text(pd.Series(['abc', 20, 30])))
+		self.assertFalse(dfx_stats.is_text(pd.Series(['abc', None])))
+		self.assertFalse(dfx_stats.is_text(pd.Series([1.5, 2.5])))
+
+	def test_profile(self):
+		self.assertTrue(dfx_stats.profile_column(pd.Series(['a', 'b'])).is_text)
+		self.assertEqual(dfx_stats.profile_column(pd.Series([1, 2])).inferred_type, 'integer')
+
+class AnovaTest(unittest.TestCase):
+
+	def test_matches_scipy(self):
+		from scipy import stats as scipy_stats
+		random = np.random.RandomState(0)
+		groups = pd.Series(random.choice(['a', 'b', 'c', 'd'], 1000))
+		values = pd.Series(1e6 + random.normal(size=1000) + (groups == 'b') * 0.2)
+		f, p = dfx_stats.one_way_anova(dfx_stats.group_stats(groups, values))
+		expected_f, expected_p = scipy_stats.f_oneway(*[values[groups == g] for g in ['a', 'b', 'c', 'd']])
+		self.assertAlmostEqual(f, expected_f, places=6)
+		self.assertAlmostEqual(p, expected_p, places=6)
+
+	def test_means(self):
+		df = pd.DataFrame(dict(group=['b', 'a', 'b', None, 'c'], val=[1.0, 2.0, 3.0, 4.0, np.nan]))
+		means = dfx_stats.group_stats(df['group'], df['val']).means_frame('group', 'val')
+		expected = df.groupby('group')['val'].mean().to_frame().reset_index().dropna()
+		self.assertTrue(means.equals(expected.reset_index(drop=True)))
+
+	def test_one_group(self):
+		grouped = dfx_stats.group_stats(pd.Series(['a', 'a']), pd.Series([1, 2]))
+		self.assertRaises(ValueError, dfx_stats.one_way_anova, grouped)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import os
+import glob
+
+import numpy as np
+import pandas as pd
+
+from dfx import streaming
+from dfx import stats
+from dfx import describers
+
+class ProfileCsvTest(unittest.TestCase):
+
+	def setUp(self):
+		self.csv_path = 'streaming_test.csv'
+		with open(self.csv_path, 'w') as f:
+			f.write('id,name,val,empty\n')
+			for i in range(25):
+				# val is an integer until a null in the last chunk, empty is only null
+				f.write('{},"name {}",{},\n'.format(i, i % 3, '' if i == 24 else i * 10))
+
+	def tearDown(self):
+		describers.factory = describers.DescriberFactory()
+		for path in glob.glob('streaming_test*') + glob.glob('image_*.png'):
+			os.remove(path)
+
+	# ###############################################################
+
+	def test_stats(self):
+		progress = []
+		profile = streaming.profile_csv(self.csv_path, chunk_rows=10,
+			progress=lambda rows, bytes_read: progress.append(rows))
+		self.assertEqual(progress, [10, 20, 25, 25])
+		self.assertEqual(profile.row_count, 25)
+		df = pd.read_csv(self.csv_path)
+		for col_name in df.columns:
+			exact = stats.profile_column(df[col_name])
+			streamed = profile.stats[col_name]
+			self.assertTrue(streamed.approximate)
+			for name in ['dtype', 'inferred_type', 'null_count', 'distinct_count', 'duplicate_count', 'min', 'max',
+					'is_monotonic', 'is_consecutive', 'top_values', 'first_values']:
+				self.assertEqual(getattr(streamed, name), getattr(exact, name), (col_name, name))
+		val = profile.stats['val']
+		self.assertAlmostEqual(val.mean, df['val'].mean())
+		self.assertAlmostEqual(val.std, df['val'].std())
+		self.assertEqual(val.histogram[0].sum(), 24)
+		self.assertEqual(list(profile.frame.dtypes), list(df.dtypes))
+
+	def test_describers(self):
+		profile = streaming.profile_csv(self.csv_path, chunk_rows=10)
+		df = pd.read_csv(self.csv_path)
+		# the same as the table page's, calculated from the whole dataframe
+		for col_name, description in profile.summary():
+			self.assertEqual(description, describers.ColumnSummary(df, col_name).description)
+		names = [describer.__class__.__name__ for describer in profile.column_describers('id')]
+		self.assertEqual(names, ['ColumnId', 'ColumnNumeric', 'ColumnNull', 'ColumnUnique'])
+		# the factory is put back
+		self.assertEqual(describers.factory.__class__, describers.DescriberFactory)
+
+	def test_header_only(self):
+		with open(self.csv_path, 'w') as f:
+			f.write('a,b\n')
+		profile = streaming.profile_csv(self.csv_path)
+		self.assertEqual(profile.row_count, 0)
+		self.assertEqual(list(profile.frame.columns), ['a', 'b'])
+		self.assertEqual(profile.stats['a'].distinct_count, 0)
+
+class TableSketchTest(unittest.TestCase):
+
+	def test_merge(self):
+		df = pd.DataFrame(dict(a=np.arange(100), b=np.arange(100) % 7 * 1.5))
+		first, second = streaming.TableSketch(), streaming.TableSketch()
+		first.add(df[:40])
+		second.add(df[40:])
+		merged = first.merge(second).profile()
+		whole = streaming.TableSketch().add(df).profile()
+		self.assertEqual(merged.row_count, 100)
+		for col_name in df.columns:
+			for name in ['distinct_count', 'top_values', 'min', 'max', 'is_monotonic']:
+				self.assertEqual(getattr(merged.stats[col_name], name), getattr(whole.stats[col_name], name))
+			self.assertAlmostEqual(merged.stats[col_name].std, df[col_name].std())
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import os
+import glob
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from dfx import columnar
+from dfx import value_index
+
+class ValueIndexTest(unittest.TestCase):
+
+	def setUp(self):
+		value_index._indexes.clear()
+
+	def tearDown(self):
+		for path in glob.glob('value_index_test*'):
+			shutil.rmtree(path)
+		value_index._indexes.clear()
+
+	def assert_matches_scan(self, col):
+		index = value_index.ValueIndex.build(col)
+		as_str = col.apply(str)
+		for key in set(as_str) | {'missing'}:
+			expected = np.flatnonzero((as_str == key).values)
+			self.assertEqual(list(index.positions(key)), list(expected))
+			self.assertEqual(index.count(key), len(expected))
+		return index
+
+	# ###############################################################
+
+	def test_text(self):
+		self.assert_matches_scan(pd.Series(['west', 'east', 'west', None, 'north', None]))
+
+	def test_numbers(self):
+		self.assert_matches_scan(pd.Series([1.5, np.nan, 2.0, 1.5, 7.0]))
+		self.assert_matches_scan(pd.Series(np.random.RandomState(0).randint(0, 50, 1000)))
+
+	def test_same_string(self):
+		index = self.assert_matches_scan(pd.Series([1, '1', 2, 1], dtype=object))
+		self.assertEqual(list(index.positions('1')), [0, 1, 3])
+
+	def test_empty(self):
+		self.assert_matches_scan(pd.Series([], dtype=object))
+
+	def test_saved_with_dataset(self):
+		df = pd.DataFrame({'region': ['west', 'west', 'east', 'east'], 'state': ['CA', 'WA', 'NC', 'NY']})
+		columnar.write_frame(df, 'value_index_test.dfx')
+		df = columnar.open_frame('value_index_test.dfx')
+
+		index = value_index.get_value_index(df, 'region')
+		self.assertTrue(value_index.get_value_index(df, 'region') is index)
+		self.assertEqual(len(glob.glob('value_index_test.dfx/index/*.order.npy')), 1)
+
+		# re-opened from disk, rather than rebuilt
+		value_index._indexes.clear()
+		index = value_index.get_value_index(df, 'region')
+		self.assertTrue(isinstance(index.order, np.memmap))
+		self.assertEqual(list(index.positions('east')), [2, 3])
+
+	def test_extended(self):
+		col = pd.Series(np.random.RandomState(0).choice(['a', 'b', 'c', None], 500))
+		extended = value_index.ValueIndex.build(col[:300]).extended(col, 300)
+		index = value_index.ValueIndex.build(col)
+		for key in index.keys + ['d']:
+			self.assertEqual(list(extended.positions(key)), list(index.positions(key)))
+		# a value only in the new rows
+		extended = value_index.ValueIndex.build(col[:2]).extended(pd.concat([col[:2], pd.Series(['d'])], ignore_index=True), 2)
+		self.assertEqual(list(extended.positions('d')), [2])
+
+	def test_not_saved_without_dataset(self):
+		df = pd.DataFrame({'region': ['west', 'east']})
+		index = value_index.get_value_index(df, 'region')
+		self.assertEqual(list(index.positions('east')), [1])
+
+if __name__ == '__main__':
+	unittest.main()